@@ -0,0 +1,181 @@
+import os
+import time
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+
+
+# RAM-backed locations tried in order for the artifact store
+RAM_DIRS = ["/dev/shm", "/run/shm"]
+
+
+def default_artifact_root():
+    """The root of artifact stores
+
+    `FLEXTENSOR_ARTIFACT_DIR` overrides, then the first writable RAM-backed directory,
+    None means the system temporary directory
+    """
+    root = os.environ.get("FLEXTENSOR_ARTIFACT_DIR")
+    if root:
+        return root
+    for d in RAM_DIRS:
+        if os.path.isdir(d) and os.access(d, os.W_OK):
+            return d
+    return None
+
+
+class ArtifactStore(object):
+    """A private directory for the modules built during one tuning run
+
+    The build worker exports each module as a shared library into the store,
+    the measure worker maps it in place with `tvm.module.load`,
+    so there is no archive to unpack and link on the measuring side.
+    For RPC targets the module is exported as `.tar` and linked by the remote.
+    """
+    def __init__(self, root=None, export_format=".so"):
+        if root is None:
+            root = default_artifact_root()
+        if root is not None:
+            os.makedirs(root, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix="flextensor_lib_", dir=root)
+        self.export_format = export_format
+
+    def new_name(self):
+        return "flextensor_built_function_{}_{}{}".format(
+            time.time(), np.random.randint(1000, 10000), self.export_format)
+
+    def get_path(self, name):
+        return os.path.join(self.path, name)
+
+    def remove(self, name):
+        for path in [self.get_path(name), self.get_path(name + ".obj")]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def cleanup(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+# the bytes each process has seen in each kernel cache directory, None until scanned
+_cache_bytes = {}
+
+
+def default_kernel_cache_dir():
+    return os.path.join(os.path.expanduser("~"), ".cache", "flextensor", "kernels")
+
+
+class KernelCache(object):
+    """On-disk cache of built modules and their measured latency
+
+    An entry is keyed by the hash of the lowered statement, the build target,
+    the hardware fingerprint and the device id of the measuring device,
+    so configs lowering to the same code share it.
+    The least recently used entries are evicted beyond `max_bytes`, down to
+    `low_water` of it so that the next stores do not evict again. The size is
+    tracked per process and the directory is only listed when it may be exceeded,
+    or every `rescan_every` stores for the entries of other processes.
+    """
+    def __init__(self, path=None, max_bytes=1 << 30, low_water=0.8, rescan_every=100):
+        self.path = default_kernel_cache_dir() if path is None else path
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.rescan_every = rescan_every
+        os.makedirs(self.path, exist_ok=True)
+
+    def key(self, stmt, target, target_host=None, hardware="local", dev_id=0):
+        """hardware is the `flextensor.record.hardware_fingerprint` of the measuring device"""
+        h = hashlib.sha1()
+        for part in [str(stmt), str(target), str(target_host), str(hardware), str(dev_id)]:
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _entry_path(self, key, suffix):
+        return os.path.join(self.path, key + suffix)
+
+    def _touch(self, path):
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    def load_latency(self, key):
+        path = self._entry_path(key, ".json")
+        try:
+            with open(path, "r") as fin:
+                latency = json.load(fin)["latency"]
+        except (OSError, ValueError, KeyError):
+            return None
+        self._touch(path)
+        return latency
+
+    def store_latency(self, key, latency):
+        path = self._entry_path(key, ".json")
+        tmp_path = path + ".%d.tmp" % os.getpid()
+        with open(tmp_path, "w") as fout:
+            json.dump({"latency": latency}, fout)
+        os.replace(tmp_path, path)
+        self._added(path)
+
+    def fetch_module(self, key, dst):
+        path = self._entry_path(key, os.path.splitext(dst)[1])
+        try:
+            shutil.copyfile(path, dst)
+        except OSError:
+            return False
+        self._touch(path)
+        return True
+
+    def store_module(self, key, src):
+        path = self._entry_path(key, os.path.splitext(src)[1])
+        tmp_path = path + ".%d.tmp" % os.getpid()
+        try:
+            shutil.copyfile(src, tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print("[FlexTensor] [Warning] Fail to cache module %s: %s" % (src, str(e)))
+            return
+        self._added(path)
+
+    def _added(self, path):
+        size, stores = _cache_bytes.get(self.path, (None, 0))
+        if size is not None:
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        stores += 1
+        if size is None or size > self.max_bytes or stores >= self.rescan_every:
+            size = self.evict()
+            stores = 0
+        _cache_bytes[self.path] = (size, stores)
+
+    def evict(self):
+        """Remove the least recently used entries if beyond max_bytes, returns the bytes left"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.path):
+            if name.endswith(".tmp"):
+                continue
+            path = os.path.join(self.path, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        if total <= self.max_bytes:
+            return total
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_bytes * self.low_water:
+                break
+        return total
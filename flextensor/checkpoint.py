@@ -0,0 +1,89 @@
+import os
+import time
+import pickle
+
+
+def save_checkpoint(path, state):
+    """Write the state atomically, a crash never leaves a broken checkpoint"""
+    dirname = os.path.dirname(os.path.abspath(path))
+    os.makedirs(dirname, exist_ok=True)
+    tmp_path = path + ".%d.tmp" % os.getpid()
+    with open(tmp_path, "wb") as fout:
+        pickle.dump(state, fout, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path):
+    with open(path, "rb") as fin:
+        return pickle.load(fin)
+
+
+class SearchSuspended(Exception):
+    """The search of `stage` stopped at the evaluation budget of the `schedule` call
+
+    its state is in the checkpoint, the next call goes on from there
+    """
+    def __init__(self, stage, best_value):
+        super(SearchSuspended, self).__init__("%s suspended, the best %f" % (stage, best_value))
+        self.stage = stage
+        self.best_value = best_value
+
+
+class Checkpoint(object):
+    """The progress of one `schedule` call
+
+    `state` holds the task key, the configs decided so far, whether all
+    the stages are decided and the search state of the stage being scheduled.
+    The search state is written at most once per `interval` seconds,
+    decided configs are written at once. Nothing is written if `path` is None,
+    the progress is then kept in memory only.
+    """
+    def __init__(self, path, task_key, interval=60.0):
+        self.path = path
+        self.interval = interval
+        self.last_save = time.time()
+        self.state = {
+            "task_key": task_key,
+            "op_config_lst": [],
+            "graph_config": None,
+            "done": False,
+            "stage": None,
+            "search": None
+        }
+
+    @classmethod
+    def resume(cls, path, task_key, interval=60.0):
+        ret = cls(path, task_key, interval=interval)
+        state = load_checkpoint(path)
+        if state["task_key"] != task_key:
+            raise RuntimeError("Checkpoint %s is for task %s, not %s" % (path, state["task_key"], task_key))
+        ret.state = state
+        return ret
+
+    def due(self):
+        return time.time() - self.last_save >= self.interval
+
+    def save(self):
+        if self.path is None:
+            return
+        save_checkpoint(self.path, self.state)
+        self.last_save = time.time()
+
+    def set_configs(self, op_config_lst, graph_config, done=False):
+        self.state["op_config_lst"] = list(op_config_lst)
+        self.state["graph_config"] = graph_config
+        self.state["done"] = done
+        self.state["stage"] = None
+        self.state["search"] = None
+        self.save()
+
+    def set_search(self, stage, search, force=False):
+        self.state["stage"] = stage
+        self.state["search"] = search
+        if force or self.due():
+            self.save()
+
+    def get_search(self, stage):
+        if self.state["stage"] != stage:
+            return None
+        return self.state["search"]
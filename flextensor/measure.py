@@ -1,13 +1,14 @@
 import tvm
+import json
+import zlib
+import math
 import signal
 import psutil
 import time
 import numpy as np
-try:
-    import torch.multiprocessing as multi
-except ImportError:
-    import multiprocessing as multi
-from flextensor.utils import to_tuple
+import multiprocessing as multi
+from flextensor.utils import to_tuple, Config
+from flextensor.record import RecordDatabase, dumps
 
 
 def kill_child_processes(parent_pid, sig=signal.SIGTERM):
@@ -143,3 +144,163 @@ def __evaluate(s, bufs, target, dev_id, number=1, q=None):
     if q:
         q.put(time_cost)
     return time_cost
+
+
+class Measurer(object):
+    """Gives the latency of a config in place of building and measuring it
+
+    Passed to `schedule` as `measurer`, e.g. to benchmark the search without a device.
+    """
+    def measure(self, task_key, configs):
+        """The latency in ms of the task scheduled with `configs`, a `Config`"""
+        raise NotImplementedError()
+
+
+def _product(lst):
+    ret = 1
+    for x in lst:
+        ret *= x
+    return ret
+
+
+class AnalyticalMeasurer(Measurer):
+    """A deterministic estimate from the split factors of the config
+
+    The iterations of every op are spread over the outer spatial factors up to `cores`,
+    the inner tiles cost more the farther they are from `tile` iterations
+    and the innermost factor is vectorized by `vector` lanes if it is a multiple of it.
+    A config gets the same latency in every process, off by at most `noise` of it.
+    """
+    def __init__(self, cores=8, tile=64, vector=8, iters_per_ms=1e6, noise=0.0):
+        self.cores = cores
+        self.tile = tile
+        self.vector = vector
+        self.iters_per_ms = iters_per_ms
+        self.noise = noise
+
+    def op_latency(self, op_config):
+        spatial = op_config.get("spatial", [])
+        reduce = op_config.get("reduce", [])
+        iters = _product([_product(factors) for factors in spatial + reduce])
+        if not spatial:
+            return iters / self.iters_per_ms
+        parallel = min(_product([factors[0] for factors in spatial]), self.cores)
+        inner = _product([factors[-1] for factors in spatial]) * _product([factors[-1] for factors in reduce])
+        locality = 1 + 0.2 * abs(math.log2(inner / self.tile))
+        lanes = self.vector if spatial[-1][-1] % self.vector == 0 else 1
+        unroll = 0.9 if op_config.get("unroll") and op_config["unroll"][0][1] else 1.0
+        return iters / (self.iters_per_ms * parallel * lanes) * locality * unroll
+
+    def measure(self, task_key, configs):
+        ret = sum(self.op_latency(op_config) for op_config in configs.op_config_lst if op_config)
+        if configs.graph_config and configs.graph_config.get("inline") and any(configs.graph_config["inline"][0]):
+            # fewer intermediate buffers
+            ret *= 0.95
+        if self.noise > 0:
+            h = zlib.crc32((task_key + config_key(configs)).encode())
+            ret *= 1 + self.noise * (h / 0xffffffff - 0.5) * 2
+        return ret
+
+
+def _strip(config):
+    # configs from warm up have no entry for the unused types, the others have empty ones
+    if not config:
+        return {}
+    return dict((key, value) for key, value in config.items() if value)
+
+
+def config_key(configs):
+    """The same string for the same schedule, wherever the config comes from"""
+    return dumps([[_strip(op_config) for op_config in configs.op_config_lst], _strip(configs.graph_config)])
+
+
+class ReplayMeasurer(Measurer):
+    """Replays recorded latencies, estimates the configs never measured
+
+    The table is filled from a `RecordDatabase` by `load_records`
+    and from the logs of the optimize scripts by `load_log`.
+    A config missing from it gets the latency of `fallback`, by default an `AnalyticalMeasurer`,
+    scaled by the median ratio of the recorded latencies of the task to the fallback ones.
+    """
+    def __init__(self, fallback=None, calibrate=True):
+        self.fallback = AnalyticalMeasurer() if fallback is None else fallback
+        self.calibrate = calibrate
+        # task key -> config key -> (configs, latency)
+        self.table = {}
+        # task key -> scale of the fallback latencies
+        self.scales = {}
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, task_key, configs, latency):
+        if not latency < float("inf"):
+            return
+        table = self.table.setdefault(task_key, {})
+        key = config_key(configs)
+        if key not in table or latency < table[key][1]:
+            table[key] = (configs, latency)
+            self.scales.pop(task_key, None)
+
+    def load_records(self, records, hardware=None):
+        """Replay a RecordDatabase or the path of one, of one hardware if given"""
+        if isinstance(records, str):
+            records = RecordDatabase(records)
+        count = 0
+        for task_key, _, stage, context, config, latency in records.records(hardware):
+            if stage == "final":
+                configs = Config(*config)
+            elif stage == "graph":
+                configs = Config(context, config)
+            else:
+                configs = Config(context[0] + [config], context[1])
+            self.add(task_key, configs, latency)
+            count += 1
+        return count
+
+    def load_log(self, path, latency=None):
+        """Replay the `key:configs[:latency]` lines of an optimize log
+
+        lines without latency, like those of baselines/flextensor/*.txt, get `latency`
+        and are skipped if it is None
+        """
+        decoder = json.JSONDecoder()
+        count = 0
+        with open(path, "r") as fin:
+            for line in fin:
+                line = line.strip()
+                if ":" not in line:
+                    continue
+                task_key, rest = line.split(":", 1)
+                try:
+                    configs, end = decoder.raw_decode(rest)
+                    rest = rest[end:].strip()
+                    value = float(rest[1:]) if rest.startswith(":") else latency
+                except ValueError:
+                    print("[FlexTensor] [Warning] Can't parse %s" % line[:80])
+                    continue
+                if value is None:
+                    continue
+                self.add(task_key, Config(*configs), value)
+                count += 1
+        return count
+
+    def scale(self, task_key):
+        if not self.calibrate or task_key not in self.table:
+            return 1.0
+        if task_key not in self.scales:
+            ratios = []
+            for configs, latency in self.table[task_key].values():
+                estimate = self.fallback.measure(task_key, configs)
+                if 0 < estimate < float("inf"):
+                    ratios.append(latency / estimate)
+            self.scales[task_key] = float(np.median(ratios)) if ratios else 1.0
+        return self.scales[task_key]
+
+    def measure(self, task_key, configs):
+        table = self.table.get(task_key, {})
+        key = config_key(configs)
+        if key in table:
+            self.hits += 1
+            return table[key][1]
+        self.misses += 1
+        return self.fallback.measure(task_key, configs) * self.scale(task_key)
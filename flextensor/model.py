@@ -8,12 +8,11 @@ import heapq
 import json
 import flextensor.space as Space
 from flextensor.utils import assert_print
-
-
-global_walker_judger_model_path_prefix = "walker_judger_model_"
-global_walker_judger_data_path_prefix = "walker_judger_data_"
-global_performance_judger_path_prefix = "performance_judger_model_"
-global_performance_data_path_prefix = "performance_judger_data_"
+# the search bookkeeping does not need torch, it is kept here for the former imports
+from flextensor.search import WalkerGroup, SubspaceWalker, MemEntity, flatten, entity_feature, \
+    FEATURE_TABLE_LIMIT, WALKER_CAPACITY, global_walker_judger_model_path_prefix, \
+    global_walker_judger_data_path_prefix, global_performance_judger_path_prefix, \
+    global_performance_data_path_prefix
 
 
 class Judger(torch.nn.Module):
@@ -34,52 +33,56 @@ class Judger(torch.nn.Module):
         out = self.net(inputs)
         return out
 
-def flatten(x):
-    ret = []
-    for v in x:
-        if isinstance(v, (list, tuple)):
-            ret.extend(list(v))
-        else:
-            ret.append(v)
-    return ret
 
-
-class Walker(nn.Module):
-    def __init__(self, name, subspace, input_len):
-        super(Walker, self).__init__()
-        self.subspace = subspace
+class Walker(nn.Module, SubspaceWalker):
+    def __init__(self, name, subspace, input_len, capacity=WALKER_CAPACITY):
+        nn.Module.__init__(self)
+        SubspaceWalker.__init__(self, subspace)
         self.pre_judger = Judger(input_len, 64, 4, self.subspace.num_direction)
         self.post_judger = Judger(input_len, 64, 4, self.subspace.num_direction)     # post updated
-        self.memory = []    # (pre_state, action, post_state, reward)
+        # replay memory of (pre_state, action, post_state, reward), a ring buffer
+        self.capacity = capacity
+        self.pre_states = torch.zeros(capacity, input_len)
+        self.actions = torch.zeros(capacity, dtype=torch.long)
+        self.post_states = torch.zeros(capacity, input_len)
+        self.rewards = torch.zeros(capacity)
         self.mem_size = 0
-        entities = [flatten(x) for x in self.subspace.static_entities]
-        self.inputs_to_judger = torch.FloatTensor(entities)
+        self.mem_pos = 0
+        # the features of the whole subspace as a tensor, only made for best_batch
+        self._inputs_to_judger = None
+        # only the canonical entities are proposed
+        if self.subspace.canonical_map is not None:
+            self.canonical_indices = torch.LongTensor(
+                [i for i in range(self.subspace.size) if self.subspace.canonical(i) == i])
+        else:
+            self.canonical_indices = None
         self.model_path = global_walker_judger_model_path_prefix + name + ".pkl"
         self.data_path = global_walker_judger_data_path_prefix + name + ".txt"
-    
-    def random_batch(self, batch_size):
-        batch_indices = np.random.randint(0, self.subspace.size, batch_size)
-        ret_entities = self._get_batch(batch_indices)
-        return ret_entities, batch_indices
 
+    @property
+    def inputs_to_judger(self):
+        if self._inputs_to_judger is None:
+            if self.feature_table is not None:
+                self._inputs_to_judger = torch.from_numpy(self.feature_table)
+            else:
+                self._inputs_to_judger = torch.from_numpy(self.features(range(self.subspace.size)))
+        return self._inputs_to_judger
+    
     def best_batch(self, batch_size):
-        batch_size = min(batch_size, self.subspace.size)
-        p_values = self.judger(self.inputs_to_judger).reshape(-1)
-        ret_p_values, batch_indices = torch.topk(p_values, batch_size)
+        if self.canonical_indices is None:
+            batch_size = min(batch_size, self.subspace.size)
+            p_values = self.judger(self.inputs_to_judger).reshape(-1)
+            ret_p_values, batch_indices = torch.topk(p_values, batch_size)
+        else:
+            batch_size = min(batch_size, len(self.canonical_indices))
+            p_values = self.judger(self.inputs_to_judger[self.canonical_indices]).reshape(-1)
+            ret_p_values, batch_indices = torch.topk(p_values, batch_size)
+            batch_indices = self.canonical_indices[batch_indices]
         ret_entities = self._get_batch(batch_indices)
         return ret_entities, batch_indices
 
-    def _get_batch(self, batch_indices):
-        ret_entities = []
-        for index in batch_indices:
-            ret_entities.append(self.subspace.get_entity(index))
-        return ret_entities
-
-    def record_best(self, best_index, best_value):
-        self.memory[best_index] = best_value
-
     def walk(self, inputs, index_lst, trial, epsilon, gamma):
-        q_values_lst = self.pre_judger(torch.FloatTensor(inputs)).detach()
+        q_values_lst = self.pre_judger(torch.as_tensor(inputs, dtype=torch.float)).detach()
         ret_index_lst = []
         ret_choice_lst = []
         for i, q_values in enumerate(q_values_lst):
@@ -91,49 +94,45 @@ class Walker(nn.Module):
             else:
                 _, choice = torch.max(q_values, dim=-1)
             direction = self.subspace.get_direction(choice)
-            new_index = self.subspace.next_entity(index_lst[i], direction)
+            new_index = self.subspace.next_canonical(index_lst[i], direction)
             ret_index_lst.append(new_index)
             ret_choice_lst.append(int(choice))
         return ret_index_lst, ret_choice_lst
 
-    def full_walk(self, index):
-        new_index_lst = []
-        for d in self.subspace.directions:
-            new_index = self.subspace.next_entity(index, d)
-            new_index_lst.append(new_index)
-        return new_index_lst, copy.deepcopy(self.subspace.directions)
-
     def add_data(self, pre_state, action, post_state, reward):
-        self.memory.append((pre_state, action, post_state, reward))
-        self.mem_size += 1
+        self.pre_states[self.mem_pos] = torch.as_tensor(pre_state, dtype=torch.float)
+        self.actions[self.mem_pos] = int(action)
+        self.post_states[self.mem_pos] = torch.as_tensor(post_state, dtype=torch.float)
+        self.rewards[self.mem_pos] = float(reward)
+        self.mem_pos = (self.mem_pos + 1) % self.capacity
+        self.mem_size = min(self.mem_size + 1, self.capacity)
+
+    def iter_data(self):
+        # the stored transitions, the oldest first
+        beg = self.mem_pos - self.mem_size
+        for p in range(beg, self.mem_pos):
+            p = p % self.capacity
+            yield (self.pre_states[p].tolist(), int(self.actions[p]),
+                   self.post_states[p].tolist(), float(self.rewards[p]))
+
+    def sample_batches(self, data_size, batch_size=32):
+        perm = torch.randperm(self.mem_size)[:data_size]
+        batches = []
+        for beg in range(0, len(perm), batch_size):
+            idx = perm[beg:beg + batch_size]
+            batches.append((self.pre_states[idx], self.actions[idx], self.post_states[idx], self.rewards[idx]))
+        return batches
+
+    def q_loss(self, batch, decay):
+        pre_states, actions, post_states, rewards = batch
+        y = self.pre_judger(pre_states).gather(1, actions.unsqueeze(1)).squeeze(1)
+        # post_judger is the target network
+        with torch.no_grad():
+            target = torch.max(self.post_judger(post_states), dim=-1)[0] * decay + rewards
+        return torch.pow(y - target, 2).sum()      # simple MSE
 
     def train(self, lr=0.02, decay=0.9, save=True):
-        train_data = self.memory
-        data_size = min(self.mem_size, 1000)
-        print("train walker data size %d" % data_size)
-        np.random.shuffle(train_data)
-        optimizer = torch.optim.Adadelta(self.pre_judger.parameters(), lr=lr)
-        for ep in range(20):
-            loss = 0.0
-            for p_data in range(data_size):
-                data = train_data[p_data]
-                pre_state, action, post_state, reward = data
-                y = self.pre_judger(torch.FloatTensor(pre_state))[action]
-                t = self.post_judger(torch.FloatTensor(post_state)).detach()
-                target = torch.max(t, dim=-1)[0] * decay + reward
-                loss = loss + torch.pow(y - target, 2)      # simple MSE
-                if (p_data + 1) % 32 == 0:
-                    optimizer.zero_grad()
-                    loss.backward()
-                    optimizer.step()
-                    loss = 0.0
-            if loss > 0.0:
-                optimizer.zero_grad()
-                loss.backward()
-                optimizer.step()
-            if save:
-                self.save_model(self.model_path)
-            print("[cur/total]=[%d/%d] | loss=%f" % (ep + 1, 20, float(loss)))        
+        train_walkers([self], lr=lr, decay=decay, save=save)
     
     def save_model(self, model_path):
         self.post_judger.load_state_dict(self.pre_judger.state_dict())
@@ -145,16 +144,14 @@ class Walker(nn.Module):
 
     def save_data(self, data_path):
         with open(data_path, "a") as fout:
-            for data in self.memory:
+            for data in self.iter_data():
                 string = json.dumps(data)
                 fout.write(string + "\n")
     
     def load_data(self, data_path):
         with open(data_path, "r") as fin:
             for line in fin:
-                data = tuple(json.loads(line))
-                self.memory.append(data)
-                self.mem_size += 1
+                self.add_data(*json.loads(line))
     
     def dump_data(self):
         self.save_data(self.data_path)
@@ -171,28 +168,77 @@ class Walker(nn.Module):
         self.load_data(self.data_path)
 
     def clear_data(self):
-        self.memory.clear()
         self.mem_size = 0
-
-
-class MemEntity(object):
-    def __init__(self, indices, value):
-        self.indices = indices
-        self.value = value
-    
-    def __lt__(self, b):
-        return self.value < b.value
-
-
-def rank_loss(y, t):
-    assert len(y) == len(t)
-    length = len(y)
-    loss = 0.0
-    for i in range(length):
-        for j in range(length):
-            tmp = torch.sign(t[i] - t[j]) * (y[i] - y[j])
-            loss = loss + torch.log(1 + torch.exp(-tmp))
-    return loss
+        self.mem_pos = 0
+
+
+def train_walkers(walkers, lr=0.02, decay=0.9, save=True, epochs=20, batch_size=32):
+    """Train the walkers together
+
+    each step takes one mini-batch from every walker,
+    sums their losses and updates all the pre_judgers with one optimizer
+    """
+    walkers = [walker for walker in walkers if walker.mem_size > 0]
+    if not walkers:
+        return
+    batches = [walker.sample_batches(min(walker.mem_size, 1000), batch_size) for walker in walkers]
+    print("train walker data size %s" % str([min(walker.mem_size, 1000) for walker in walkers]))
+    parameters = []
+    for walker in walkers:
+        parameters.extend(walker.pre_judger.parameters())
+    optimizer = torch.optim.Adadelta(parameters, lr=lr)
+    num_steps = max([len(x) for x in batches])
+    for ep in range(epochs):
+        full_loss = 0.0
+        for step in range(num_steps):
+            loss = 0.0
+            for walker, walker_batches in zip(walkers, batches):
+                if step < len(walker_batches):
+                    loss = loss + walker.q_loss(walker_batches[step], decay)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            full_loss += float(loss.detach())
+        # update the target networks
+        for walker in walkers:
+            if save:
+                walker.save_model(walker.model_path)
+            else:
+                walker.post_judger.load_state_dict(walker.pre_judger.state_dict())
+        print("[cur/total]=[%d/%d] | loss=%f" % (ep + 1, epochs, full_loss))
+
+
+def rank_loss(y, t, mask=None):
+    """Sum of log(1 + exp(-sign(t_i - t_j) * (y_i - y_j))) over all the pairs (i, j)
+
+    y and t are [..., length], pairs involving a zero in mask are not counted
+    """
+    assert y.shape == t.shape
+    # compare instead of subtract, so that two inf latencies are a tie
+    sign = (t.unsqueeze(-1) > t.unsqueeze(-2)).float() - (t.unsqueeze(-1) < t.unsqueeze(-2)).float()
+    diff = y.unsqueeze(-1) - y.unsqueeze(-2)
+    loss = nn.functional.softplus(-sign * diff)
+    if mask is not None:
+        loss = loss * (mask.unsqueeze(-1) * mask.unsqueeze(-2))
+    return loss.sum()
+
+
+def pad_perf_data(data):
+    """Stack groups of (inputs, performance) of different lengths
+
+    returns inputs [groups, length, input_len], performance and mask [groups, length]
+    """
+    length = max([len(x[1]) for x in data])
+    input_len = max([len(v) for x in data for v in x[0]] + [1])
+    inputs = torch.zeros(len(data), length, input_len)
+    perf = torch.zeros(len(data), length)
+    mask = torch.zeros(len(data), length)
+    for i, (x, t) in enumerate(data):
+        if len(t) > 0:
+            inputs[i, :len(t)] = torch.FloatTensor(x)
+            perf[i, :len(t)] = torch.FloatTensor(t)
+            mask[i, :len(t)] = 1.0
+    return inputs, perf, mask
 
 
 class PerformanceModel(nn.Module):
@@ -236,279 +282,3 @@ class PerformanceModel(nn.Module):
         output5 = self.activate5(self.linear5(output4))
         output6 = self.activate6(self.linear6(output5))
         return output6
-
-
-class WalkerGroup(object):
-    def __init__(self, group_name, space, lr=0.02):
-        self.space = space
-        self.lr = lr
-        self.walkers = dict()
-        for name, subspace in self.space.items():
-            self.walkers[name] = Walker(group_name + "_" + name, subspace, self.space.dim)
-        self.memory = []
-        self.mem_size = 0
-        self.visit = set()
-        self.performance_judger = PerformanceModel(self.space.dim)
-        self.perfromance_data = []
-        self.model_path = global_performance_judger_path_prefix + group_name + ".pkl"
-        self.data_path = global_performance_data_path_prefix + group_name + ".txt"
-
-    def forward(self, batch_size, policy="random"):
-        assert_print(policy in ["random", "best"])
-        ret = dict()
-        for name, walker in self.walkers.items():
-            if policy == "random":
-                ret_entities, ret_p_values = walker.random_batch(batch_size)
-            elif policy == "best":
-                ret_entities, ret_p_values = walker.best_batch(batch_size)
-            ret[name] = (ret_entities, ret_p_values)
-        return ret
-
-    def ever_met(self, indices):
-        return str(indices) in self.visit
-        
-    def record(self, indices, value, random_reject=False, gamma=0.5):
-        self.visit.add(str(indices))
-        if random_reject:
-            p = np.random.random()
-            t = np.exp(-gamma * (value - self.top1_value()) / self.top1_value())
-            # print("record ", p, t, value, self.top1_value())
-            if p <= t:
-                heapq.heappush(self.memory, MemEntity(indices, value))
-                self.mem_size += 1
-        else:
-            heapq.heappush(self.memory, MemEntity(indices, value))
-            self.mem_size += 1
-
-    def has_more(self):
-        return self.mem_size > 0
-
-    def str2dict(self, s):
-        def _f(lst):
-            return (lst[0], int(lst[1]))
-        return dict([_f(x.split(":")) for x in s[1:-1].split(", ")])
-
-    def flatten(self, indices):
-        ret = []
-        for name, index in indices.items():
-            entity = self.walkers[name].subspace.get_entity(index)
-            ret.extend(entity)
-        return ret
-    
-    def to_config(self, indices):
-        ret = dict()
-        for type_key, name_lst in self.space.types.items():
-            ret[type_key] = []
-            for name in name_lst:
-                if name in indices:
-                    ret[type_key].append(self.walkers[name].subspace.get_entity(indices[name]))
-        return ret
-
-    def record_best(self, best_indice, best_value):
-        for name, index in best_indice.items():
-            self.walkers[name].record_best(index, best_value)
-    
-    def top_random(self, gamma=0.5, with_value=False):
-        e = np.random.choice(self.memory)
-        p = np.random.random()
-        t = np.exp(-gamma * (e.value - self.top1_value()) / self.top1_value())
-        # print("top random", p, t, e.value, self.top1_value())
-        if p <= t:
-            if with_value:
-                return e.indices, e.value
-            return e.indices
-        else:
-            if with_value:
-                return self.top1(), self.top1_value()
-            return self.top1()
-
-    def topk(self, k, modify=False, with_value=False):
-        if k > self.mem_size:
-            k = self.mem_size
-        ret = []
-        for i in range(k):
-            tmp = heapq.heappop(self.memory)
-            ret.append(tmp)
-        self.mem_size -= k
-        if not modify:
-            for tmp in ret:
-                heapq.heappush(self.memory, tmp)
-            self.mem_size += k
-        if with_value:
-            return [(x.indices, x.value) for x in ret]
-        return [x.indices for x in ret]
-    
-    def top1(self):
-        if self.mem_size > 0:
-            return self.memory[0].indices
-        else:
-            return {}
-    
-    def top1_value(self):
-        if self.mem_size > 0:
-            return self.memory[0].value
-        else:
-            return float("inf")
-    
-    def pop_top(self):
-        if self.mem_size > 0:
-            self.mem_size -= 1
-            return heapq.heappop(self.memory)
-        else:
-            return MemEntity({}, float("inf"))
-
-    def walk(self, indices_value_lst, trial, epsilon=0.8, gamma=0.01):
-        indices_lst, value_lst = [x[0] for x in indices_value_lst], [x[1] for x in indices_value_lst]
-        # perform one step walk
-        flattened_lst = [self.flatten(indices) for indices in indices_lst]
-        ret_from_lst = []
-        ret_indices_lst = []
-        ret_action_lst = []
-        for name in self.walkers.keys():
-            index_lst = [indices[name] for indices in indices_lst]
-            next_index_lst, direction_lst = self.walkers[name].walk(flattened_lst, index_lst, trial, epsilon, gamma)
-            next_indices_lst = copy.deepcopy(indices_lst)
-            for i, next_indices in enumerate(next_indices_lst):
-                next_indices[name] = next_index_lst[i]
-                action =(name, direction_lst[i])
-                if not self.ever_met(next_indices):
-                    ret_from_lst.append((indices_lst[i], value_lst[i]))
-                    ret_indices_lst.append(next_indices)
-                    ret_action_lst.append(action)
-        return ret_from_lst, ret_indices_lst, ret_action_lst
-    
-    def full_walk(self, indices, no_repeat=True):
-        next_indices_lst = []
-        action_lst = []
-        for name, index in indices.items():
-            next_index_lst, actions = self.walkers[name].full_walk(index)
-            for next_index, action in zip(next_index_lst, actions):
-                next_indices = copy.deepcopy(indices)
-                next_indices[name] = next_index
-                if no_repeat:
-                    if not self.ever_met(next_indices):
-                        next_indices_lst.append(next_indices)
-                        action_lst.append((name, action))                            
-                else:
-                    next_indices_lst.append(next_indices)
-                    action_lst.append(action)
-        return next_indices_lst, action_lst
-    
-    def add_data(self, name, pre_state, action, post_state, reward):
-        self.walkers[name].add_data(self.flatten(pre_state), action, self.flatten(post_state), reward)
-
-    def train_walkers(self):
-        for _, walker in self.walkers.items():
-            walker.train(lr=self.lr)
-    
-    def add_perf_data(self, indices_lst, performance_lst):
-        inputs = []
-        for indices in indices_lst:
-            inputs.append(self.flatten(indices))
-        self.perfromance_data.append((inputs, performance_lst))
-
-    def train_on_perf(self, save=True):
-        train_data = self.perfromance_data
-        data_size = min(len(train_data), 1000)
-        print("train data size is %d" % data_size)
-        np.random.shuffle(train_data)
-        optimizer = torch.optim.Adadelta(self.performance_judger.parameters(), lr=self.lr)
-        for ep in range(20):
-            loss = 0.0
-            full_loss = 0.0
-            for p_data in range(data_size):
-                x = train_data[p_data][0]
-                t = train_data[p_data][1]
-                y = self.performance_judger(torch.FloatTensor(x)).reshape(-1)
-                tmp_loss = rank_loss(y, torch.FloatTensor(t))
-                loss = loss + tmp_loss
-                full_loss += tmp_loss.detach()
-                if (p_data + 1) % 32 == 0:
-                    optimizer.zero_grad()
-                    loss.backward()
-                    optimizer.step()
-                    loss = 0.0
-            if loss > 0.0:
-                optimizer.zero_grad()
-                loss.backward()
-                optimizer.step()
-            if save:
-                self.save_performance_judger(self.model_path)
-            print("[cur/total]=[%d/%d] | loss=%f" % (ep + 1, 20, full_loss))
-    
-    def test_accuracy(self):
-        train_data = self.perfromance_data
-        data_size = min(len(train_data), 1000)
-        print("test data size is %d" % data_size)
-        np.random.shuffle(train_data)
-        loss = 0.0
-        for p_data in range(data_size):
-            x = train_data[p_data][0]
-            t = train_data[p_data][1]
-            y = self.performance_judger(torch.FloatTensor(x)).reshape(-1)
-            tmp_loss = rank_loss(y, torch.FloatTensor(t))
-            loss = loss + tmp_loss
-        return float(loss.detach()) / data_size
-
-    def query_performance(self, indices_lst):
-        inputs = []
-        for indices in indices_lst:
-            inputs.append(self.flatten(indices))
-        # empty inputs
-        if not inputs:
-            return []
-        perf_lst = self.performance_judger(torch.FloatTensor(inputs)).reshape(-1)
-        return perf_lst.detach().tolist()
-
-    def load_performance_judger(self, model_path):
-        self.performance_judger.load_state_dict(torch.load(model_path))
-
-    def save_performance_judger(self, model_path):
-        torch.save(self.performance_judger.state_dict(), model_path)
-
-    def dump_performance_data(self, data_path):
-        with open(data_path, "a") as fout:
-            for data in self.perfromance_data:
-                string = json.dumps(data)
-                fout.write(string + "\n")
-    
-    def load_performance_data(self, data_path):
-        with open(data_path, "r") as fin:
-            for line in fin:
-                data = tuple(json.loads(line))
-                self.perfromance_data.append(data)
-
-    def dump_data(self):
-        self.dump_performance_data(self.data_path)
-        for _, walker in self.walkers.items():
-            walker.dump_data()
-
-    def load_walker_model(self):
-        for _, walker in self.walkers.items():
-            walker.load_or_create_model()
-
-    def load_walker_data(self):
-        for _, walker in self.walkers.items():
-            walker.prepare_data()
-
-    def prepare_performance_data(self):
-        if not os.path.exists(self.data_path):
-            raise RuntimeError("Performance data file not found %s" % self.data_path)
-        self.load_performance_data(self.data_path)
-
-    def load_or_create_model(self):
-        if not os.path.exists(self.model_path):
-            self.save_performance_judger(self.model_path)
-        else:
-            self.load_performance_judger(self.model_path)
-
-    def clear_performance_data(self):
-        self.perfromance_data.clear()
-    
-    def clear_walker_data(self):
-        for _, walker in self.walkers.items():
-            walker.clear_data()
-    
-    def clear_data(self):
-        self.clear_performance_data()
-        self.clear_walker_data
@@ -10,6 +10,8 @@ from flextensor.utils import Config, RpcInfo
 from flextensor.task import Task, TASK_TABLE
 from flextensor.scheduler import schedule, schedule_with_config
 from flextensor.measure import _evaluate
+from flextensor.record import RecordDatabase
+from flextensor.tuner import MultiTaskTuner
 from flextensor.utils import to_tuple
 from flextensor.configs.conv2d_config import *
 
@@ -88,8 +90,13 @@ def evaluate(name, s, bufs, target, dev_id, number, rpc_info):
 
 
 def optimize(prefix, from_, shapes, target="llvm", dev_id=0, trials=100, timeout=4.0,
-    parallel=1, method="searching", use_model=False, rpc_info=None, force_inline=False, logfile=sys.stdout):
+    parallel=1, method="searching", use_model=False, rpc_info=None, force_inline=False, logfile=sys.stdout,
+    records=None, transfer=0):
     ret = dict()
+    kwargs = {}
+    if records is not None:
+        kwargs["records"] = records
+        kwargs["transfer"] = transfer
     for i, shape in enumerate(shapes):
         print("Optimize {} convolution layer {} shape {}".format(prefix, i + 1 + from_, shape), flush=True)
         batch, in_channel, height, width, out_channel, _, k_h, k_w, _, stride, padding, dilation, groups = shape
@@ -114,6 +121,7 @@ def optimize(prefix, from_, shapes, target="llvm", dev_id=0, trials=100, timeout
             trials=[trials//10, trials],
             force_inline=force_inline,
             rpc_info=rpc_info,
+            **kwargs
             )
         end = time.time()
         # print(tvm.lower(s, bufs, simple_mode=True))
@@ -140,6 +148,43 @@ def optimize(prefix, from_, shapes, target="llvm", dev_id=0, trials=100, timeout
     return ret
 
 
+def optimize_network(prefix, from_, shapes, target="llvm", dev_id=0, budget=3600.0, round_trials=10, timeout=4.0,
+    parallel=1, method="searching", rpc_info=None, force_inline=False, logfile=sys.stdout, records=None):
+    """Tune all the shapes within `budget` seconds, the trials go to the shapes that gain the most"""
+    task_keys = []
+    weights = []
+    pos_of = dict()
+    for i, shape in enumerate(shapes):
+        batch, in_channel, height, width, out_channel, _, k_h, k_w, _, stride, padding, dilation, groups = shape
+        args = (batch, in_channel, height, width, out_channel, k_h, stride, padding, dilation, groups)
+        # a shape occurring more than once weighs more
+        if args in pos_of:
+            weights[pos_of[args]] += 1
+            continue
+        task = Task("conv2d", prefix + str(i + from_), None, args, target, dev_id)
+        pos_of[args] = len(task_keys)
+        task_keys.append(task.key)
+        weights.append(1)
+    kwargs = {}
+    if rpc_info is not None:
+        kwargs["rpc_info"] = rpc_info
+    if force_inline:
+        kwargs["force_inline"] = force_inline
+    tuner = MultiTaskTuner(task_keys, weights, round_trials=round_trials, parallel=parallel, records=records,
+                           timeout=timeout, op_stop=30, method=method, **kwargs)
+    beg = time.time()
+    ret = dict()
+    for key, (configs, latency) in tuner.tune(time_budget=budget).items():
+        if configs is None:
+            print("No valid schedule for", key)
+            continue
+        ret[key] = configs
+        print(key + ":" + json.dumps(configs), file=logfile, flush=True)
+        print(key, "use", latency, "ms")
+    print("Cost", time.time() - beg, "s")
+    return ret
+
+
 def test(task_key, configs, dev_id=None, rpc_info=None):
     task = TASK_TABLE[task_key]
     s, bufs = schedule_with_config(task_key, configs)
@@ -178,12 +223,17 @@ if __name__ == "__main__":
     parser.add_argument("--port", type=int, default=9090)
     parser.add_argument("--force_inline", action="store_true")
     parser.add_argument("--use_rpc", action="store_true")
+    parser.add_argument("--records", help="tuning record database, reused and resumed from", type=str, default="")
+    parser.add_argument("--transfer", help="warm start from the records of how many nearest shapes", type=int, default=0)
+    parser.add_argument("--budget", help="tune all the shapes together within how many seconds, 0 for shape by shape", type=float, default=0)
+    parser.add_argument("--round_trials", help="number of trials per round when tuning within a budget", type=int, default=10)
     # parser.add_argument("--op_hint", type=str, default="split_fuse")
     args = parser.parse_args()
     if args.use_rpc:
         rpc_info = RpcInfo(args.host, args.port, target_host=args.target_host)
     else:
         rpc_info = None
+    records = RecordDatabase(args.records) if args.records != "" else None
     if args.shapes != "":
         shapes = shape_dict[args.shapes]
         if args.to < 0:
@@ -191,7 +241,27 @@ if __name__ == "__main__":
         else:
             end = args.to
         
-        if args.log != "":
+        if args.budget > 0:
+            flog = open(args.log, "a") if args.log != "" else sys.stdout
+            ret = optimize_network(
+                args.shapes,
+                args.from_,
+                shapes[args.from_:end],
+                target=args.target,
+                dev_id=args.device,
+                budget=args.budget,
+                round_trials=args.round_trials,
+                timeout=args.timeout,
+                parallel=args.parallel,
+                method=args.method,
+                rpc_info=rpc_info,
+                force_inline=args.force_inline,
+                logfile=flog,
+                records=records,
+                )
+            if flog is not sys.stdout:
+                flog.close()
+        elif args.log != "":
             with open(args.log, "a") as flog:
                 ret = optimize(
                     args.shapes, args.from_, 
@@ -206,6 +276,8 @@ if __name__ == "__main__":
                     rpc_info=rpc_info,
                     force_inline=args.force_inline,
                     logfile=flog,
+                    records=records,
+                    transfer=args.transfer,
                     )
         else:
             ret = optimize(
@@ -222,6 +294,8 @@ if __name__ == "__main__":
                 rpc_info=rpc_info,
                 force_inline=args.force_inline,
                 logfile=sys.stdout,
+                records=records,
+                transfer=args.transfer,
                 )
     if args.test != "":
         with open(args.test, "r") as fin:
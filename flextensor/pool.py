@@ -0,0 +1,326 @@
+import os
+import time
+import signal
+import pickle
+import importlib
+import threading
+# no tensor is passed to the workers, torch.multiprocessing is not needed
+import multiprocessing as _multi
+from queue import Queue
+from flextensor import trace
+try:
+    import psutil
+except ImportError:
+    raise RuntimeError("psutil not found, please install it [Hint: `pip install psutil`]")
+
+
+# modules imported by every worker before it accepts jobs
+PRELOAD_MODULES = ["numpy", "tvm", "flextensor.task", "flextensor.scheduler"]
+# the start method of the helper processes, "forkserver" if available else "spawn"
+START_METHOD_ENV = "FLEXTENSOR_START_METHOD"
+# modules the fork server imports once, the processes forked from it start with them loaded
+FORKSERVER_PRELOAD = ["__main__", "numpy", "tvm", "flextensor.pool", "flextensor.task", "flextensor.space",
+                      "flextensor.scheduler"]
+
+_context = None
+
+
+def get_mp_context():
+    """The multiprocessing context of the helper processes
+
+    A fork server preloads the heavy modules once and forks every process from that warm image,
+    so a process starts in milliseconds. The processes are still fresh ones:
+    the fork server never touches a device and runs no threads of the tuner.
+    Falls back to "spawn" where there is no fork server.
+    Note the fork server keeps the environment of its start, set the variables before.
+    """
+    global _context
+    if _context is None:
+        method = os.environ.get(START_METHOD_ENV, "")
+        if method == "":
+            method = "forkserver" if "forkserver" in _multi.get_all_start_methods() else "spawn"
+        _context = _multi.get_context(method)
+        if method == "forkserver":
+            _context.set_forkserver_preload(FORKSERVER_PRELOAD)
+    return _context
+
+
+def get_child_context():
+    """The context of the processes started by a helper process
+
+    A helper forks its own children, it has not touched a device
+    """
+    if get_mp_context().get_start_method() == "forkserver":
+        return _multi.get_context("fork")
+    return get_mp_context()
+
+
+multi = get_mp_context()
+
+
+def kill_child_processes(parent_pid, sig=signal.SIGTERM):
+    """kill all child processes recursively"""
+    try:
+        parent = psutil.Process(parent_pid)
+    except psutil.NoSuchProcess:
+        return
+    children = parent.children(recursive=True)
+    for process in children:
+        try:
+            process.send_signal(sig)
+        except psutil.NoSuchProcess:
+            return
+
+
+def _picklable_exception(e):
+    """The exception itself if it survives the pipe, else a RuntimeError with its message"""
+    try:
+        pickle.loads(pickle.dumps(e))
+        return e
+    except Exception:
+        return RuntimeError(str(e))
+
+
+def _worker_loop(conn, preload, trace_dir):
+    # processes forked from the fork server do not inherit the current environment
+    if trace_dir is not None:
+        trace.enable(trace_dir)
+    for name in preload:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print("[FlexTensor] [Warning] Worker %d fails to preload %s: %s" % (os.getpid(), name, str(e)))
+    conn.send("ready")
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        func, args, kwargs = job
+        try:
+            res = func(*args, **kwargs)
+        except Exception as e:
+            res = _picklable_exception(e)
+        try:
+            conn.send(res)
+        except Exception as e:
+            # unpicklable result
+            conn.send(RuntimeError(str(e)))
+    conn.close()
+
+
+class PoolResult(object):
+    """The handle returned by `WorkerPool.submit`
+
+    has the same `get` interface as `Result`, exceptions are returned, not raised
+    """
+    def __init__(self):
+        self._event = threading.Event()
+        self._value = None
+
+    def set(self, value):
+        self._value = value
+        self._event.set()
+
+    def ready(self):
+        return self._event.is_set()
+
+    def get(self, timeout=None):
+        # the job timeout is enforced by the worker, so waiting without timeout is safe
+        if not self._event.wait(timeout):
+            return multi.TimeoutError()
+        return self._value
+
+
+class BatchItem(object):
+    """The result of one item of a job returning a list, has the interface of `PoolResult`"""
+    def __init__(self, result, index):
+        self.result = result
+        self.index = index
+
+    def ready(self):
+        return self.result.ready()
+
+    def get(self, timeout=None):
+        # the whole batch may take longer than the timeout of one item,
+        # the job timeout is enforced by the worker
+        res = self.result.get()
+        if isinstance(res, Exception):
+            return res
+        return res[self.index]
+
+
+class _Worker(object):
+    def __init__(self, pool, no):
+        self.pool = pool
+        self.no = no
+        self.process = None
+        self.conn = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _spawn(self):
+        parent_conn, child_conn = multi.Pipe()
+        p = multi.Process(target=_worker_loop, args=(child_conn, self.pool.preload, trace.trace_dir()), daemon=True)
+        p.start()
+        child_conn.close()
+        self.process = p
+        self.conn = parent_conn
+        # wait for the preloading, it is not counted in the job timeout
+        try:
+            if parent_conn.poll(self.pool.startup_timeout):
+                parent_conn.recv()
+                return True
+        except (EOFError, OSError):
+            pass
+        print("[FlexTensor] [Warning] Worker %d fails to start" % self.no)
+        self._kill()
+        return False
+
+    def _kill(self):
+        if self.process is not None:
+            if self.process.is_alive():
+                kill_child_processes(self.process.pid)
+                self.process.terminate()
+            self.process.join()
+            self.process = None
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def _execute(self, func, timeout, args, kwargs):
+        if self.process is None or not self.process.is_alive():
+            self._kill()
+            if not self._spawn():
+                return RuntimeError("Worker %d is not available" % self.no)
+        try:
+            self.conn.send((func, args, kwargs))
+            if self.conn.poll(timeout):
+                return self.conn.recv()
+            res = multi.TimeoutError()
+        except (EOFError, OSError) as e:
+            res = RuntimeError("Worker %d died: %s" % (self.no, str(e)))
+        # hang or crash, respawn
+        self._kill()
+        self._spawn()
+        return res
+
+    def _run(self):
+        self._spawn()
+        while True:
+            job = self.pool.jobs.get()
+            if job is None:
+                break
+            func, timeout, args, kwargs, result, submit_time = job
+            trace.emit("queue_wait", submit_time, time.time(), func=func.__name__)
+            result.set(self._execute(func, timeout, args, kwargs))
+        if self.conn is not None:
+            try:
+                self.conn.send(None)
+            except (EOFError, OSError):
+                pass
+            if self.process is not None:
+                self.process.join(timeout=1.0)
+        self._kill()
+
+
+class WorkerPool(object):
+    """A pool of long-lived worker processes
+
+    Workers import `preload` once at start-up, so each job runs
+    in an already initialized interpreter. A job that exceeds its
+    timeout or crashes its worker gets `multi.TimeoutError`
+    or `RuntimeError` as result and the worker is replaced.
+    """
+    def __init__(self, num_workers, preload=None, startup_timeout=120.0):
+        self.num_workers = max(num_workers, 1)
+        self.preload = PRELOAD_MODULES if preload is None else preload
+        self.startup_timeout = startup_timeout
+        self.jobs = Queue()
+        self.workers = [_Worker(self, i) for i in range(self.num_workers)]
+
+    def submit(self, func, timeout, *args, **kwargs):
+        result = PoolResult()
+        self.jobs.put((func, timeout, args, kwargs, result, time.time()))
+        return result
+
+    def shutdown(self):
+        for _ in self.workers:
+            self.jobs.put(None)
+        for worker in self.workers:
+            worker.thread.join()
+        self.workers = []
+
+
+def available_cores():
+    """The cores this process may run on"""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+class MeasureSlots(object):
+    """Disjoint sets of cores for concurrent CPU measurements
+
+    A measurement holds a slot while it runs and is pinned to the cores of it,
+    so measurements running at the same time never share a core.
+    The builders run on the same cores, so no slot is handed out while a
+    scheduler has builds in flight, and no build starts while a slot is taken
+    or a measurement waits for one.
+    Slots are thread safe, schedulers in different threads may share them.
+    """
+    def __init__(self, num_slots, cores=None):
+        cores = available_cores() if cores is None else list(cores)
+        num_slots = max(1, min(num_slots, len(cores)))
+        per_slot = len(cores) // num_slots
+        self.partitions = [cores[i * per_slot:(i + 1) * per_slot] for i in range(num_slots)]
+        self.free = list(range(num_slots))
+        self.builders = set()
+        self.waiting = 0
+        self.cond = threading.Condition()
+
+    def __len__(self):
+        return len(self.partitions)
+
+    def cores(self, slot):
+        return self.partitions[slot]
+
+    def try_acquire(self):
+        """A free slot, None if all are taken or builds are in flight"""
+        with self.cond:
+            if not self.free or self.builders:
+                return None
+            return self.free.pop(0)
+
+    def acquire(self, timeout=None):
+        """Wait for a free slot and no builds in flight, None on timeout"""
+        with self.cond:
+            self.waiting += 1
+            try:
+                if not self.cond.wait_for(lambda: self.free and not self.builders, timeout):
+                    return None
+                return self.free.pop(0)
+            finally:
+                self.waiting -= 1
+
+    def release(self, slot):
+        with self.cond:
+            self.free.append(slot)
+            self.cond.notify_all()
+
+    def begin_build(self, owner):
+        """Wait until no measurement runs or waits, then count the builds of owner as in flight"""
+        with self.cond:
+            if owner in self.builders:
+                return
+            self.cond.wait_for(lambda: len(self.free) == len(self.partitions) and not self.waiting)
+            self.builders.add(owner)
+
+    def end_build(self, owner):
+        with self.cond:
+            if owner in self.builders:
+                self.builders.discard(owner)
+                self.cond.notify_all()
@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import sqlite3
+import platform
+import threading
+
+
+def default_record_path():
+    return os.path.join(os.path.expanduser("~"), ".cache", "flextensor", "records.db")
+
+
+def _cpu_model_name():
+    try:
+        with open("/proc/cpuinfo", "r") as fin:
+            for line in fin:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor()
+
+
+def hardware_fingerprint(target, dev_id=0, rpc_info=None):
+    """A string telling apart the devices a latency is measured on"""
+    parts = [str(target)]
+    if rpc_info is not None:
+        if rpc_info.device_key is not None:
+            parts.append("rpc:" + str(rpc_info.device_key))
+        else:
+            parts.append("rpc:%s:%s" % (rpc_info.host, rpc_info.port))
+        parts.append(str(rpc_info.target))
+        parts.append(str(rpc_info.target_host))
+        return "|".join(parts)
+    parts.append(platform.machine())
+    parts.append(_cpu_model_name())
+    if not str(target).startswith("llvm"):
+        try:
+            import tvm
+            ctx = tvm.context(target, dev_id)
+            if ctx.exist:
+                parts.append(str(ctx.device_name))
+        except Exception:
+            pass
+    return "|".join(parts)
+
+
+def _to_json(obj):
+    # numpy scalars and arrays
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError("%s is not JSON serializable" % type(obj))
+
+
+def dumps(obj):
+    return json.dumps(obj, sort_keys=True, default=_to_json)
+
+
+class RecordDatabase(object):
+    """Append-only store of measured configs
+
+    Every record is a latency measured for one config of one stage ("op0", "op1", ..., "graph")
+    of a task, or the "final" latency of the whole schedule. A stage config is only comparable
+    with the same `context`, which is the configs decided before the stage.
+    """
+    def __init__(self, path=None):
+        self.path = default_record_path() if path is None else path
+        dirname = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(dirname, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, timeout=60.0, check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS records ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "task_key TEXT NOT NULL, "
+                "hardware TEXT NOT NULL, "
+                "stage TEXT NOT NULL, "
+                "context TEXT NOT NULL, "
+                "config TEXT NOT NULL, "
+                "latency REAL NOT NULL, "
+                "timestamp REAL NOT NULL)")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS records_config ON records "
+                "(task_key, hardware, stage, context, config)")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS records_latency ON records "
+                "(task_key, hardware, stage, latency)")
+
+    def add(self, task_key, hardware, stage, context, config, latency):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO records (task_key, hardware, stage, context, config, latency, timestamp) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (task_key, hardware, stage, dumps(context), dumps(config), float(latency), time.time()))
+
+    def lookup(self, task_key, hardware, stage, context, config):
+        """The latest latency of the config, None if never measured"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT latency FROM records "
+                "WHERE task_key = ? AND hardware = ? AND stage = ? AND context = ? AND config = ? "
+                "ORDER BY id DESC LIMIT 1",
+                (task_key, hardware, stage, dumps(context), dumps(config))).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def history(self, task_key, hardware, stage, context):
+        """All the (config, latency) measured in the context, the best first"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT config, MIN(latency) AS best FROM records "
+                "WHERE task_key = ? AND hardware = ? AND stage = ? AND context = ? "
+                "GROUP BY config ORDER BY best",
+                (task_key, hardware, stage, dumps(context))).fetchall()
+        return [(json.loads(config), latency) for config, latency in rows]
+
+    def best(self, task_key, hardware, stage="final"):
+        """The (config, latency) of the best record, None if no record"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT config, latency FROM records "
+                "WHERE task_key = ? AND hardware = ? AND stage = ? "
+                "ORDER BY latency LIMIT 1",
+                (task_key, hardware, stage)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def best_per_task(self, hardware, stage="final"):
+        """The best (config, latency) of every task"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT task_key, config, MIN(latency) FROM records "
+                "WHERE hardware = ? AND stage = ? GROUP BY task_key",
+                (hardware, stage)).fetchall()
+        return dict((task_key, (json.loads(config), latency)) for task_key, config, latency in rows)
+
+    def records(self, hardware=None):
+        """All the (task_key, hardware, stage, context, config, latency), of one hardware if given"""
+        query = "SELECT task_key, hardware, stage, context, config, latency FROM records"
+        args = ()
+        if hardware is not None:
+            query += " WHERE hardware = ?"
+            args = (hardware,)
+        with self.lock:
+            rows = self.conn.execute(query + " ORDER BY id", args).fetchall()
+        return [(task_key, hw, stage, json.loads(context), json.loads(config), latency)
+                for task_key, hw, stage, context, config, latency in rows]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
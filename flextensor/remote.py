@@ -0,0 +1,187 @@
+import os
+import math
+import hashlib
+import numpy as np
+import tvm
+from tvm import rpc
+from flextensor.utils import to_tuple
+from flextensor import trace
+
+
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as fin:
+        for chunk in iter(lambda: fin.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class RemoteSession(object):
+    """A device session requested once from the tracker and reused
+
+    Modules are uploaded under the hash of their content,
+    so the same module is uploaded once per session.
+    """
+    def __init__(self, server_ip, server_port, device_key, priority=1, session_timeout=10000):
+        self.key = (server_ip, server_port, device_key)
+        tracker = rpc.connect_tracker(server_ip, server_port)
+        self.remote = tracker.request(device_key, priority=priority, session_timeout=session_timeout)
+        # content hash -> remote file name
+        self.uploaded = {}
+
+    def context(self, target, dev_id=0):
+        return self.remote.context(target, dev_id)
+
+    def upload(self, path):
+        """Upload the file unless it has been, returns its remote name"""
+        digest = file_hash(path)
+        if digest not in self.uploaded:
+            name = digest + os.path.splitext(path)[1]
+            self.remote.upload(path, target=name)
+            self.uploaded[digest] = name
+        return self.uploaded[digest]
+
+    def load_module(self, path):
+        return self.remote.load_module(self.upload(path))
+
+
+# the sessions of this process, by (tracker ip, tracker port, device key)
+SESSIONS = {}
+
+
+def get_session(server_ip, server_port, device_key):
+    key = (server_ip, server_port, device_key)
+    if key not in SESSIONS:
+        SESSIONS[key] = RemoteSession(server_ip, server_port, device_key)
+    return SESSIONS[key]
+
+
+def drop_session(server_ip, server_port, device_key):
+    """Forget a session, e.g. after an error, the next `get_session` requests a new one"""
+    SESSIONS.pop((server_ip, server_port, device_key), None)
+
+
+def tracker_queue(server_ip, server_port, device_key):
+    """The (devices, pending requests) of device_key at the tracker, None if unknown"""
+    try:
+        summary = rpc.connect_tracker(server_ip, server_port).summary()
+        devices = len([x for x in summary["server_info"] if x["key"].split(":")[-1] == device_key])
+        pending = summary["queue_info"].get(device_key, {}).get("pending", 0)
+    except Exception:
+        return None
+    return devices, pending
+
+
+def device_count(server_ip, server_port, device_key):
+    """The number of devices of device_key at the tracker, None if unknown"""
+    queue = tracker_queue(server_ip, server_port, device_key)
+    if queue is None or queue[0] == 0:
+        return None
+    return queue[0]
+
+
+def yield_session(server_ip, server_port, device_key):
+    """A session holds its device, give it back when another request waits for one"""
+    queue = tracker_queue(server_ip, server_port, device_key)
+    if queue is not None and queue[1] > 0:
+        drop_session(server_ip, server_port, device_key)
+
+
+# the 97.5% quantiles of Student's t distribution by degrees of freedom
+T_QUANTILES = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+               2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+               2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+
+def t_quantile(dof):
+    """The two-sided 95% quantile of Student's t distribution"""
+    if dof <= len(T_QUANTILES):
+        return T_QUANTILES[dof - 1]
+    return 1.96
+
+
+def measure_adaptive(func, ctx, arys, min_repeat_ms, reject_threshold=None, repeat=3, max_repeat_ms=1000.0):
+    """Measure with the number of runs chosen to last `min_repeat_ms` per repeat
+
+    no repeat lasts longer than `max_repeat_ms` by the probe estimate,
+    stop after the probe if it is slower than `reject_threshold`,
+    returns the mean cost in ms and its 95% confidence interval (None if rejected)
+    """
+    # the first probe run also warms up the device
+    probe = func.time_evaluator(func.entry_name, ctx, number=1, repeat=2)(*arys)
+    probe_cost = min(probe.results) * 1e3
+    if reject_threshold is not None and probe_cost > reject_threshold:
+        return probe_cost, None
+    run_ms = max(probe_cost, 1e-6)
+    number = min(math.ceil(min_repeat_ms / run_ms), math.floor(max_repeat_ms / run_ms))
+    number = int(max(number, 1))
+    res = func.time_evaluator(func.entry_name, ctx, number=number, repeat=repeat)(*arys)
+    costs = [x * 1e3 for x in res.results]
+    mean = sum(costs) / len(costs)
+    if len(costs) > 1:
+        std = math.sqrt(sum([(x - mean) ** 2 for x in costs]) / (len(costs) - 1))
+        interval = t_quantile(len(costs) - 1) * std / math.sqrt(len(costs))
+    else:
+        interval = 0.0
+    return mean, interval
+
+
+def remote_evaluate(session, func_path, bufs_shape, dtype, target, number=100, dev_id=0,
+                    min_repeat_ms=None, reject_threshold=None, repeat=3):
+    """The mean cost in ms of one run of the module at func_path on the session device
+
+    with its confidence interval if measured adaptively, see `measure_adaptive`
+    """
+    ctx = session.context(target, dev_id)
+    tvm_arys = []
+    with trace.span("eval.data"):
+        for i, shape in enumerate(bufs_shape):
+            tmp = np.random.uniform(0, 1, size=to_tuple(shape)).astype(dtype[i])
+            tvm_arys.append(tvm.nd.array(tmp, ctx))
+    try:
+        with trace.span("eval.load"):
+            func = session.load_module(func_path)
+        with trace.span("eval.run"):
+            if min_repeat_ms is not None:
+                return measure_adaptive(func, ctx, tvm_arys, min_repeat_ms,
+                                        reject_threshold=reject_threshold, repeat=repeat)
+            evaluator = func.time_evaluator(func.entry_name, ctx, number=number)
+            return evaluator(*tvm_arys).mean * 1e3
+    finally:
+        while len(tvm_arys) > 0:
+            del tvm_arys[-1]
+
+
+def session_alive(session, target, dev_id=0):
+    try:
+        return session.context(target, dev_id).exist
+    except Exception:
+        return False
+
+
+def remote_evaluate_batch(rpc_info, func_paths, bufs_shapes, dtypes, target, number=100, dev_id=0,
+                          min_repeat_ms=None, reject_threshold=None, repeat=3):
+    """Measure several modules in one session, inf for the ones failing
+
+    a broken session is requested again once, the session is kept
+    for the next batch unless another request waits for the device
+    """
+    ret = []
+    for func_path, bufs_shape, dtype in zip(func_paths, bufs_shapes, dtypes):
+        cost = float("inf")
+        for retry in range(2):
+            session = None
+            try:
+                session = get_session(rpc_info.server_ip, rpc_info.server_port, rpc_info.device_key)
+                cost = remote_evaluate(session, func_path, bufs_shape, dtype, target, number=number, dev_id=dev_id,
+                                       min_repeat_ms=min_repeat_ms, reject_threshold=reject_threshold, repeat=repeat)
+                break
+            except Exception as e:
+                print("[FlexTensor] [Warning] Remote measurement of %s fails: %s" % (func_path, str(e)))
+                if session is not None and session_alive(session, target, dev_id):
+                    # the module fails, not the session
+                    break
+                drop_session(rpc_info.server_ip, rpc_info.server_port, rpc_info.device_key)
+        ret.append(cost)
+    yield_session(rpc_info.server_ip, rpc_info.server_port, rpc_info.device_key)
+    return ret
@@ -1,33 +1,32 @@
 import os
 import time
-import signal
-import shutil
 import math
+import threading
 import tvm
 import numpy as np
-try:
-    import torch.multiprocessing as _multi
-except ImportError:
-    import multiprocessing as _multi
-multi = _multi.get_context("spawn")
 from tvm import rpc
 from collections import deque
 from queue import Empty
 from functools import reduce
 from tvm.micro.base import compile_micro_mod
-from flextensor.task import TASK_TABLE
+from flextensor.task import TASK_TABLE, nearest_tasks
 from flextensor.intrinsic import INTRIN_TABLE
-try:
-    from flextensor.model import WalkerGroup
-except ImportError:
-    print("[FlexTensor] [Warning] Import model module failed, please check if PyTorch is installed.")
+# torch is imported by the model-based methods only
+from flextensor.search import WalkerGroup
 from flextensor.space import generate_space_inter_op, generate_space_intra_op, \
                              generate_empty_space_inter_op, generate_op_space_with_intrin
 from flextensor.utils import assert_print, to_int, to_tuple, Config, RpcInfo
-try:
-    import psutil
-except ImportError:
-    raise RuntimeError("psutil not found, please install it [Hint: `pip install psutil`]")
+from flextensor.pool import WorkerPool, PoolResult, BatchItem, MeasureSlots, get_mp_context, get_child_context, \
+    kill_child_processes
+from flextensor.artifact import ArtifactStore, KernelCache
+from flextensor.record import RecordDatabase, hardware_fingerprint
+from flextensor.checkpoint import Checkpoint, SearchSuspended
+from flextensor.remote import get_session, yield_session, device_count, remote_evaluate_batch, measure_adaptive
+from flextensor import trace
+
+
+# processes forked from a preloaded fork server, see flextensor.pool
+multi = get_mp_context()
 
 
 LIB_DIR = "lib"
@@ -55,6 +54,44 @@ def flatten_graph(ops):
             down_graph[t].append(cur)
     return list(reversed(bfs_order)), down_graph
 
+
+def op_ancestors(op_lst):
+    """The positions of the ops each op of op_lst reads from, directly or not"""
+    pos_of = dict((op, i) for i, op in enumerate(op_lst))
+    ancestors = [None for op in op_lst]
+
+    def _visit(i):
+        if ancestors[i] is None:
+            ret = set()
+            for t in op_lst[i].input_tensors:
+                if t.op in pos_of:
+                    j = pos_of[t.op]
+                    ret.add(j)
+                    ret.update(_visit(j))
+            ancestors[i] = ret
+        return ancestors[i]
+
+    for i in range(len(op_lst)):
+        _visit(i)
+    return ancestors
+
+
+def op_waves(op_lst):
+    """Group the positions of op_lst into waves tuned one after another
+
+    an op is scheduled with the configs of the ops before it in op_lst,
+    only those it reads from matter, so it waits for them and nothing else
+    """
+    ancestors = op_ancestors(op_lst)
+    wave_of = []
+    for i in range(len(op_lst)):
+        wave_of.append(max([wave_of[j] + 1 for j in ancestors[i] if j < i] + [0]))
+    waves = [[] for i in range(max(wave_of + [-1]) + 1)]
+    for i, w in enumerate(wave_of):
+        waves[w].append(i)
+    return waves
+
+
 def verify_code(stmt, target, dev_id):
     if target == "cuda":
         ctx = tvm.nd.context(target, dev_id)     # just use device 0
@@ -76,7 +113,13 @@ def verify_code(stmt, target, dev_id):
         return True
 
 
-def build_func(func_name, task_key, configs, op_pos=None, rpc_info=None, rewrite=False):
+def build_func(func_name, task_key, configs, op_pos=None, rpc_info=None, rewrite=False, lib_dir=LIB_DIR,
+               kernel_cache=None, hardware="local", remeasure=False):
+    """
+    returns (shapes, dtypes, cache key, cached latency),
+    the latter two are None without a kernel cache or on a cache miss,
+    the cached latency is None when `remeasure`, only the module is reused
+    """
     if rpc_info is not None and rpc_info.target_host is not None:
         target_host = rpc_info.target_host
     else:
@@ -84,43 +127,72 @@ def build_func(func_name, task_key, configs, op_pos=None, rpc_info=None, rewrite
 
     task = TASK_TABLE[task_key]
     # try:
-    s, bufs = schedule_with_config(task_key, configs, op_pos=op_pos, rewrite=rewrite)
+    with trace.span("build.schedule"):
+        s, bufs = schedule_with_config(task_key, configs, op_pos=op_pos, rewrite=rewrite)
     # except Exception as e:
     #     print(e)
 
-    stmt = tvm.lower(s, bufs, simple_mode=True)
-    valid = verify_code(stmt, task.target, task.dev_id)
+    with trace.span("build.lower"):
+        stmt = tvm.lower(s, bufs, simple_mode=True)
+    with trace.span("build.verify"):
+        valid = verify_code(stmt, task.target, task.dev_id)
     if not valid:
         raise RuntimeError("Invalid %s(%d) kernel"%(task.target, task.dev_id))
-    if target_host is not None:
-        if task.target == "micro":
+    shapes, dtypes = [to_tuple(x.shape) for x in bufs], [buf.dtype for buf in bufs]
+    if task.target == "micro":
+        mod_path = os.path.join(lib_dir, func_name + ".obj")
+    else:
+        mod_path = os.path.join(lib_dir, func_name)
+    key = None
+    if kernel_cache is not None:
+        target = rpc_info.target if task.target == "micro" else task.target
+        key = kernel_cache.key(stmt, target, target_host, hardware, task.dev_id)
+        # same code has been measured, no need to build
+        if not remeasure:
+            latency = kernel_cache.load_latency(key)
+            if latency is not None:
+                return (shapes, dtypes, key, latency)
+        if kernel_cache.fetch_module(key, mod_path):
+            return (shapes, dtypes, key, None)
+    micro = target_host is not None and task.target == "micro"
+    with trace.span("build.build"):
+        if micro:
             target = rpc_info.target  # can be "c -device=micro_dev"
+            func = tvm.build(s, bufs, target=target)
+        elif target_host is not None:
+            func = tvm.build(s, bufs, target=task.target, target_host=target_host)
+        else:
+            func = tvm.build(s, bufs, target=task.target)
+    with trace.span("build.export"):
+        if micro:
             micro_device_config = rpc_info.micro_device_config
             aux_sources = rpc_info.aux_sources
             aux_options = rpc_info.aux_options
 
-            func = tvm.build(s, bufs, target=target)
-
-            mod_path = os.path.join(LIB_DIR, func_name + ".obj")
             compile_micro_mod(mod_path,
                     func, micro_device_config,
                     aux_sources=aux_sources,
                     aux_options=aux_options)
-            # func.export_library(os.path.join(LIB_DIR, func_name))
+            # func.export_library(os.path.join(lib_dir, func_name))
         else:
-            func = tvm.build(s, bufs, target=task.target, target_host=target_host)
-            func.export_library(os.path.join(LIB_DIR, func_name))
-    else:
-        func = tvm.build(s, bufs, target=task.target)
-        func.export_library(os.path.join(LIB_DIR, func_name))
-    result = ([to_tuple(x.shape) for x in bufs], [buf.dtype for buf in bufs])
-    return result
+            func.export_library(mod_path)
+    if kernel_cache is not None:
+        kernel_cache.store_module(key, mod_path)
+    return (shapes, dtypes, key, None)
 
 
-def eval_func(func_file, bufs_shape, dtype, target, number=100, dev_id=0, rpc_info=None):
+def eval_func(func_file, bufs_shape, dtype, target, number=100, dev_id=0, rpc_info=None, lib_dir=LIB_DIR,
+              min_repeat_ms=None, reject_threshold=None, repeat=3, cpu_cores=None):
     """
-    the target is preprocessed
+    the target is preprocessed,
+    measure `number` runs, or adaptively if `min_repeat_ms` is given,
+    on `cpu_cores` only if given
     """
+    if cpu_cores is not None:
+        # before the TVM thread pool starts, which then keeps to these cores
+        os.sched_setaffinity(0, cpu_cores)
+        os.environ["TVM_NUM_THREADS"] = str(len(cpu_cores))
+        os.environ["TVM_BIND_THREADS"] = "0"
     if rpc_info is not None:
         host = rpc_info.host
         port = rpc_info.port
@@ -145,59 +217,50 @@ def eval_func(func_file, bufs_shape, dtype, target, number=100, dev_id=0, rpc_in
     if use_rpc:
         # remote = rpc.connect(host, port)
 
-        tracker = rpc.connect_tracker(server_ip, server_port)
-
-        remote = tracker.request(device_key, priority=1,
-                             session_timeout=10000)
+        # reused by the later measurements in this process
+        session = get_session(server_ip, server_port, device_key)
 
-        ctx = remote.context(target, dev_id)
+        ctx = session.context(target, dev_id)
     else:
         ctx = tvm.context(target, dev_id)
     tvm_arys = []
-    for i, shape in enumerate(bufs_shape):
-        shape = to_tuple(shape)
-        tmp = np.random.uniform(0, 1, size=shape).astype(dtype[i])
-        tmp = tvm.nd.array(tmp, ctx)
-        tvm_arys.append(tmp)
+    with trace.span("eval.data"):
+        for i, shape in enumerate(bufs_shape):
+            shape = to_tuple(shape)
+            tmp = np.random.uniform(0, 1, size=shape).astype(dtype[i])
+            tmp = tvm.nd.array(tmp, ctx)
+            tvm_arys.append(tmp)
     try:
-        if use_rpc:
-            if target == "c -device=micro_dev":
-                post_fix = ".obj"
-            else:
-                post_fix = ""
-
-            remote.upload(os.path.join(LIB_DIR, func_file + post_fix))
+        with trace.span("eval.load"):
+            if use_rpc:
+                if target == "c -device=micro_dev":
+                    post_fix = ".obj"
+                else:
+                    post_fix = ""
 
-            func = remote.load_module(func_file + ".obj")
-        else:
-            func = tvm.module.load(os.path.join(LIB_DIR, func_file))
+                func = session.load_module(os.path.join(lib_dir, func_file + post_fix))
+            else:
+                func = tvm.module.load(os.path.join(lib_dir, func_file))
 
-        evaluator = func.time_evaluator(func.entry_name, ctx, number=number)
+        with trace.span("eval.run"):
+            if min_repeat_ms is None:
+                evaluator = func.time_evaluator(func.entry_name, ctx, number=number)
 
-        time_cost = evaluator(*tvm_arys).mean * 1e3
+                time_cost = evaluator(*tvm_arys).mean * 1e3
+            else:
+                time_cost = measure_adaptive(func, ctx, tvm_arys, min_repeat_ms,
+                                             reject_threshold=reject_threshold, repeat=repeat)
     except Exception as e:
         # print(e)
         return float("inf")
     finally:
         while len(tvm_arys) > 0:
             del tvm_arys[-1]
+        if use_rpc:
+            yield_session(server_ip, server_port, device_key)
     return time_cost
 
 
-def kill_child_processes(parent_pid, sig=signal.SIGTERM):
-    """kill all child processes recursively"""
-    try:
-        parent = psutil.Process(parent_pid)
-    except psutil.NoSuchProcess:
-        return
-    children = parent.children(recursive=True)
-    for process in children:
-        try:
-            process.send_signal(sig)
-        except psutil.NoSuchProcess:
-            return
-
-
 def exec_func(func, queue, args, kwargs):
     try:
         res = func(*args, **kwargs)
@@ -206,18 +269,38 @@ def exec_func(func, queue, args, kwargs):
     queue.put(res)
 
 
+def report_failure(msg, res, timeout_msg, key_words):
+    if isinstance(res, multi.TimeoutError):
+        msg = msg + timeout_msg
+    elif isinstance(res, tvm._ffi.base.TVMError):
+        msg = msg + " TVMError "
+    error_str = str(res)
+    found = False
+    for key_word in key_words:
+        if key_word in error_str:
+            msg = msg + error_str[error_str.index(key_word):1000]
+            found = True
+            break
+    if not found:
+        msg = msg + error_str
+    print(msg)
+
+
 def parallel_execute(func, timeout, *args, **kwargs):
     q = multi.Queue()
     p = multi.Process(
         target=call_with_timeout, 
-        args=(func, q, timeout, args, kwargs))
+        args=(func, q, timeout, args, kwargs, trace.trace_dir()))
     p.start()
     return Result(p, q)
 
 
-def call_with_timeout(func, queue, timeout, args, kwargs):
-    q = multi.Queue()
-    p = multi.Process(target=exec_func, args=(func, q, args, kwargs))
+def call_with_timeout(func, queue, timeout, args, kwargs, trace_dir=None):
+    if trace_dir is not None:
+        trace.enable(trace_dir)
+    child_multi = get_child_context()
+    q = child_multi.Queue()
+    p = child_multi.Process(target=exec_func, args=(func, q, args, kwargs))
     p.start()
     try:
         res = q.get(block=True, timeout=timeout)
@@ -250,7 +333,10 @@ def find_idle_device(target):
 
 
 class Scheduler(object):
-    def __init__(self, name, task_key, space, parallel=2, timeout=4.0, trial=100, number=10, early_stop=30, rpc_info=None, rewrite=False):
+    def __init__(self, name, task_key, space, parallel=2, timeout=4.0, trial=100, number=10, early_stop=30, rpc_info=None, rewrite=False,
+                 build_pool=None, kernel_cache=None, records=None, checkpoint=None,
+                 min_repeat_ms=None, reject_factor=None, measure_slots=None, measurer=None):
+        self.name = name
         self.task_key = task_key
         self.space = space
         self.parallel = max(parallel, 1)    # at least 1
@@ -262,6 +348,43 @@ class Scheduler(object):
         self.walker_group = WalkerGroup(self.task.category + "_" + name, self.space)
         self.rpc_info = rpc_info
         self.rewrite = rewrite
+        # persistent build workers, may be shared between schedulers
+        self.build_pool = build_pool
+        self.own_build_pool = False
+        # private directory of the built modules, created on first use
+        self.artifacts = None
+        # modules and latencies shared by configs with the same lowered code
+        self.kernel_cache = kernel_cache
+        # measured configs, looked up before measuring
+        self.records = records
+        if self.records is not None or self.kernel_cache is not None:
+            self.hardware = hardware_fingerprint(self.task.target, self.task.dev_id, self.rpc_info)
+        else:
+            self.hardware = None
+        # the latency of the returned config
+        self.best_value = float("inf")
+        # saves the search state periodically
+        self.checkpoint = checkpoint
+        # adaptive measurement: runs lasting `min_repeat_ms`,
+        # early rejection of candidates slower than `reject_factor` times the best
+        self.min_repeat_ms = min_repeat_ms
+        self.reject_factor = reject_factor
+        # the cores of concurrent local CPU measurements, may be shared between schedulers
+        self.measure_slots = measure_slots
+        # measure while the next candidates are being built,
+        # CPU targets are measured on the cores the builders use, so no overlap
+        self.overlap = not self.task.target.startswith("llvm")
+        self.pipeline_depth = self.parallel
+        # remote measurements run in persistent workers that keep their device sessions,
+        # up to `remote_batch` modules per job
+        self.measure_pool = None
+        self.remote_batch = 4
+        # a `Measurer` giving the latencies in place of building and measuring
+        self.measurer = measurer
+        # the configs built and measured, or simulated, the recorded ones are not
+        self.evaluated = 0
+        # suspend the search once `budget` configs are evaluated, see `suspend`
+        self.budget = None
 
         self.re_evalutate_number = 10
         self.warm_up_epoch = 5
@@ -269,31 +392,24 @@ class Scheduler(object):
 
     def _warm_up(self, warm_up_epoches, warm_up_trials, configs, type_keys, max_repeat=20, use_model=False):
         # perform warmup
+        trace_beg = time.time()
         warm_up_enough = False
         count_repeat = 0
         old_timeout = self.timeout
         while not warm_up_enough:
             for ep in range(warm_up_epoches):
                 warm_up_ret = self.walker_group.forward(warm_up_trials, policy="random")
-                warm_up_configs = [{} for i in range(warm_up_trials)]   # empty configs
-                warm_up_indices = [{} for i in range(warm_up_trials)]   # the indices
+                # skip the points equivalent to measured ones
+                proposed = set()
+                warm_up_indices = []    # the codes
                 for count in range(warm_up_trials):
-                    config = warm_up_configs[count]
-                    for type_key in type_keys:
-                        config[type_key] = []
-                        for name in self.space.types[type_key]:
-                            entity = warm_up_ret[name][0][count]
-                            warm_up_indices[count][name] =  warm_up_ret[name][1][count]
-                            config[type_key].append(entity)
-                    # hack here
-                    # if self.op_pos == 1:
-                    #     warm_up_configs[count] = {
-                    #         "spatial": [[1, 1, 1, 1], [64, 2, 8, 1], [1, 1, 7, 1], [1, 1, 7, 1]],
-                    #         "reduce": [[64, 1, 16], [1, 3, 1], [1, 1, 3]],
-                    #         "unroll": [[1500, 1]]
-                    #     }
-                    # hack here
-                    # warm_up_configs[count] = {"inline": [[False, False]]}
+                    code = self.walker_group.encode(
+                        dict((name, ret[1][count]) for name, ret in warm_up_ret.items()))
+                    if self.walker_group.ever_met(code) or code in proposed:
+                        continue
+                    proposed.add(code)
+                    warm_up_indices.append(code)
+                warm_up_configs = [self.walker_group.to_config(code, type_keys) for code in warm_up_indices]
                 if use_model:
                     warm_up_results = self.walker_group.query_performance(warm_up_indices)
                 else:
@@ -305,11 +421,11 @@ class Scheduler(object):
                     string += "%.6f " % res
                 string += "]"
                 print("[FlexTensor] warm up [%.6f] %s" % (time.time(), string))
-                for count in range(warm_up_trials):
+                for count in range(len(warm_up_indices)):
                     if warm_up_results[count] < float("inf"):
                         self.walker_group.record(warm_up_indices[count], warm_up_results[count])                    
             # if not found valid config
-            if not self.walker_group.top1():
+            if self.walker_group.top1() is None:
                 print("[FlexTensor] Warning: No valid schedule found in warm up process, please use more trials")
                 print("[FlexTensor] Now automatically use more trials, increase %d" % warm_up_trials) 
                 warm_up_epoches = 1
@@ -321,41 +437,73 @@ class Scheduler(object):
             else:
                 warm_up_enough = True
         self.timeout = old_timeout
+        trace.emit("warm_up", trace_beg, time.time(), stage=self.name)
 
     def _random_schedule(self, configs, type_keys, use_model=False):
         # prepare model
         if use_model:
             self.walker_group.load_or_create_model()
+        search = self.resume_search()
+        first_trial = 0 if search is None else search["trial"] + 1
         # random by warm-up
-        for trial in range(self.trial):
+        for trial in range(first_trial, self.trial):
+            self.suspend(trial, first_trial, {"trial": trial - 1}, self.walker_group.top1_value())
             warm_up_epoches = 1
             warm_up_trials = self.parallel
             self._warm_up(warm_up_epoches, warm_up_trials, configs, type_keys, use_model=use_model)
+            self.save_search({"trial": trial})
+        self.best_value = self.walker_group.top1_value()
         return self.walker_group.to_config(self.walker_group.top1())
 
     def _searching_schedule(self, configs, type_keys, use_model=False):
         # prepare model
         if use_model:
             self.walker_group.load_or_create_model()
-        # warm up
-        warm_up_epoches = self.warm_up_number
-        warm_up_trials = self.warm_up_number
-        self._warm_up(warm_up_epoches, warm_up_trials, configs, type_keys, use_model=use_model)
-        
-        # tune
-        minimal = [{}, float("inf")]    # the minimal point found before
-        retired_indices = []            # list of local minimals
+        search = self.resume_search()
+        if search is None:
+            # warm up
+            warm_up_epoches = self.warm_up_number
+            warm_up_trials = self.warm_up_number
+            self._warm_up(warm_up_epoches, warm_up_trials, configs, type_keys, use_model=use_model)
+
+            # tune
+            minimal = [None, float("inf")]  # the minimal point found before
+            retired_indices = []            # list of local minimals
+            value_early_stop = self.walker_group.top1_value()
+            early_stop_count = 0
+            count_incessant_empty_trial = 0
+            first_trial = 0
+        else:
+            minimal = search["minimal"]
+            retired_indices = search["retired_indices"]
+            value_early_stop = search["value_early_stop"]
+            early_stop_count = search["early_stop_count"]
+            count_incessant_empty_trial = search["count_incessant_empty_trial"]
+            first_trial = search["trial"] + 1
+
+        def search_state(trial):
+            return {
+                "trial": trial,
+                "minimal": minimal,
+                "retired_indices": retired_indices,
+                "value_early_stop": value_early_stop,
+                "early_stop_count": early_stop_count,
+                "count_incessant_empty_trial": count_incessant_empty_trial
+            }
+
+        def save_trial(trial):
+            # every trial ends here, also the ones without points to tune
+            self.save_search(search_state(trial))
 
         part = math.ceil(self.trial / 20)
-        value_early_stop = self.walker_group.top1_value()
-        early_stop_count = 0
-        count_incessant_empty_trial = 0
-        for trial in range(self.trial):
+        for trial in range(first_trial, self.trial):
+            self.suspend(trial, first_trial, search_state(trial - 1), min(self.walker_group.top1_value(), minimal[1]))
             if not self.walker_group.has_more():
                 # nothing to tune, re-warm up
                 warm_up_epoches = 1
                 warm_up_trials = self.parallel
                 self._warm_up(warm_up_epoches, warm_up_trials, configs, type_keys, use_model=use_model)
+                save_trial(trial)
                 continue
             from_indices, from_value = self.walker_group.top_random(with_value=True)
             # # print("[FlexTensor] check from", from_indices)
@@ -410,7 +558,8 @@ class Scheduler(object):
             else:
                 cur_best_value = minimal[1]
                 cur_best = minimal[0]
-            print("[FlexTensor] No. %d | [%.6f] The best currently %.6f" % (trial, time.time(), cur_best_value), cur_best)
+            print("[FlexTensor] No. %d | [%.6f] The best currently %.6f" % (trial, time.time(), cur_best_value),
+                  self.walker_group.decode(cur_best))
             # early stop becasue of lasting empty trials
             if count_incessant_empty_trial >= self.early_stop:
                 print("[FlexTensor] Early stop after continuous no trials %d times" % (count_incessant_empty_trial))
@@ -432,18 +581,17 @@ class Scheduler(object):
                         self.walker_group.record(minimal[0], minimal[1], random_reject=False)
                     for retired in retired_indices:
                         self.walker_group.record(retired[0], retired[1], random_reject=False)
-                    minimal[0] = {}
+                    minimal[0] = None
                     minimal[1] = float("inf")
 
                     indices_lst = self.walker_group.topk(self.re_evalutate_number, modify=True)
                     next_configs = [self.walker_group.to_config(indices) for indices in indices_lst]
-                    # use serialized evaluation
+                    # use serialized evaluation, unless measurements have their own cores
                     old_parallel = self.parallel
-                    if self.task.target == "cuda":
+                    if self.get_measure_slots() is None:
                         self.parallel = 1
-                    else:
-                        self.parallel = 1 # min(self.parallel, os.cpu_count())
-                    results = self.parallel_evaluate(configs, next_configs, number=self.number)
+                    # the noisy latencies of the top ones are measured again
+                    results = self.parallel_evaluate(configs, next_configs, number=self.number, remeasure=True)
                     # recover parallel number
                     self.parallel = old_parallel
                     self.walker_group.add_perf_data(indices_lst, results)
@@ -463,11 +611,13 @@ class Scheduler(object):
             warm_up_epoches = 1
             warm_up_trials = self.parallel
             self._warm_up(warm_up_epoches, warm_up_trials, configs, type_keys, use_model=use_model)
+            save_trial(trial)
         # the best
         if self.walker_group.top1_value() < minimal[1]:
             best = self.walker_group.top1()
         else:
             best = minimal[0]         
+        self.best_value = min(self.walker_group.top1_value(), minimal[1])
         return self.walker_group.to_config(best)
 
     def _q_schedule(self, configs, type_keys, use_model=False):
@@ -475,22 +625,42 @@ class Scheduler(object):
         self.walker_group.load_walker_model()
         if use_model:
             self.walker_group.load_or_create_model()
-        # warm up
-        warm_up_epoches = 10
-        warm_up_trials = 20
-        self._warm_up(warm_up_epoches, warm_up_trials, configs, type_keys, use_model=use_model)
-
-        # record best
-        best = self.walker_group.top1()
-        best_value = self.walker_group.top1_value()
-        retired_indices = []
-        # early stop value
-        value_early_stop = best_value
-        early_stop_count = 0
-        # determine start points
-        cur_lst = self.walker_group.topk(self.parallel, modify=True, with_value=True)
+        search = self.resume_search()
+        if search is None:
+            # warm up
+            warm_up_epoches = 10
+            warm_up_trials = 20
+            self._warm_up(warm_up_epoches, warm_up_trials, configs, type_keys, use_model=use_model)
+
+            # record best
+            best = self.walker_group.top1()
+            best_value = self.walker_group.top1_value()
+            retired_indices = []
+            # early stop value
+            value_early_stop = best_value
+            early_stop_count = 0
+            # determine start points
+            cur_lst = self.walker_group.topk(self.parallel, modify=True, with_value=True)
+            first_trial = 0
+        else:
+            best = search["best"]
+            best_value = search["best_value"]
+            retired_indices = search["retired_indices"]
+            value_early_stop = search["value_early_stop"]
+            early_stop_count = search["early_stop_count"]
+            cur_lst = search["cur_lst"]
+            first_trial = search["trial"] + 1
         part = math.ceil(self.trial / 5)
-        for trial in range(self.trial):
+        for trial in range(first_trial, self.trial):
+            self.suspend(trial, first_trial, {
+                "trial": trial - 1,
+                "best": best,
+                "best_value": best_value,
+                "retired_indices": retired_indices,
+                "value_early_stop": value_early_stop,
+                "early_stop_count": early_stop_count,
+                "cur_lst": cur_lst
+            }, best_value)
             from_lst, next_points, action_lst = self.walker_group.walk(cur_lst, trial)
             if use_model:
                 results = self.walker_group.query_performance(next_points)
@@ -512,7 +682,8 @@ class Scheduler(object):
             if self.walker_group.top1_value() < best_value:
                 best_value = self.walker_group.top1_value()
                 best = self.walker_group.top1()
-            print("[FlexTensor] No. %d | [%.6f] The best currently %.6f" % (trial, time.time(), best_value), best)
+            print("[FlexTensor] No. %d | [%.6f] The best currently %.6f" % (trial, time.time(), best_value),
+                  self.walker_group.decode(best))
             # early stop
             if math.fabs(best_value - value_early_stop) < 0.02:
                 early_stop_count += 1
@@ -535,14 +706,14 @@ class Scheduler(object):
                     # re-evaluate
                     if best_value < float("inf"):
                         self.walker_group.record(best, best_value, random_reject=False)
-                        best = {}
+                        best = None
                         best_value = float("inf")
                     for indices, value in retired_indices[-self.parallel:-1]:
                         self.walker_group.record(indices, value, random_reject=False)
                     indices_lst = self.walker_group.topk(self.parallel, modify=True)
-                    print("[FlexTensor] check next indices:", indices_lst)
+                    print("[FlexTensor] check next indices:", [self.walker_group.decode(x) for x in indices_lst])
                     next_configs = [self.walker_group.to_config(indices) for indices in indices_lst]
-                    results = self.parallel_evaluate(configs, next_configs, number=self.number)
+                    results = self.parallel_evaluate(configs, next_configs, number=self.number, remeasure=True)
                     self.walker_group.add_perf_data(indices_lst, results)
                     string = "[ "
                     for res in results:
@@ -559,48 +730,240 @@ class Scheduler(object):
                 if self.walker_group.top1_value() < best_value:
                     best_value = self.walker_group.top1_value()
                     best = self.walker_group.top1()
+            self.save_search({
+                "trial": trial,
+                "best": best,
+                "best_value": best_value,
+                "retired_indices": retired_indices,
+                "value_early_stop": value_early_stop,
+                "early_stop_count": early_stop_count,
+                "cur_lst": cur_lst
+            })
         # dump data at last
         # self.walker_group.dump_data()
         self.walker_group.clear_data()
+        self.best_value = best_value
         return self.walker_group.to_config(best)
     
-    def parallel_evaluate(self, old_configs, new_configs, number=1):
+    def _record_context(self, old_configs, mode):
+        if mode == "op":
+            return [old_configs.op_config_lst, old_configs.graph_config]
+        else:
+            return old_configs.op_config_lst
+
+    @staticmethod
+    def _record_config(config):
+        # configs from warm up have no entry for the unused types
+        return dict((key, value) for key, value in config.items() if value)
+
+    def load_history(self, configs, mode):
+        """Seed the search with the configs measured in previous runs"""
+        if self.records is None:
+            return
+        context = self._record_context(configs, mode)
+        count = 0
+        for config, latency in self.records.history(self.task_key, self.hardware, self.name, context):
+            indices = self.walker_group.from_config(config)
+            if indices is None or self.walker_group.ever_met(indices) or not latency < float("inf"):
+                continue
+            self.walker_group.record(indices, latency)
+            count += 1
+        if count > 0:
+            print("[FlexTensor] Resume %s from %d records, the best %f" % (self.name, count, self.walker_group.top1_value()))
+
+    def warm_start(self, configs, transfer_configs):
+        """Measure the configs tuned for the nearest shapes before any random sampling"""
+        if self.checkpoint is not None and self.checkpoint.get_search(self.name) is not None:
+            # resumed search
+            return
+        indices_lst = []
+        for config in transfer_configs:
+            indices = self.walker_group.from_config(config, nearest=True)
+            if indices is None:
+                continue
+            indices = self.walker_group.canonical(indices)
+            if self.walker_group.ever_met(indices) or indices in indices_lst:
+                continue
+            indices_lst.append(indices)
+        if not indices_lst:
+            return
+        next_configs = [self.walker_group.to_config(indices) for indices in indices_lst]
+        results = self.parallel_evaluate(configs, next_configs, number=self.number)
+        self.walker_group.add_perf_data(indices_lst, results)
+        string = "[ "
+        for res in results:
+            string += "%.6f " % res
+        string += "]"
+        print("[FlexTensor] warm start [%.6f] %s" % (time.time(), string))
+        for indices, result in zip(indices_lst, results):
+            if result < float("inf"):
+                self.walker_group.record(indices, result)
+
+    def save_search(self, search, force=False):
+        """Checkpoint the search state of this stage"""
+        if self.checkpoint is None:
+            return
+        search["walker_group"] = self.walker_group.get_state()
+        self.checkpoint.set_search(self.name, search, force=force)
+
+    def suspend(self, trial, first_trial, search, best_value):
+        """Stop the search before `trial` if `budget` configs are evaluated
+
+        at least one trial is run, `search` is the state after the former trial,
+        it is saved in the checkpoint so that the next call goes on from `trial`
+        """
+        if self.budget is None or self.checkpoint is None or trial == first_trial or self.evaluated < self.budget:
+            return
+        self.save_search(search, force=True)
+        print("[FlexTensor] Suspend %s before trial %d, %d configs evaluated" % (self.name, trial, self.evaluated))
+        raise SearchSuspended(self.name, best_value)
+
+    def resume_search(self):
+        """The search state saved in the checkpoint, None to start afresh"""
+        if self.checkpoint is None:
+            return None
+        search = self.checkpoint.get_search(self.name)
+        if search is None:
+            return None
+        self.walker_group.set_state(search["walker_group"])
+        print("[FlexTensor] Resume %s from trial %d, the best %f" % (self.name, search["trial"] + 1, self.walker_group.top1_value()))
+        return search
+
+    def get_build_pool(self):
+        if self.build_pool is None:
+            self.build_pool = WorkerPool(self.parallel)
+            self.own_build_pool = True
+        return self.build_pool
+
+    def get_measure_pool(self):
+        if self.measure_pool is None:
+            if self.rpc_info is not None:
+                tracker = (self.rpc_info.server_ip, self.rpc_info.server_port, self.rpc_info.device_key)
+            else:
+                tracker = ("127.0.0.1", 9190, "local")
+            # each worker holds a device session, the workers beyond the devices would only wait
+            num_workers = self.parallel
+            devices = device_count(*tracker)
+            if devices is not None:
+                num_workers = min(num_workers, devices)
+            self.measure_pool = WorkerPool(num_workers, preload=["numpy", "tvm", "flextensor.remote"])
+        return self.measure_pool
+
+    def get_measure_slots(self):
+        # only local CPU measurements are partitioned
+        if self.measure_slots is None and self.task.target.startswith("llvm") \
+                and self.rpc_info is None and not LOCAL_RPC:
+            self.measure_slots = MeasureSlots(self.parallel)
+        return self.measure_slots
+
+    def get_artifact_store(self):
+        if self.artifacts is None:
+            # remote targets link the module themselves
+            export_format = ".so" if self.rpc_info is None else ".tar"
+            self.artifacts = ArtifactStore(export_format=export_format)
+        return self.artifacts
+
+    def close(self):
+        if self.measure_slots is not None:
+            self.measure_slots.end_build(self)
+        if self.own_build_pool and self.build_pool is not None:
+            self.build_pool.shutdown()
+        self.build_pool = None
+        self.own_build_pool = False
+        if self.measure_pool is not None:
+            self.measure_pool.shutdown()
+            self.measure_pool = None
+        if self.artifacts is not None:
+            self.artifacts.cleanup()
+            self.artifacts = None
+
+    def parallel_evaluate(self, old_configs, new_configs, number=1, remeasure=False):
         raise NotImplementedError()
 
-    def _parallel_evaluate(self, old_configs, new_configs, mode="op", number=1):
+    def _build_config(self, old_configs, config, mode):
+        if mode == "op":
+            return Config(old_configs.op_config_lst + [config], old_configs.graph_config)
+        elif mode == "graph":
+            return Config(old_configs.op_config_lst, config)
+        else:
+            raise RuntimeError("Unknown mode %s" % mode)
+
+    def _simulate_evaluate(self, old_configs, new_configs, mode="op"):
+        trace_beg = time.time()
+        self.evaluated += len(new_configs)
+        total_res_lst = []
+        for config in new_configs:
+            try:
+                with trace.span("eval.simulate"):
+                    total_res_lst.append(self.measurer.measure(self.task_key, self._build_config(old_configs, config, mode)))
+            except Exception as e:
+                print("[FlexTensor] [Warning] %s simulated measurement fails: %s" % (mode, str(e)))
+                total_res_lst.append(float("inf"))
+        trace.emit("parallel_evaluate", trace_beg, time.time(), stage=self.name, configs=len(new_configs))
+        return total_res_lst
+
+    def _parallel_evaluate(self, old_configs, new_configs, mode="op", number=1, remeasure=False):
+        """The latencies of new_configs
+
+        measured again even if recorded or cached when `remeasure`, the new latencies are kept
+        """
         # # print("[FlexTensor] check config", old_configs, new_configs)
         # print("[FlexTensor] parallel_evaluate begins...")
+        if self.measurer is not None:
+            return self._simulate_evaluate(old_configs, new_configs, mode=mode)
+        trace_beg = time.time()
         target = self.task.target
         if target == "micro":
             assert self.rpc_info is not None
             target = self.rpc_info.target
         
         total_configs = len(new_configs)
+        build_pool = self.get_build_pool()
+        artifacts = self.get_artifact_store()
+        slots = self.get_measure_slots()
+        # the two pipeline stages, both kept in candidate order
+        build_res_lst = deque()     # (func_name, build result, record key)
+        # (func_name, measure result, cache key, record key, slot, source of the latency)
+        eval_res_lst = deque()
+        if self.records is not None:
+            context = self._record_context(old_configs, mode)
+        reject_threshold = None
+        if self.reject_factor is not None and self.walker_group.top1_value() < float("inf"):
+            reject_threshold = self.reject_factor * self.walker_group.top1_value()
+        interval_lst = []           # the confidence intervals of adaptive measurement
         total_res_lst = []
-        try:
-            os.mkdir(LIB_DIR)
-        except OSError as e:
-            if os.path.exists(LIB_DIR) and os.path.isdir(LIB_DIR):
-                print("[FlexTensor] [Warning] Directory %s is not empty, but reusing it" % LIB_DIR)
-            else:
-                print("[FlexTensor] [Error] Fail to create directory %s\nReason: %s" % (LIB_DIR, str(e)))
-                exit(1)
-        for ep in range(math.ceil(total_configs / self.parallel)):
-            part_configs = new_configs[ep * self.parallel:(ep + 1) * self.parallel]
-            build_res_lst = []
-            func_name_lst = []
-            for config in part_configs:
-                func_name = "flextensor_built_function_{}_{}.tar".format(time.time(), np.random.randint(1000, 10000))
-                func_name_lst.append(func_name)
-                if mode == "op":
-                    build_config = Config(old_configs.op_config_lst + [config], old_configs.graph_config)
-                    op_pos = self.op_pos
-                elif mode == "graph":
-                    build_config = Config(old_configs.op_config_lst, config)
-                    op_pos = None
+        if self.overlap:
+            depth = self.parallel + self.pipeline_depth
+        else:
+            depth = self.parallel
+        next_config = 0
+        while next_config < total_configs or build_res_lst or eval_res_lst:
+            # keep the builders busy, at most `depth` artifacts ahead of measurement
+            while next_config < total_configs and len(build_res_lst) < depth \
+                    and (self.overlap or not eval_res_lst):
+                config = new_configs[next_config]
+                next_config += 1
+                if self.records is not None:
+                    record_key = self._record_config(config)
+                    latency = None
+                    if not remeasure:
+                        latency = self.records.lookup(self.task_key, self.hardware, self.name, context, record_key)
+                    if latency is not None:
+                        # measured before, no need to build
+                        res = PoolResult()
+                        res.set((None, None, None, latency))
+                        build_res_lst.append((None, res, record_key))
+                        continue
                 else:
-                    raise RuntimeError("Unknown mode %s" % mode)
-                res = parallel_execute(
+                    record_key = None
+                if slots is not None and not self.overlap:
+                    # the builders share the cores with the measurements of other schedulers
+                    slots.begin_build(self)
+                self.evaluated += 1
+                func_name = artifacts.new_name()
+                build_config = self._build_config(old_configs, config, mode)
+                op_pos = self.op_pos if mode == "op" else None
+                res = build_pool.submit(
                     build_func, 
                     self.timeout, 
                     func_name,
@@ -608,38 +971,74 @@ class Scheduler(object):
                     build_config, 
                     op_pos,
                     rpc_info=self.rpc_info,
-                    rewrite=self.rewrite
+                    rewrite=self.rewrite,
+                    lib_dir=artifacts.path,
+                    kernel_cache=self.kernel_cache,
+                    hardware=self.hardware,
+                    remeasure=remeasure
                     )
-                build_res_lst.append(res)
-
-            # time.sleep(self.timeout)
-            eval_res_lst = []
-            for i, build_res in enumerate(build_res_lst):
-                # print("[FlexTensor] build result get begins...")
-                final_res = build_res.get(timeout=self.timeout)
-                # print("[FlexTensor] build resutl get done.")
-                func_name = func_name_lst[i]
+                build_res_lst.append((func_name, res, record_key))
+
+            # checked once, a build finishing in between must not let us wait for our own builds
+            builds_ready = all(res.ready() for _, res, _ in build_res_lst)
+            if slots is not None and not self.overlap and builds_ready:
+                slots.end_build(self)
+            # hand the oldest artifact over to measurement
+            handover = build_res_lst and len(eval_res_lst) < self.parallel \
+                    and (self.overlap or builds_ready)
+            slot = None
+            if handover and slots is not None:
+                with trace.span("wait_build"):
+                    final_res = build_res_lst[0][1].get()
+                if not isinstance(final_res, Exception) and final_res[3] is None:
+                    # wait for free cores only when none of ours is measuring
+                    slot = slots.try_acquire() if eval_res_lst else slots.acquire()
+                    handover = slot is not None
+            if handover:
+                func_name, build_res, record_key = build_res_lst.popleft()
+                with trace.span("wait_build"):
+                    final_res = build_res.get()
                 if isinstance(final_res, Exception):
-                    msg = mode + " build fail:"
-                    # print(final_res.__class__)
-                    if isinstance(final_res, multi.TimeoutError):
-                        msg = msg + "Timeout"
-                    elif isinstance(final_res, tvm._ffi.base.TVMError):
-                        msg = msg + " TVMError "
-                    error_str = str(final_res)
-                    found = False
-                    for key_word in ["TVMError", "Error", "error", "Fail", "fail", "Invalid", "invalid"]:
-                        if key_word in error_str:
-                            msg = msg + error_str[error_str.index(key_word):1000]
-                            found = True
+                    report_failure(mode + " build fail:", final_res, "Timeout",
+                                   ["TVMError", "Error", "error", "Fail", "fail", "Invalid", "invalid"])
+                    eval_res_lst.append((func_name, float("inf"), None, None, None, "fail"))
+                elif final_res[3] is not None:
+                    # measured before, only a kernel cache hit is new to the records
+                    source = "record" if func_name is None else "cache"
+                    eval_res_lst.append((func_name, final_res[3], None, record_key, None, source))
+                elif self.rpc_info is not None:
+                    # measure the next built artifacts in the same job and device session
+                    batch = [(func_name, final_res, record_key)]
+                    while build_res_lst and len(batch) < self.remote_batch \
+                            and len(eval_res_lst) + len(batch) < self.parallel and build_res_lst[0][1].ready():
+                        next_res = build_res_lst[0][1].get()
+                        if isinstance(next_res, Exception) or next_res[3] is not None:
                             break
-                    if not found:
-                        msg = msg + error_str
-                    print(msg)
-                    eval_res_lst.append(float("inf"))
-
+                        next_name, _, next_key = build_res_lst.popleft()
+                        batch.append((next_name, next_res, next_key))
+                    post_fix = ".obj" if target == "c -device=micro_dev" else ""
+                    res = self.get_measure_pool().submit(
+                        remote_evaluate_batch,
+                        self.timeout * len(batch),
+                        self.rpc_info,
+                        [artifacts.get_path(x[0] + post_fix) for x in batch],
+                        [x[1][0] for x in batch],
+                        [x[1][1] for x in batch],
+                        target,
+                        number=number,
+                        dev_id=self.task.dev_id,
+                        min_repeat_ms=self.min_repeat_ms,
+                        reject_threshold=reject_threshold
+                    )
+                    for k, (name, built, key) in enumerate(batch):
+                        eval_res_lst.append((name, BatchItem(res, k), built[2], key, None, "measure"))
                 else:
-                    res = parallel_execute(
+                    if LOCAL_RPC:
+                        # in the persistent workers, which keep their device sessions
+                        execute = self.get_measure_pool().submit
+                    else:
+                        execute = parallel_execute
+                    res = execute(
                         eval_func,
                         self.timeout,
                         func_name,
@@ -648,63 +1047,71 @@ class Scheduler(object):
                         target,
                         number=number,
                         dev_id=self.task.dev_id,
-                        rpc_info=self.rpc_info
+                        rpc_info=self.rpc_info,
+                        lib_dir=artifacts.path,
+                        min_repeat_ms=self.min_repeat_ms,
+                        reject_threshold=reject_threshold,
+                        cpu_cores=None if slot is None else slots.cores(slot)
                     )
-                    eval_res_lst.append(res)
-
-            # time.sleep(self.timeout)
-
-            ret_lst = []
-            for eval_res in eval_res_lst:
+                    eval_res_lst.append((func_name, res, final_res[2], record_key, slot, "measure"))
+            elif eval_res_lst:
+                func_name, eval_res, cache_key, record_key, slot, source = eval_res_lst.popleft()
                 if isinstance(eval_res, float):
-                    ret_lst.append(eval_res)
+                    total_res_lst.append(eval_res)
+                    interval_lst.append("-")
+                    if record_key is not None and source == "cache":
+                        self.records.add(self.task_key, self.hardware, self.name, context, record_key, eval_res)
                 else:
                     # print("[FlexTensor] evluate result getting...")
-                    final_res = eval_res.get(timeout=self.timeout)
+                    with trace.span("wait_measure"):
+                        final_res = eval_res.get(timeout=self.timeout)
+                    if slot is not None:
+                        slots.release(slot)
                     # print("[FlexTensor] evlaute result get done.")
                     if isinstance(final_res, Exception):
-                        msg = mode + " run fail:"
-                        # print(final_res.__class__)
-                        if isinstance(final_res, multi.TimeoutError):
-                            msg = msg + " Timeout "
-                        elif isinstance(final_res, tvm._ffi.base.TVMError):
-                            msg = msg + " TVMError "
-                        error_str = str(final_res)
-                        found = False
-                        for key_word in ["Error", "error", "Fail", "fail", "Invalid", "invalid"]:
-                            if key_word in error_str:
-                                msg = msg + error_str[error_str.index(key_word):1000]
-                                found = True
-                                break
-                        if not found:
-                            msg = msg + error_str
-                        print(msg)
-                        ret_lst.append(float("inf"))
+                        report_failure(mode + " run fail:", final_res, " Timeout ",
+                                       ["Error", "error", "Fail", "fail", "Invalid", "invalid"])
+                        total_res_lst.append(float("inf"))
+                        interval_lst.append("-")
                     else:
-                        ret_lst.append(final_res)
-
-            total_res_lst.extend(ret_lst)
-
-            for func_name in func_name_lst:
-                try:
-                    os.remove(os.path.join(LIB_DIR, func_name))
-                except FileNotFoundError:
-                    pass
-                    # print("[FlexTensor] File not found when deleting")
-        try:
-            shutil.rmtree(LIB_DIR)
-        except Exception as e:
-            print(e)
+                        rejected = False
+                        if isinstance(final_res, tuple):
+                            final_res, interval = final_res
+                            rejected = interval is None
+                            interval_lst.append("rejected" if rejected else "+-%.6f" % interval)
+                        else:
+                            interval_lst.append("-")
+                        total_res_lst.append(final_res)
+                        # the probe estimate of a rejected candidate is not a measurement to reuse
+                        if cache_key is not None and final_res < float("inf") and not rejected:
+                            self.kernel_cache.store_latency(cache_key, final_res)
+                        if record_key is not None and final_res < float("inf") and not rejected:
+                            self.records.add(self.task_key, self.hardware, self.name, context, record_key, final_res)
+                if func_name is not None:
+                    artifacts.remove(func_name)
+            else:
+                # no overlap, wait for the whole batch of builds
+                with trace.span("wait_build"):
+                    for _, build_res, _ in build_res_lst:
+                        build_res.get()
+        if self.min_repeat_ms is not None and interval_lst:
+            print("[FlexTensor] confidence interval [ %s ]" % " ".join(interval_lst))
         # print("[FlexTensor] parallel evaluate done.")
+        trace.emit("parallel_evaluate", trace_beg, time.time(), stage=self.name, configs=total_configs)
         return total_res_lst
 
 
 class OpScheduler(Scheduler):
-    def __init__(self, task_key, op_pos, space, decay=0.7, parallel=1, timeout=4.0, trial=100, number=10, early_stop=30, rpc_info=None, rewrite=False):
-        super(OpScheduler, self).__init__("op" + str(op_pos), task_key, space, parallel, timeout, trial, number, early_stop, rpc_info, rewrite=rewrite)
+    def __init__(self, task_key, op_pos, space, decay=0.7, parallel=1, timeout=4.0, trial=100, number=10, early_stop=30, rpc_info=None, rewrite=False,
+                 build_pool=None, kernel_cache=None, records=None, checkpoint=None, min_repeat_ms=None, reject_factor=None,
+                 measure_slots=None, measurer=None):
+        super(OpScheduler, self).__init__("op" + str(op_pos), task_key, space, parallel, timeout, trial, number, early_stop, rpc_info, rewrite=rewrite,
+                                          build_pool=build_pool, kernel_cache=kernel_cache, records=records,
+                                          checkpoint=checkpoint, min_repeat_ms=min_repeat_ms, reject_factor=reject_factor,
+                                          measure_slots=measure_slots, measurer=measurer)
         self.op_pos = op_pos
 
-    def schedule(self, configs, method="searching", use_model=False, perf_path=None):
+    def schedule(self, configs, method="searching", use_model=False, perf_path=None, transfer_configs=None):
         # if hint == "split_fuse":
         #     wanted_types = ["spatial", "reduce", "unroll"]
         # elif hint == "fuse_split":
@@ -717,6 +1124,9 @@ class OpScheduler(Scheduler):
             wanted_types = ["fuse", "reorder", "spatial", "reduce", "unroll"]
         if perf_path is not None:
             self.walker_group.model_path = perf_path
+        self.load_history(configs, "op")
+        if transfer_configs and not use_model:
+            self.warm_start(configs, transfer_configs)
         if method == "searching":
             return self._searching_schedule(configs, wanted_types, use_model=use_model)
         elif method == "q":
@@ -726,8 +1136,8 @@ class OpScheduler(Scheduler):
         else:
             raise RuntimeError("Currently no support for method %s" % method)
 
-    def parallel_evaluate(self, configs, next_op_configs, number=1, rpc_info=None):
-        return self._parallel_evaluate(configs, next_op_configs, mode="op", number=number)
+    def parallel_evaluate(self, configs, next_op_configs, number=1, rpc_info=None, remeasure=False):
+        return self._parallel_evaluate(configs, next_op_configs, mode="op", number=number, remeasure=remeasure)
 
     @staticmethod
     def generate_op_schedule(target, config):
@@ -2186,12 +2596,20 @@ class Rewriter(object):
 
 
 class GraphScheduler(Scheduler):
-    def __init__(self, task_key, space, decay=0.7, parallel=10, timeout=4.0, trial=100, number=10, early_stop=30, rpc_info=None, rewrite=False):
-        super(GraphScheduler, self).__init__("graph", task_key, space, parallel, timeout, trial, number, early_stop, rpc_info, rewrite=rewrite)
-
-    def schedule(self, configs, method="searching", use_model=False, perf_path=None):
+    def __init__(self, task_key, space, decay=0.7, parallel=10, timeout=4.0, trial=100, number=10, early_stop=30, rpc_info=None, rewrite=False,
+                 build_pool=None, kernel_cache=None, records=None, checkpoint=None, min_repeat_ms=None, reject_factor=None,
+                 measure_slots=None, measurer=None):
+        super(GraphScheduler, self).__init__("graph", task_key, space, parallel, timeout, trial, number, early_stop, rpc_info, rewrite=rewrite,
+                                             build_pool=build_pool, kernel_cache=kernel_cache, records=records,
+                                             checkpoint=checkpoint, min_repeat_ms=min_repeat_ms, reject_factor=reject_factor,
+                                             measure_slots=measure_slots, measurer=measurer)
+
+    def schedule(self, configs, method="searching", use_model=False, perf_path=None, transfer_configs=None):
         if perf_path is not None:
             self.walker_group.model_path = perf_path
+        self.load_history(configs, "graph")
+        if transfer_configs and not use_model:
+            self.warm_start(configs, transfer_configs)
         if method == "searching":
             return self._searching_schedule(configs, ["inline", "merge"], use_model=use_model)
         elif method == "q":
@@ -2201,8 +2619,8 @@ class GraphScheduler(Scheduler):
         else:
             raise RuntimeError("Currently no support for method %s" % method)
 
-    def parallel_evaluate(self, configs, graph_configs, number=1):
-        return self._parallel_evaluate(configs, graph_configs, mode="graph", number=number)
+    def parallel_evaluate(self, configs, graph_configs, number=1, remeasure=False):
+        return self._parallel_evaluate(configs, graph_configs, mode="graph", number=number, remeasure=remeasure)
     
     @staticmethod
     def generate_graph_schedule(config, phase="inline"):
@@ -2293,6 +2711,7 @@ def schedule(task_key, slevel=4, rlevel=3, op_trial=50, graph_trial=10, op_stop=
 
     perform sequential schedule
     """
+    trace_beg = time.time()
     task = TASK_TABLE[task_key]
     func = task.func
     args = task.args
@@ -2333,6 +2752,67 @@ def schedule(task_key, slevel=4, rlevel=3, op_trial=50, graph_trial=10, op_stop=
     rpc_info = None
     if "rpc_info" in kwargs:
         rpc_info = kwargs["rpc_info"]
+    # a KernelCache or the directory of one
+    kernel_cache = None
+    if "kernel_cache" in kwargs:
+        kernel_cache = kwargs["kernel_cache"]
+        if isinstance(kernel_cache, str):
+            kernel_cache = KernelCache(kernel_cache)
+    # a RecordDatabase or the path of one
+    records = None
+    if "records" in kwargs:
+        records = kwargs["records"]
+        if isinstance(records, str):
+            records = RecordDatabase(records)
+    # adaptive measurement, by default `number` runs are measured
+    min_repeat_ms = None
+    if "min_repeat_ms" in kwargs:
+        min_repeat_ms = kwargs["min_repeat_ms"]
+    reject_factor = None
+    if "reject_factor" in kwargs:
+        reject_factor = kwargs["reject_factor"]
+    # write a Chrome trace to this directory, see flextensor.trace,
+    # only the workers started from now on are traced
+    if "trace" in kwargs:
+        trace.enable(kwargs["trace"])
+    # MeasureSlots shared with other tuning runs, by default one shared by the schedulers
+    # of this run, so that concurrently tuned ops measure on disjoint cores
+    measure_slots = None
+    if "measure_slots" in kwargs:
+        measure_slots = kwargs["measure_slots"]
+    elif task.target.startswith("llvm") and rpc_info is None and not LOCAL_RPC:
+        measure_slots = MeasureSlots(parallel)
+    # a Measurer in place of building and measuring, see flextensor.measure
+    measurer = None
+    if "measurer" in kwargs:
+        measurer = kwargs["measurer"]
+    # save the progress to `checkpoint`, restart from `resume_from`,
+    # a Checkpoint object is both, kept in memory if its path is None
+    checkpoint = None
+    if "checkpoint" in kwargs and isinstance(kwargs["checkpoint"], Checkpoint):
+        checkpoint = kwargs["checkpoint"]
+        if checkpoint.state["task_key"] != task_key:
+            raise RuntimeError("Checkpoint is for task %s, not %s" % (checkpoint.state["task_key"], task_key))
+    elif "resume_from" in kwargs and os.path.exists(kwargs["resume_from"]):
+        checkpoint = Checkpoint.resume(kwargs["resume_from"], task_key)
+        print("[FlexTensor] Resume from checkpoint %s, %d ops decided" 
+              % (kwargs["resume_from"], len(checkpoint.state["op_config_lst"])))
+        if "checkpoint" in kwargs:
+            checkpoint.path = kwargs["checkpoint"]
+    elif "checkpoint" in kwargs:
+        checkpoint = Checkpoint(kwargs["checkpoint"], task_key)
+    elif "resume_from" in kwargs:
+        checkpoint = Checkpoint(kwargs["resume_from"], task_key)
+    # warm start from the best configs of the `transfer` nearest tuned tasks
+    transfer_lst = []
+    if "transfer" in kwargs and kwargs["transfer"] > 0:
+        if records is None:
+            print("[FlexTensor] [Warning] No records to warm start from, please set `records`")
+        else:
+            tuned = records.best_per_task(hardware_fingerprint(task.target, task.dev_id, rpc_info))
+            for key in nearest_tasks(task_key, tuned.keys(), k=kwargs["transfer"]):
+                print("[FlexTensor] Warm start from %s (%f)" % (key, tuned[key][1]))
+                transfer_lst.append(tuned[key][0])
     ##################################################
     # first generate graph space
     if task.target == "cuda" or task.target == "llvm":
@@ -2352,83 +2832,215 @@ def schedule(task_key, slevel=4, rlevel=3, op_trial=50, graph_trial=10, op_stop=
     ##################################################
     # intra operations schedule decisionss
     op_space_lst = []
+    # the latency of the last decided stage
+    final_value = float("inf")
     if force_inline and "inline" in graph_space.subspaces:
         configs = Config([], {"inline": [graph_space.subspaces["inline"].static_entities[0]]})
     else:
         configs = Config([], None)
-    
-    for pos, op in enumerate(op_lst):
-        if task.target == "cuda":
-            space = generate_space_intra_op(op, down_graph, slevel=slevel, rlevel=rlevel, groups=3)
-        elif task.target == "llvm":
-            rslevel = max(slevel, rlevel)
-            space = generate_space_intra_op(op, down_graph, slevel=rslevel, rlevel=rslevel, 
-                                            unroll_policy="off", fuse_policy="off",
-                                            reorder_policy="off")
-        elif task.target == "micro":
-            space = generate_op_space_with_intrin(op, rpc_info.target)
-        elif task.target == "llvm -mcpu=skylake-avx512" or task.target == "llvm -mcpu=cascadelake":
-            space = generate_op_space_with_intrin(op, task.target)
-        else:
-            raise RuntimeError("Currently no support for target %s"%task.target)
-        total_size *= len(space)
-        print("[FlexTensor] op", pos, "space size:", len(space))
-        op_space_lst.append(space)
+    # the ops decided before the checkpoint, None for an op not decided in concurrent tuning
+    decided_op_config_lst = []
+    if checkpoint is not None:
+        decided_op_config_lst = checkpoint.state["op_config_lst"]
+
+    # the build workers are started once and shared by all the schedulers
+    if "build_pool" in kwargs:
+        build_pool = kwargs["build_pool"]
+        own_build_pool = False
+    elif measurer is not None:
+        # nothing to build
+        build_pool = None
+        own_build_pool = False
+    else:
+        build_pool = WorkerPool(parallel)
+        own_build_pool = True
+    # tune the ops that do not read from each other at the same time
+    concurrent_ops = False
+    if "concurrent_ops" in kwargs:
+        concurrent_ops = kwargs["concurrent_ops"]
+    # a dict that gets the "trials" evaluated, the recorded configs are not counted,
+    # kept up to date also when tuning raises
+    stats = dict()
+    if "stats" in kwargs:
+        stats = kwargs["stats"]
+    stats["trials"] = 0
+    stats_lock = threading.Lock()
+    # raise SearchSuspended once `budget` configs are evaluated, the checkpoint keeps the progress,
+    # the concurrent stages are not checkpointed, they are never suspended
+    budget = None
+    if "budget" in kwargs:
+        budget = kwargs["budget"]
+
+    def _tune_op(pos, op_configs, op_checkpoint):
+        """returns the config of op pos and its latency, None for no latency"""
         op_scheduler = OpScheduler(
             task_key, 
             pos, 
-            space, 
+            op_space_lst[pos], 
             parallel=parallel, 
             timeout=timeout, 
             trial=force_trials[pos], 
             number=number, 
             early_stop=op_stop,
             rpc_info=rpc_info,
-            rewrite=rewrite
+            rewrite=rewrite,
+            build_pool=build_pool,
+            kernel_cache=kernel_cache,
+            records=records,
+            checkpoint=op_checkpoint,
+            min_repeat_ms=min_repeat_ms,
+            reject_factor=reject_factor,
+            measure_slots=measure_slots,
+            measurer=measurer
             )
+        if budget is not None and op_checkpoint is not None:
+            op_scheduler.budget = budget - stats["trials"]
         # print("[FlexTensor] ###########################################")
         # print("[FlexTensor] Scheduling", op)
         use_model = False if op_perf_model_path_lst[pos] is None else True
         perf_path = op_perf_model_path_lst[pos]
-        if force_inline and "inline" in graph_space.subspaces \
-            and graph_space.subspaces["inline"].able_inline(pos):
-            op_config = {}
+        value = None
+        try:
+            if force_inline and "inline" in graph_space.subspaces \
+                and graph_space.subspaces["inline"].able_inline(pos):
+                op_config = {}
+            else:
+                op_config = op_scheduler.schedule(
+                    op_configs, 
+                    method=method, 
+                    use_model=use_model, 
+                    perf_path=perf_path,
+                    transfer_configs=[x[0][pos] for x in transfer_lst if len(x[0]) > pos]
+                    )
+                # values predicted by the model are not latencies
+                value = float("inf") if use_model else op_scheduler.best_value
+        finally:
+            # removes the built modules also when tuning raises
+            op_scheduler.close()
+            with stats_lock:
+                stats["trials"] += op_scheduler.evaluated
+        return op_config, value
+
+    try:
+        for pos, op in enumerate(op_lst):
+            if task.target == "cuda":
+                space = generate_space_intra_op(op, down_graph, slevel=slevel, rlevel=rlevel, groups=3)
+            elif task.target == "llvm":
+                rslevel = max(slevel, rlevel)
+                space = generate_space_intra_op(op, down_graph, slevel=rslevel, rlevel=rslevel, 
+                                                unroll_policy="off", fuse_policy="off",
+                                                reorder_policy="off")
+            elif task.target == "micro":
+                space = generate_op_space_with_intrin(op, rpc_info.target)
+            elif task.target == "llvm -mcpu=skylake-avx512" or task.target == "llvm -mcpu=cascadelake":
+                space = generate_op_space_with_intrin(op, task.target)
+            else:
+                raise RuntimeError("Currently no support for target %s"%task.target)
+            total_size *= len(space)
+            print("[FlexTensor] op", pos, "space size:", len(space))
+            op_space_lst.append(space)
+
+        if not concurrent_ops:
+            for pos in range(len(op_lst)):
+                if pos < len(decided_op_config_lst) and decided_op_config_lst[pos] is not None:
+                    configs.op_config_lst.append(decided_op_config_lst[pos])
+                    continue
+                op_config, value = _tune_op(pos, configs, checkpoint)
+                if value is not None:
+                    final_value = value
+                configs.op_config_lst.append(op_config)
+                if checkpoint is not None:
+                    checkpoint.set_configs(configs.op_config_lst, configs.graph_config)
         else:
-            op_config = op_scheduler.schedule(
-                configs, 
-                method=method, 
-                use_model=use_model, 
-                perf_path=perf_path,
-                )
-        configs.op_config_lst.append(op_config)
+            # None for the ops not decided yet
+            op_config_lst = [None for op in op_lst]
+            for pos, op_config in enumerate(decided_op_config_lst):
+                op_config_lst[pos] = op_config
+            op_value_lst = [None for op in op_lst]
+            for wave in op_waves(op_lst):
+                wave = [pos for pos in wave if op_config_lst[pos] is None]
+                if not wave:
+                    continue
+                print("[FlexTensor] Tune ops %s concurrently" % str(wave))
+                errors = []
+
+                def _run(pos):
+                    # the ops not read by op pos are not scheduled with it, any config will do
+                    op_configs = Config(
+                        [{} if x is None else x for x in op_config_lst[:pos]], configs.graph_config)
+                    try:
+                        # the search state of concurrent stages is not checkpointed
+                        op_config_lst[pos], op_value_lst[pos] = _tune_op(pos, op_configs, None)
+                    except Exception as e:
+                        errors.append(e)
+
+                threads = [threading.Thread(target=_run, args=(pos,)) for pos in wave]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+                if errors:
+                    raise errors[0]
+                if checkpoint is not None:
+                    checkpoint.set_configs(op_config_lst, configs.graph_config)
+            for value in op_value_lst:
+                if value is not None:
+                    final_value = value
+            configs.op_config_lst.extend(op_config_lst)
     
-    print("[FlexTensor] space size", total_size)
-
-    #################################################
-    # inter operations schedule decisions 
-    if schedule_graph:
-        graph_scheduler = GraphScheduler(
-            task_key, 
-            graph_space, 
-            parallel=parallel, 
-            timeout=timeout, 
-            trial=graph_trial, 
-            number=number, 
-            early_stop=graph_stop,
-            rpc_info=rpc_info,
-            rewrite=rewrite
-            )
-        use_model = False if graph_perf_model_path is None else True
-        if len(graph_space) > 1:
-            graph_config = graph_scheduler.schedule(
-                configs, method=method, use_model=use_model, perf_path=graph_perf_model_path)
+        print("[FlexTensor] space size", total_size)
+
+        #################################################
+        # inter operations schedule decisions 
+        if checkpoint is not None and checkpoint.state["done"]:
+            graph_config = checkpoint.state["graph_config"]
+        elif schedule_graph:
+            graph_scheduler = GraphScheduler(
+                task_key, 
+                graph_space, 
+                parallel=parallel, 
+                timeout=timeout, 
+                trial=graph_trial, 
+                number=number, 
+                early_stop=graph_stop,
+                rpc_info=rpc_info,
+                rewrite=rewrite,
+                build_pool=build_pool,
+                kernel_cache=kernel_cache,
+                records=records,
+                checkpoint=checkpoint,
+                min_repeat_ms=min_repeat_ms,
+                reject_factor=reject_factor,
+                measure_slots=measure_slots,
+                measurer=measurer
+                )
+            if budget is not None and checkpoint is not None:
+                graph_scheduler.budget = budget - stats["trials"]
+            use_model = False if graph_perf_model_path is None else True
+            try:
+                if len(graph_space) > 1:
+                    graph_config = graph_scheduler.schedule(
+                        configs, method=method, use_model=use_model, perf_path=graph_perf_model_path,
+                        transfer_configs=[x[1] for x in transfer_lst if x[1]])
+                    final_value = float("inf") if use_model else graph_scheduler.best_value
+                else:
+                    graph_config = {}
+            finally:
+                graph_scheduler.close()
+                stats["trials"] += graph_scheduler.evaluated
         else:
             graph_config = {}
-    else:
-        graph_config = {}
+    finally:
+        if own_build_pool:
+            build_pool.shutdown()
+
     #################################################
     # combine the configs
     configs = Config(configs.op_config_lst, graph_config)
+    if checkpoint is not None:
+        checkpoint.set_configs(configs.op_config_lst, configs.graph_config, done=True)
+    if records is not None and final_value < float("inf"):
+        records.add(task_key, hardware_fingerprint(task.target, task.dev_id, rpc_info), "final", "", configs, final_value)
     
     #################################################
     # final schedule
@@ -2446,6 +3058,7 @@ def schedule(task_key, slevel=4, rlevel=3, op_trial=50, graph_trial=10, op_stop=
     #     graph_template = GraphScheduler.generate_graph_schedule(graph_config, phase="at")
     #     graph_template(s, op_lst, op_states)
     s, bufs = schedule_with_config(task_key, configs, rewrite=rewrite)
+    trace.emit("schedule", trace_beg, time.time(), task_key=task_key)
 
     return s, bufs, configs
 
@@ -2492,10 +3105,13 @@ def schedule_with_config_ops(ops, bufs, configs, op_pos=None, target="llvm"):
         assert_print(op_pos < len(op_lst) and op_pos < len(op_config_lst), "op_pos too big")
         loop_length = op_pos + 1
         s = tvm.create_schedule(op_lst[op_pos])
+        # the other ops are not in the schedule
+        in_schedule = op_ancestors(op_lst)[op_pos] | {op_pos}
     else:
         assert_print(len(op_config_lst) <= len(op_lst), "config length exceed op_lst")
         loop_length = len(op_config_lst)
         s = tvm.create_schedule(ops)
+        in_schedule = None
 
     ###################################################
     # perform inter operations schedule first for inline
@@ -2507,6 +3123,8 @@ def schedule_with_config_ops(ops, bufs, configs, op_pos=None, target="llvm"):
     ###################################################
     # perform intra operations schedule    
     for i in range(loop_length):
+        if in_schedule is not None and i not in in_schedule:
+            continue
         # mask inlined ops
         if not op_states[i].inline:
             op = op_lst[i]
@@ -0,0 +1,468 @@
+import heapq
+import json
+import os
+import numpy as np
+from collections import deque
+from flextensor.utils import assert_print
+
+
+global_walker_judger_model_path_prefix = "walker_judger_model_"
+global_walker_judger_data_path_prefix = "walker_judger_data_"
+global_performance_judger_path_prefix = "performance_judger_model_"
+global_performance_data_path_prefix = "performance_judger_data_"
+# subspaces up to this size keep a dense feature table
+FEATURE_TABLE_LIMIT = 1 << 16
+# transitions kept for the Q-learning of each walker
+WALKER_CAPACITY = 4096
+
+
+def flatten(x):
+    ret = []
+    for v in x:
+        if isinstance(v, (list, tuple)):
+            ret.extend(list(v))
+        else:
+            ret.append(v)
+    return ret
+
+
+def entity_feature(entity, index, dim):
+    """The numeric feature of an entity, [index, 0, ...] if it has none of length dim"""
+    feature = flatten(entity)
+    if len(feature) == dim and all(isinstance(v, (int, float, bool, np.number)) for v in feature):
+        return feature
+    return [index] + [0] * (dim - 1)
+
+
+class SubspaceWalker(object):
+    """The moves and the features of the entities of a subspace"""
+    def __init__(self, subspace):
+        self.subspace = subspace
+        if self.subspace.size <= FEATURE_TABLE_LIMIT:
+            self.feature_table = self._make_features(range(self.subspace.size))
+        else:
+            self.feature_table = None
+
+    def _make_features(self, indices):
+        features = [entity_feature(self.subspace.get_entity(i), i, self.subspace.dim) for i in indices]
+        return np.array(features, dtype=np.float32).reshape(-1, self.subspace.dim)
+
+    def features(self, indices):
+        """The features of the entities at indices, [len(indices), dim]"""
+        if self.feature_table is not None:
+            return self.feature_table[np.asarray(indices, dtype=np.int64)]
+        return self._make_features(indices)
+
+    def random_batch(self, batch_size):
+        batch_indices = np.random.randint(0, self.subspace.size, batch_size)
+        batch_indices = [self.subspace.canonical(int(x)) for x in batch_indices]
+        ret_entities = self._get_batch(batch_indices)
+        return ret_entities, batch_indices
+
+    def _get_batch(self, batch_indices):
+        ret_entities = []
+        for index in batch_indices:
+            ret_entities.append(self.subspace.get_entity(index))
+        return ret_entities
+
+    def full_walk(self, index):
+        """The neighbours of the entity at index and the numbers of their directions"""
+        new_index_lst = []
+        for d in self.subspace.directions:
+            new_index = self.subspace.next_canonical(index, d)
+            new_index_lst.append(new_index)
+        # the actions of the walker memory are direction numbers, as the ones of `walk`
+        return new_index_lst, list(range(len(self.subspace.directions)))
+
+
+class MemEntity(object):
+    def __init__(self, indices, value):
+        self.indices = indices
+        self.value = value
+    
+    def __lt__(self, b):
+        return self.value < b.value
+
+
+class WalkerGroup(object):
+    """The search state over a space
+
+    A point of the space is the mixed-radix integer of its subspace indices,
+    so the visit set, the heap and the neighbours are plain integer operations.
+    None is the empty point.
+    The learned models are made on first use, so torch is only imported
+    by the model-based methods.
+    """
+    def __init__(self, group_name, space, lr=0.02):
+        self.group_name = group_name
+        self.space = space
+        self.lr = lr
+        self.walkers = dict()
+        self.strides = dict()
+        stride = 1
+        for name, subspace in self.space.items():
+            self.walkers[name] = SubspaceWalker(subspace)
+            self.strides[name] = stride
+            stride *= subspace.size
+        # the walkers are replaced by the Q-learning ones of flextensor.model on first use,
+        # the transitions are kept until then
+        self.walker_models = False
+        self.transitions = dict((name, deque(maxlen=WALKER_CAPACITY)) for name in self.walkers)
+        self.memory = []
+        self.mem_size = 0
+        self.visit = set()
+        self._performance_judger = None
+        self.perfromance_data = []
+        self.model_path = global_performance_judger_path_prefix + group_name + ".pkl"
+        self.data_path = global_performance_data_path_prefix + group_name + ".txt"
+
+    @property
+    def performance_judger(self):
+        if self._performance_judger is None:
+            from flextensor.model import PerformanceModel
+            self._performance_judger = PerformanceModel(self.space.dim)
+        return self._performance_judger
+
+    def load_walker_models(self):
+        if self.walker_models:
+            return
+        from flextensor.model import Walker
+        for name, walker in self.walkers.items():
+            self.walkers[name] = Walker(self.group_name + "_" + name, walker.subspace, self.space.dim)
+            for transition in self.transitions[name]:
+                self.add_walker_data(name, *transition)
+            self.transitions[name].clear()
+        self.walker_models = True
+
+    def forward(self, batch_size, policy="random"):
+        assert_print(policy in ["random", "best"])
+        if policy == "best":
+            self.load_walker_models()
+        ret = dict()
+        for name, walker in self.walkers.items():
+            if policy == "random":
+                ret_entities, ret_p_values = walker.random_batch(batch_size)
+            elif policy == "best":
+                ret_entities, ret_p_values = walker.best_batch(batch_size)
+            ret[name] = (ret_entities, ret_p_values)
+        return ret
+
+    def encode(self, indices):
+        """The code of a dict of subspace indices"""
+        code = 0
+        for name, index in indices.items():
+            code += int(index) * self.strides[name]
+        return code
+
+    def decode(self, code):
+        if code is None:
+            return {}
+        ret = dict()
+        for name, walker in self.walkers.items():
+            ret[name] = code // self.strides[name] % walker.subspace.size
+        return ret
+
+    def get_index(self, code, name):
+        return code // self.strides[name] % self.walkers[name].subspace.size
+
+    def move(self, code, name, index):
+        """The code with the index of subspace `name` replaced"""
+        return code + (index - self.get_index(code, name)) * self.strides[name]
+
+    def canonical(self, code):
+        for name, walker in self.walkers.items():
+            if walker.subspace.canonical_map is not None:
+                code = self.move(code, name, walker.subspace.canonical(self.get_index(code, name)))
+        return code
+
+    def ever_met(self, code):
+        return code in self.visit
+        
+    def record(self, code, value, random_reject=False, gamma=0.5):
+        self.visit.add(code)
+        if random_reject:
+            p = np.random.random()
+            t = np.exp(-gamma * (value - self.top1_value()) / self.top1_value())
+            # print("record ", p, t, value, self.top1_value())
+            if p <= t:
+                heapq.heappush(self.memory, MemEntity(code, value))
+                self.mem_size += 1
+        else:
+            heapq.heappush(self.memory, MemEntity(code, value))
+            self.mem_size += 1
+
+    def get_state(self):
+        return {"memory": self.memory, "mem_size": self.mem_size, "visit": self.visit}
+
+    def set_state(self, state):
+        self.memory = state["memory"]
+        self.mem_size = state["mem_size"]
+        self.visit = state["visit"]
+
+    def has_more(self):
+        return self.mem_size > 0
+
+    def features(self, codes):
+        """The features of the points, [len(codes), space.dim]"""
+        if len(codes) == 0:
+            return np.zeros((0, self.space.dim), dtype=np.float32)
+        parts = []
+        for name, walker in self.walkers.items():
+            stride, size = self.strides[name], walker.subspace.size
+            parts.append(walker.features([code // stride % size for code in codes]))
+        return np.concatenate(parts, axis=1)
+
+    def flatten(self, code):
+        return self.features([code])[0]
+    
+    def to_config(self, code, type_keys=None):
+        # only the entries of type_keys, all when None
+        ret = dict()
+        for type_key, name_lst in self.space.types.items():
+            ret[type_key] = []
+            if code is None or (type_keys is not None and type_key not in type_keys):
+                continue
+            for name in name_lst:
+                ret[type_key].append(self.walkers[name].subspace.get_entity(self.get_index(code, name)))
+        return ret
+
+    def from_config(self, config, nearest=False):
+        """The code of a config, None if the config is not in the space
+
+        use the nearest entities if `nearest`, for configs tuned for another shape
+        """
+        ret = dict()
+        for type_key, name_lst in self.space.types.items():
+            entities = config.get(type_key, [])
+            if len(entities) != len(name_lst):
+                return None
+            for name, entity in zip(name_lst, entities):
+                if nearest:
+                    index = self.walkers[name].subspace.nearest_index(entity)
+                else:
+                    index = self.walkers[name].subspace.get_index(entity)
+                if index is None:
+                    return None
+                ret[name] = index
+        return self.encode(ret)
+
+    def top_random(self, gamma=0.5, with_value=False):
+        e = np.random.choice(self.memory)
+        p = np.random.random()
+        t = np.exp(-gamma * (e.value - self.top1_value()) / self.top1_value())
+        # print("top random", p, t, e.value, self.top1_value())
+        if p <= t:
+            if with_value:
+                return e.indices, e.value
+            return e.indices
+        else:
+            if with_value:
+                return self.top1(), self.top1_value()
+            return self.top1()
+
+    def topk(self, k, modify=False, with_value=False):
+        if k > self.mem_size:
+            k = self.mem_size
+        ret = []
+        for i in range(k):
+            tmp = heapq.heappop(self.memory)
+            ret.append(tmp)
+        self.mem_size -= k
+        if not modify:
+            for tmp in ret:
+                heapq.heappush(self.memory, tmp)
+            self.mem_size += k
+        if with_value:
+            return [(x.indices, x.value) for x in ret]
+        return [x.indices for x in ret]
+    
+    def top1(self):
+        if self.mem_size > 0:
+            return self.memory[0].indices
+        else:
+            return None
+    
+    def top1_value(self):
+        if self.mem_size > 0:
+            return self.memory[0].value
+        else:
+            return float("inf")
+    
+    def pop_top(self):
+        if self.mem_size > 0:
+            self.mem_size -= 1
+            return heapq.heappop(self.memory)
+        else:
+            return MemEntity(None, float("inf"))
+
+    def walk(self, indices_value_lst, trial, epsilon=0.8, gamma=0.01):
+        self.load_walker_models()
+        indices_lst, value_lst = [x[0] for x in indices_value_lst], [x[1] for x in indices_value_lst]
+        # perform one step walk
+        flattened_lst = self.features(indices_lst)
+        ret_from_lst = []
+        ret_indices_lst = []
+        ret_action_lst = []
+        proposed = set()
+        for name in self.walkers.keys():
+            index_lst = [self.get_index(code, name) for code in indices_lst]
+            next_index_lst, direction_lst = self.walkers[name].walk(flattened_lst, index_lst, trial, epsilon, gamma)
+            for i, code in enumerate(indices_lst):
+                next_code = code + (next_index_lst[i] - index_lst[i]) * self.strides[name]
+                action =(name, direction_lst[i])
+                if not self.ever_met(next_code) and next_code not in proposed:
+                    proposed.add(next_code)
+                    ret_from_lst.append((code, value_lst[i]))
+                    ret_indices_lst.append(next_code)
+                    ret_action_lst.append(action)
+        return ret_from_lst, ret_indices_lst, ret_action_lst
+    
+    def full_walk(self, code, no_repeat=True):
+        next_indices_lst = []
+        action_lst = []
+        # different directions may reach the same canonical point
+        proposed = set()
+        for name, stride in self.strides.items():
+            index = self.get_index(code, name)
+            next_index_lst, actions = self.walkers[name].full_walk(index)
+            for next_index, action in zip(next_index_lst, actions):
+                next_indices = code + (next_index - index) * stride
+                if no_repeat:
+                    if not self.ever_met(next_indices) and next_indices not in proposed:
+                        proposed.add(next_indices)
+                        next_indices_lst.append(next_indices)
+                        action_lst.append((name, action))                            
+                else:
+                    next_indices_lst.append(next_indices)
+                    action_lst.append(action)
+        return next_indices_lst, action_lst
+    
+    def add_walker_data(self, name, pre_state, action, post_state, reward):
+        self.walkers[name].add_data(self.flatten(pre_state), action, self.flatten(post_state), reward)
+
+    def add_data(self, name, pre_state, action, post_state, reward):
+        if self.walker_models:
+            self.add_walker_data(name, pre_state, action, post_state, reward)
+        else:
+            self.transitions[name].append((pre_state, action, post_state, reward))
+
+    def train_walkers(self):
+        from flextensor.model import train_walkers
+        self.load_walker_models()
+        train_walkers(list(self.walkers.values()), lr=self.lr)
+    
+    def add_perf_data(self, indices_lst, performance_lst):
+        inputs = self.features(indices_lst).tolist()
+        self.perfromance_data.append((inputs, performance_lst))
+
+    def _perf_batches(self, data_size, batch_size=32):
+        from flextensor.model import pad_perf_data
+        train_data = self.perfromance_data
+        np.random.shuffle(train_data)
+        batches = []
+        for beg in range(0, data_size, batch_size):
+            batches.append(pad_perf_data(train_data[beg:min(beg + batch_size, data_size)]))
+        return batches
+
+    def _perf_loss(self, inputs, perf, mask):
+        from flextensor.model import rank_loss
+        y = self.performance_judger(inputs.reshape(-1, inputs.shape[-1])).reshape(perf.shape)
+        return rank_loss(y, perf, mask)
+
+    def train_on_perf(self, save=True):
+        import torch
+        data_size = min(len(self.perfromance_data), 1000)
+        print("train data size is %d" % data_size)
+        # groups of 32 per step
+        batches = self._perf_batches(data_size)
+        optimizer = torch.optim.Adadelta(self.performance_judger.parameters(), lr=self.lr)
+        for ep in range(20):
+            full_loss = 0.0
+            for inputs, perf, mask in batches:
+                loss = self._perf_loss(inputs, perf, mask)
+                optimizer.zero_grad()
+                loss.backward()
+                optimizer.step()
+                full_loss += float(loss.detach())
+            if save:
+                self.save_performance_judger(self.model_path)
+            print("[cur/total]=[%d/%d] | loss=%f" % (ep + 1, 20, full_loss))
+    
+    def test_accuracy(self):
+        import torch
+        data_size = min(len(self.perfromance_data), 1000)
+        print("test data size is %d" % data_size)
+        loss = 0.0
+        with torch.no_grad():
+            for inputs, perf, mask in self._perf_batches(data_size):
+                loss += float(self._perf_loss(inputs, perf, mask))
+        return loss / data_size
+
+    def query_performance(self, indices_lst):
+        # empty inputs
+        if len(indices_lst) == 0:
+            return []
+        import torch
+        inputs = torch.from_numpy(self.features(indices_lst))
+        perf_lst = self.performance_judger(inputs).reshape(-1)
+        return perf_lst.detach().tolist()
+
+    def load_performance_judger(self, model_path):
+        import torch
+        self.performance_judger.load_state_dict(torch.load(model_path))
+
+    def save_performance_judger(self, model_path):
+        import torch
+        torch.save(self.performance_judger.state_dict(), model_path)
+
+    def dump_performance_data(self, data_path):
+        with open(data_path, "a") as fout:
+            for data in self.perfromance_data:
+                string = json.dumps(data)
+                fout.write(string + "\n")
+    
+    def load_performance_data(self, data_path):
+        with open(data_path, "r") as fin:
+            for line in fin:
+                data = tuple(json.loads(line))
+                self.perfromance_data.append(data)
+
+    def dump_data(self):
+        self.load_walker_models()
+        self.dump_performance_data(self.data_path)
+        for _, walker in self.walkers.items():
+            walker.dump_data()
+
+    def load_walker_model(self):
+        self.load_walker_models()
+        for _, walker in self.walkers.items():
+            walker.load_or_create_model()
+
+    def load_walker_data(self):
+        self.load_walker_models()
+        for _, walker in self.walkers.items():
+            walker.prepare_data()
+
+    def prepare_performance_data(self):
+        if not os.path.exists(self.data_path):
+            raise RuntimeError("Performance data file not found %s" % self.data_path)
+        self.load_performance_data(self.data_path)
+
+    def load_or_create_model(self):
+        if not os.path.exists(self.model_path):
+            self.save_performance_judger(self.model_path)
+        else:
+            self.load_performance_judger(self.model_path)
+
+    def clear_performance_data(self):
+        self.perfromance_data.clear()
+    
+    def clear_walker_data(self):
+        for name, walker in self.walkers.items():
+            self.transitions[name].clear()
+            if self.walker_models:
+                walker.clear_data()
+    
+    def clear_data(self):
+        self.clear_performance_data()
+        self.clear_walker_data
@@ -5,7 +5,7 @@ from functools import reduce
 from itertools import permutations, product
 from flextensor.intrinsic import INTRIN_TABLE, target_embedding
 from flextensor.utils import (assert_print, gen_enum, any_factor_split, get_factor_lst, gen_group,
-    is_power_of_x)
+    is_power_of_x, powerx_lst)
 
 
 def able_inline(op, down_graph):
@@ -19,6 +19,12 @@ def able_inline(op, down_graph):
     return is_compute and (not has_reduce) and (not is_output)
 
 
+def _as_list(x):
+    if isinstance(x, (list, tuple)):
+        return [_as_list(v) for v in x]
+    return x
+
+
 # class SubSpace(object):
 #     def __init__(self, entities):
 #         assert_print(isinstance(entities, (list, tuple)) and len(entities) > 0)
@@ -90,6 +96,10 @@ UndirectedSubSpaceTypeKeys = ["fuse", "reorder", "unroll", "inline", "merge", "s
 
 
 class SubSpace(object):
+    # canonical_map[p] is the representative of the entities
+    # that produce the same schedule as entity p, None means all distinct
+    canonical_map = None
+
     def __init__(self):
         self.dim = 0
         self.static_entities = []
@@ -102,9 +112,46 @@ class SubSpace(object):
     def next_entity(self, *args, **kwargs):
         raise NotImplementedError()
 
+    def set_canonical_keys(self, keys):
+        # entities with equal keys are equivalent, the first one represents them
+        first = {}
+        canonical_map = [first.setdefault(key, p) for p, key in enumerate(keys)]
+        if len(first) < len(canonical_map):
+            self.canonical_map = canonical_map
+
+    def canonical(self, pos):
+        if self.canonical_map is None:
+            return pos
+        return self.canonical_map[pos]
+
+    def next_canonical(self, pos, d):
+        # walk along d until reaching an entity not equivalent to pos
+        if self.canonical_map is None:
+            return self.next_entity(pos, d)
+        cur = self.canonical(pos)
+        next_pos = pos
+        for i in range(self.size):
+            next_pos = self.next_entity(pos, d)
+            if next_pos == pos or self.canonical(next_pos) != cur:
+                break
+            pos = next_pos
+        return self.canonical(next_pos)
+
     def get_entity(self, p):
         return self.static_entities[p]
 
+    def get_index(self, entity):
+        # entities loaded from json have lists in place of tuples
+        entity = _as_list(entity)
+        for p, x in enumerate(self.static_entities):
+            if _as_list(x) == entity:
+                return p
+        return None
+
+    def nearest_index(self, entity):
+        # the entity itself for the spaces without a metric
+        return self.get_index(entity)
+
     def get_direction(self, num):
         raise NotImplementedError()
 
@@ -112,14 +159,54 @@ class SubSpace(object):
         return self.size
 
 
+class LazyEntities(object):
+    """A read-only sequence of the entities of a subspace, made on access"""
+    def __init__(self, subspace):
+        self.subspace = subspace
+
+    def __len__(self):
+        return self.subspace.size
+
+    def __getitem__(self, p):
+        if isinstance(p, slice):
+            return [self.subspace.get_entity(i) for i in range(*p.indices(self.subspace.size))]
+        if p < 0:
+            p += self.subspace.size
+        if not 0 <= p < self.subspace.size:
+            raise IndexError("Space pointer out of range")
+        return self.subspace.get_entity(p)
+
+    def __iter__(self):
+        for p in range(self.subspace.size):
+            yield self.subspace.get_entity(p)
+
+    def index(self, entity):
+        p = self.subspace.get_index(entity)
+        if p is None:
+            raise ValueError("{} is not in space".format(entity))
+        return p
+
+
 class SplitSpace(SubSpace):
+    """Ordered factorizations of `total` into `dim` parts
+
+    in the order of `any_factor_split`, but never materialized:
+    an entity is decoded from its position with the counts of
+    factorizations of each remaining extent.
+    """
     def __init__(self, dim, total, allow_non_divisible='off'):
         super(SplitSpace, self).__init__()
+        assert_print(allow_non_divisible in ['off', 'power2', 'continuous'])
         self.total = total
         self.allow_non_divisible = allow_non_divisible
         self.dim = dim
-        self.static_entities = any_factor_split(total, dim, allow_non_divisible=allow_non_divisible)
-        self.size = len(self.static_entities)
+        self.factor_lsts = {}       # left -> the factors tried for left
+        self.factor_pos = {}        # left -> factor -> position in the factors
+        self.prefix_counts = {}     # (left, number) -> counts of the factorizations before each factor
+        self.size = self._count(total, dim)
+        self.static_entities = LazyEntities(self)
+        # (pos, d) -> next position, filled when walking
+        self.neighbours = {}
         self.num_direction = dim * (dim - 1)
         self.directions = []
         for i in range(self.dim):
@@ -127,6 +214,73 @@ class SplitSpace(SubSpace):
                 if i != j:
                     self.directions.append((i, j))
         self.type_key = "split"
+
+    def _factor_lst(self, left):
+        # the same factors in the same order as recursive_factor_split
+        if left not in self.factor_lsts:
+            if self.allow_non_divisible == 'power2':
+                f_lst = get_factor_lst(left)
+                f_lst.extend(powerx_lst(2, 1, left))
+                f_lst = list(set(f_lst))
+            elif self.allow_non_divisible == 'continuous':
+                f_lst = list(range(1, left + 1))
+            else:
+                f_lst = sorted(get_factor_lst(left))
+            self.factor_lsts[left] = f_lst
+            self.factor_pos[left] = dict((f, i) for i, f in reversed(list(enumerate(f_lst))))
+        return self.factor_lsts[left]
+
+    def _prefix(self, left, number):
+        key = (left, number)
+        if key not in self.prefix_counts:
+            f_lst = self._factor_lst(left)
+            counts = np.zeros(len(f_lst) + 1, dtype=np.int64)
+            children = {}
+            for i, f in enumerate(f_lst):
+                child = left // f
+                if child not in children:
+                    children[child] = self._count(child, number - 1)
+                counts[i + 1] = children[child]
+            self.prefix_counts[key] = np.cumsum(counts)
+        return self.prefix_counts[key]
+
+    def _count(self, left, number):
+        if number == 1:
+            return 1
+        return int(self._prefix(left, number)[-1])
+
+    def get_entity(self, p):
+        p = int(p)
+        ret = []
+        left = self.total
+        for number in range(self.dim, 1, -1):
+            prefix = self._prefix(left, number)
+            i = int(np.searchsorted(prefix, p, side="right")) - 1
+            f = self._factor_lst(left)[i]
+            p -= int(prefix[i])
+            ret.append(f)
+            left //= f
+        ret.append(left)
+        return ret
+
+    def get_index(self, entity):
+        if len(entity) != self.dim:
+            return None
+        p = 0
+        left = self.total
+        for number, f in zip(range(self.dim, 1, -1), entity):
+            self._factor_lst(left)
+            i = self.factor_pos[left].get(f)
+            if i is None:
+                return None
+            p += int(self._prefix(left, number)[i])
+            left //= f
+        if entity[-1] != left:
+            return None
+        return p
+
+    def random_entity(self):
+        return self.get_entity(np.random.randint(0, self.size))
     
     def next_entity(self, pos, d):
         # d is tuple
@@ -134,50 +288,91 @@ class SplitSpace(SubSpace):
             next_pos = (pos + d[0]) % self.size
             return next_pos
         elif len(d) == 2:
-            asc_pos, dec_pos = d[0], d[1]
-            assert_print(0 <= asc_pos < self.dim)
-            assert_print(0 <= dec_pos < self.dim)
-            assert_print(asc_pos != dec_pos)
-            current = self.static_entities[pos]
-            ret = current.copy()
-            left = current[asc_pos] * current[dec_pos]
-            canout = False
-            next_pos = -1
-            while not canout:
-                tmp = ret[asc_pos] + 1
-                while tmp <= left:
-                    if self.allow_non_divisible == 'continuous':
-                        break
-                    elif self.allow_non_divisible == 'power2' and is_power_of_x(2, tmp):
-                        break
-                    elif left % tmp == 0:
-                        break
-                    tmp += 1
-                tmp = min(tmp, left)
-                ret[asc_pos] = tmp
-                ret[dec_pos] = math.ceil(left / tmp)
-                try:
-                    next_pos = self.static_entities.index(ret)
-                    canout = True
-                except ValueError:
-                    canout = False
-            return next_pos
+            key = (pos, d[0], d[1])
+            if key not in self.neighbours:
+                self.neighbours[key] = self._next_split(pos, d)
+            return self.neighbours[key]
         else:
             raise RuntimeError(
                 "Not support for direction more than two dims: {}".format(d))
 
+    def _next_split(self, pos, d):
+        asc_pos, dec_pos = d[0], d[1]
+        assert_print(0 <= asc_pos < self.dim)
+        assert_print(0 <= dec_pos < self.dim)
+        assert_print(asc_pos != dec_pos)
+        current = self.get_entity(pos)
+        ret = current.copy()
+        left = current[asc_pos] * current[dec_pos]
+        canout = False
+        next_pos = -1
+        while not canout:
+            tmp = ret[asc_pos] + 1
+            while tmp <= left:
+                if self.allow_non_divisible == 'continuous':
+                    break
+                elif self.allow_non_divisible == 'power2' and is_power_of_x(2, tmp):
+                    break
+                elif left % tmp == 0:
+                    break
+                tmp += 1
+            tmp = min(tmp, left)
+            ret[asc_pos] = tmp
+            ret[dec_pos] = math.ceil(left / tmp)
+            next_pos = self.get_index(ret)
+            canout = next_pos is not None
+            if not canout and tmp >= left:
+                # no larger factor of left is in the space, e.g. power2 factors of a non-power-of-two total
+                next_pos = pos
+                canout = True
+        return next_pos
+
+    def nearest_index(self, entity, beam=32):
+        # split factors tuned for another extent, compared in log scale
+        if len(entity) != self.dim or min(entity) < 1:
+            return None
+        target = [math.log(x) for x in entity]
+        # (distance, factors, left) of the best prefixes
+        candidates = [(0.0, [], self.total)]
+        for k in range(self.dim - 1):
+            next_candidates = []
+            for distance, factors, left in candidates:
+                for f in self._factor_lst(left):
+                    next_candidates.append(
+                        (distance + math.fabs(math.log(f) - target[k]), factors + [f], left // f))
+            next_candidates.sort(key=lambda x: x[0])
+            candidates = next_candidates[:beam]
+        best = min(candidates, key=lambda x: x[0] + math.fabs(math.log(max(x[2], 1)) - target[-1]))
+        return self.get_index(best[1] + [best[2]])
+
     def get_direction(self, num):
         return self.directions[num % self.num_direction]
 
 
 class FuseSpace(SubSpace):
-    def __init__(self, dim, elements):
+    def __init__(self, dim, elements, extents=None):
         self.dim = dim
         self.static_entities = gen_group(elements, most_groups=self.dim)
         self.size = len(self.static_entities)
         self.num_direction = 2
         self.directions = [(-1,), (1,)]
         self.type_key = "fuse"
+        if extents is not None:
+            self.set_canonical_keys([self._group_key(x, extents) for x in self.static_entities])
+
+    @staticmethod
+    def _group_key(entity, extents):
+        # unit loops fused into either neighbour give the same schedule,
+        # so only the non-unit loops of each group matter
+        key = []
+        beg = 0
+        for end in entity:
+            if beg == end:
+                key.append(None)
+            else:
+                key.append(tuple(i for i in range(beg, end) if extents[i] != 1))
+            beg = end
+        return tuple(key)
     
     def next_entity(self, pos, d):
         # d is tuple
@@ -215,7 +410,7 @@ class ReorderSpace(SubSpace):
 
 
 class UnrollSpace(SubSpace):
-    def __init__(self, steps, explicit=False):
+    def __init__(self, steps, explicit=False, max_work=None):
         super(UnrollSpace, self).__init__()
         self.dim = 2
         self.static_entities = []
@@ -228,6 +423,19 @@ class UnrollSpace(SubSpace):
         self.num_direction = 2
         self.directions = [(-1,), (1,)]
         self.type_key = "unroll"
+        if max_work is not None:
+            self.set_canonical_keys([self._step_key(x, max_work) for x in self.static_entities])
+
+    @staticmethod
+    def _step_key(entity, max_work):
+        step, explicit = entity
+        # nothing is unrolled
+        if step <= 1:
+            return ("off",)
+        # the whole loop nest is unrolled
+        if step >= max_work:
+            return ("all", explicit)
+        return (step, explicit)
 
     def next_entity(self, pos, d):
         # d is tuple
@@ -402,8 +610,8 @@ def generate_merge_space(op_lst, down_graph, force_merge=False):
     return MergeSpce(merge_ops, len(op_lst), force_merge=force_merge)
 
 
-def generate_fuse_space(loops, groups):
-    return FuseSpace(groups, loops)
+def generate_fuse_space(loops, groups, extents=None):
+    return FuseSpace(groups, loops, extents=extents)
 
 
 def generate_split_space(extent, nparts, allow_non_divisible='off'):
@@ -414,8 +622,8 @@ def generate_reorder_space(num_spatial_axis):
     return ReorderSpace(num_spatial_axis)
 
 
-def generate_unroll_space(explicit=False):
-    return UnrollSpace([0, 1, 512, 1500], explicit=explicit)
+def generate_unroll_space(explicit=False, max_work=None):
+    return UnrollSpace([0, 1, 512, 1500], explicit=explicit, max_work=max_work)
 
 
 def generate_intrin_space(op, target):
@@ -469,7 +677,7 @@ def generate_space_intra_op(op, down_graph, slevel=4, rlevel=3, groups=3, split_
 
     # - fuse space
     if fuse_policy == "fuse_spatial":
-        fuse_space = generate_fuse_space(spatial_axis_names, groups)
+        fuse_space = generate_fuse_space(spatial_axis_names, groups, extents=spatial_axis_extents)
         schedule_space.add_subspace("fuse_spatial", fuse_space, "fuse")
 
     # - split space
@@ -486,7 +694,10 @@ def generate_space_intra_op(op, down_graph, slevel=4, rlevel=3, groups=3, split_
         schedule_space.add_subspace("reorder", reorder_space, "reorder")
 
     # -unroll space
-    unroll_space = generate_unroll_space(explicit=(unroll_policy == "explicit"))
+    # an upper bound of the unrolling steps of the whole loop nest
+    max_work = reduce(lambda x, y: x * y, spatial_axis_extents + reduced_axis_extents, 1)
+    max_work *= len(op.input_tensors) + 2
+    unroll_space = generate_unroll_space(explicit=(unroll_policy == "explicit"), max_work=max_work)
     schedule_space.add_subspace("unroll", unroll_space, "unroll")
     
     # - other special spaces can be added   
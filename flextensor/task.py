@@ -1,4 +1,7 @@
 import tvm
+import math
+import threading
+from collections.abc import MutableMapping
 
 from flextensor.nn import conv2d_nchw, gemm as op_gemm, conv1d as op_conv1d, conv3d_ncdhw, \
     gemm_conv2d_nchw, gemv as op_gemv, bilinear as op_bilinear, MTTKRP3d, conv_transpose1d as op_conv_transpose1d, \
@@ -26,13 +29,96 @@ from flextensor.configs.shift_conv2d_config import shift_conv2d_shape
 
 from flextensor.space import EnumSpace
 
-TASK_TABLE = {}
+class TaskTable(MutableMapping):
+    """The registered tasks by key, built on first lookup
+
+    The tasks of the shape tables are registered as groups, a generator of the tasks
+    and the categories they belong to. A group is generated the first time a key of
+    one of its categories is looked up, iterating the table generates all of them.
+    """
+    def __init__(self):
+        self.tasks = {}
+        # [categories, generator, generated]
+        self.groups = []
+        # registered by `register_task`, not overridden by the groups
+        self.explicit = set()
+        self.lock = threading.RLock()
+
+    def add_group(self, categories, generator):
+        self.groups.append([list(categories), generator, False])
+
+    def _generate(self, group):
+        group[2] = True
+        for task in group[1]():
+            if task.key not in self.explicit:
+                self.tasks[task.key] = task
+
+    def _load(self, category=None, key=None):
+        with self.lock:
+            for group in self.groups:
+                if group[2]:
+                    continue
+                if category is not None and category not in group[0]:
+                    continue
+                if key is not None and not any(key.startswith(c + "_") for c in group[0]):
+                    continue
+                self._generate(group)
+
+    def __getitem__(self, key):
+        if key not in self.tasks:
+            self._load(key=key)
+        return self.tasks[key]
+
+    def __setitem__(self, key, task):
+        self.explicit.add(key)
+        self.tasks[key] = task
+
+    def __delitem__(self, key):
+        self._load(key=key)
+        self.explicit.discard(key)
+        del self.tasks[key]
+
+    def __contains__(self, key):
+        if key not in self.tasks:
+            self._load(key=key)
+        return key in self.tasks
+
+    def __iter__(self):
+        self._load()
+        return iter(self.tasks)
+
+    def __len__(self):
+        self._load()
+        return len(self.tasks)
+
+    def query(self, category=None, name=None, target=None, dev_id=None):
+        """The tasks matching all the given fields, `name` is a prefix
+
+        e.g. all the llvm conv2d of yolo: query("conv2d", "yolo", "llvm")
+        """
+        self._load(category=category)
+        ret = []
+        for task in self.tasks.values():
+            if category is not None and task.category != category:
+                continue
+            if name is not None and not task.name.startswith(name):
+                continue
+            if target is not None and task.target != target:
+                continue
+            if dev_id is not None and task.dev_id != dev_id:
+                continue
+            ret.append(task)
+        return ret
+
+
+TASK_TABLE = TaskTable()
 
 
 class Task(object):
     def __init__(self, category, name, func, args, target, dev_id=0):
         self.key = "{}_{}_{}_{}({})".format(
             category, name, args, target, dev_id)
+        self.name = name
         self.func = func
         self.args = args
         self.target = target
@@ -53,11 +139,45 @@ def register_task(task, override=False):
     TASK_TABLE[task.key] = task
 
 
+def register_group(categories, generator):
+    """Register the tasks of `generator` when one of `categories` is first looked up"""
+    TASK_TABLE.add_group(categories, generator)
+
+
 def register(func, category, name, args, target, dev_id=0, override=False):
     task = Task(category, name, func, args, target, dev_id)
     register_task(task, override=override)
 
 
+def task_distance(task_a, task_b):
+    """The distance between the shapes of two tasks, None if they are not comparable"""
+    if task_a.category != task_b.category or task_a.target != task_b.target:
+        return None
+    if task_a.func is not task_b.func or len(task_a.args) != len(task_b.args):
+        return None
+    ret = 0.0
+    for a, b in zip(task_a.args, task_b.args):
+        if isinstance(a, int) and isinstance(b, int) and a >= 0 and b >= 0:
+            ret += math.fabs(math.log((a + 1) / (b + 1)))
+        elif a != b:
+            return None
+    return ret
+
+
+def nearest_tasks(task_key, candidate_keys, k=1):
+    """The keys of the k candidates nearest to the task, the nearest first"""
+    task = TASK_TABLE[task_key]
+    distances = []
+    for key in candidate_keys:
+        if key not in TASK_TABLE:
+            continue
+        distance = task_distance(task, TASK_TABLE[key])
+        if distance is not None:
+            distances.append((distance, key))
+    distances.sort()
+    return [key for _, key in distances[:k]]
+
+
 def conv1d(N, C, L, K, kernel, stride=1, padding=0, dilation=1, groups=1):
     Seq = tvm.placeholder((N, C, L))
     W = tvm.placeholder((K, C//groups, kernel))
@@ -234,14 +354,14 @@ def gatedpixelcnn(N, H, W, C, OutC, kernel_size, ClassVector=None, bias=None, st
 # register_task(Task("conv2d", "1x1-packed", conv2d_1x1_packed, (256, 256, 14, 14, 512, 1), "cuda", 0))
 
 
-for shape in conv1d_shapes:
-    batch, in_channel, length, out_channel, _, k_len, _, stride, padding, dilation, groups = shape
-    rin_channel = out_channel
-    rout_channel = in_channel
-    rlength = (length + 2 * padding - dilation * (k_len - 1) - 1) // stride + 1
-    for j in range(4):
-        register_task(
-            Task(
+def _conv1d_tasks():
+    for shape in conv1d_shapes:
+        batch, in_channel, length, out_channel, _, k_len, _, stride, padding, dilation, groups = shape
+        rin_channel = out_channel
+        rout_channel = in_channel
+        rlength = (length + 2 * padding - dilation * (k_len - 1) - 1) // stride + 1
+        for j in range(4):
+            yield Task(
                 "conv1d",
                 "conv1d",
                 conv1d,
@@ -249,9 +369,8 @@ for shape in conv1d_shapes:
                  k_len, stride, padding, dilation, groups),
                 "llvm",
                 j
-            ))
-        register_task(
-            Task(
+            )
+            yield Task(
                 "conv1d",
                 "conv1d",
                 conv1d,
@@ -259,9 +378,8 @@ for shape in conv1d_shapes:
                  k_len, stride, padding, dilation, groups),
                 "cuda",
                 j
-            ))
-        register_task(
-            Task(
+            )
+            yield Task(
                 "conv_transpose1d",
                 "conv_transpose1d",
                 conv_transpose1d,
@@ -269,9 +387,8 @@ for shape in conv1d_shapes:
                  k_len, stride, padding, dilation, groups),
                 "llvm",
                 j
-            ))
-        register_task(
-            Task(
+            )
+            yield Task(
                 "conv_transpose1d",
                 "conv_transpose1d",
                 conv_transpose1d,
@@ -279,7 +396,10 @@ for shape in conv1d_shapes:
                  k_len, stride, padding, dilation, groups),
                 "cuda",
                 j
-            ))
+            )
+
+
+register_group(["conv1d", "conv_transpose1d"], _conv1d_tasks)
 
 
 conv2d_shape_dict = {
@@ -294,18 +414,19 @@ conv2d_shape_dict = {
     "overfeat": overfeat_shapes
 }
 
-for name in ["yolo", "google", "res", "squeeze", "vgg-16", "test", "yolo_b8", "mobile_v2", "overfeat"]:
-    shapes = conv2d_shape_dict[name]
-    for i, shape in enumerate(shapes):
-        batch, in_channel, height, width, out_channel, _, k_h, k_w, _, stride, padding, dilation, groups = shape
-        rout_channel = in_channel
-        rin_channel = out_channel
-        rheight = (height + 2 * padding - dilation *
-                   (k_h - 1) - 1) // stride + 1
-        rwidth = (width + 2 * padding - dilation * (k_w - 1) - 1) // stride + 1
-        for j in range(4):
-            register_task(
-                Task(
+
+def _conv2d_tasks():
+    for name in ["yolo", "google", "res", "squeeze", "vgg-16", "test", "yolo_b8", "mobile_v2", "overfeat"]:
+        shapes = conv2d_shape_dict[name]
+        for i, shape in enumerate(shapes):
+            batch, in_channel, height, width, out_channel, _, k_h, k_w, _, stride, padding, dilation, groups = shape
+            rout_channel = in_channel
+            rin_channel = out_channel
+            rheight = (height + 2 * padding - dilation *
+                       (k_h - 1) - 1) // stride + 1
+            rwidth = (width + 2 * padding - dilation * (k_w - 1) - 1) // stride + 1
+            for j in range(4):
+                yield Task(
                     "conv2d",
                     name + str(i),
                     conv2d,
@@ -313,9 +434,8 @@ for name in ["yolo", "google", "res", "squeeze", "vgg-16", "test", "yolo_b8", "m
                      k_h, stride, padding, dilation, groups),
                     "llvm",
                     j
-                ))
-            register_task(
-                Task(
+                )
+                yield Task(
                     "conv2d",
                     name + str(i),
                     conv2d,
@@ -323,9 +443,8 @@ for name in ["yolo", "google", "res", "squeeze", "vgg-16", "test", "yolo_b8", "m
                      k_h, stride, padding, dilation, groups),
                     "cuda",
                     j
-                ))
-            register_task(
-                Task(
+                )
+                yield Task(
                     "gemm_conv2d",
                     name + str(i),
                     gemm_conv2d,
@@ -333,9 +452,8 @@ for name in ["yolo", "google", "res", "squeeze", "vgg-16", "test", "yolo_b8", "m
                      k_h, stride, padding, dilation, groups),
                     "llvm",
                     j
-                ))
-            register_task(
-                Task(
+                )
+                yield Task(
                     "gemm_conv2d",
                     name + str(i),
                     gemm_conv2d,
@@ -343,9 +461,8 @@ for name in ["yolo", "google", "res", "squeeze", "vgg-16", "test", "yolo_b8", "m
                      k_h, stride, padding, dilation, groups),
                     "cuda",
                     j
-                ))
-            register_task(
-                Task(
+                )
+                yield Task(
                     "conv_transpose2d",
                     name + str(i),
                     conv_transpose2d,
@@ -353,9 +470,8 @@ for name in ["yolo", "google", "res", "squeeze", "vgg-16", "test", "yolo_b8", "m
                      k_h, stride, padding, dilation, groups),
                     "llvm",
                     j
-                ))
-            register_task(
-                Task(
+                )
+                yield Task(
                     "conv_transpose2d",
                     name + str(i),
                     conv_transpose2d,
@@ -363,10 +479,9 @@ for name in ["yolo", "google", "res", "squeeze", "vgg-16", "test", "yolo_b8", "m
                      k_h, stride, padding, dilation, groups),
                     "cuda",
                     j
-                ))
-            # register common conv2d
-            register_task(
-                Task(
+                )
+                # register common conv2d
+                yield Task(
                     "conv2d",
                     "conv2d",
                     conv2d,
@@ -374,9 +489,8 @@ for name in ["yolo", "google", "res", "squeeze", "vgg-16", "test", "yolo_b8", "m
                      k_h, stride, padding, dilation, groups),
                     "llvm",
                     j
-                ))
-            register_task(
-                Task(
+                )
+                yield Task(
                     "conv2d",
                     "conv2d",
                     conv2d,
@@ -384,35 +498,42 @@ for name in ["yolo", "google", "res", "squeeze", "vgg-16", "test", "yolo_b8", "m
                      k_h, stride, padding, dilation, groups),
                     "cuda",
                     j
-                ))
+                )
+
+
+register_group(["conv2d", "gemm_conv2d", "conv_transpose2d"], _conv2d_tasks)
 
-for shape in depthwise_shapes:
-    batch, in_channel, H, W, factor, k, _, stride, padding, dilation = shape
-    for j in range(4):
-        register_task(
-            Task(
+
+def _depthwise_tasks():
+    for shape in depthwise_shapes:
+        batch, in_channel, H, W, factor, k, _, stride, padding, dilation = shape
+        for j in range(4):
+            yield Task(
                 "conv2d",
                 "depthwise",
                 depthwise_conv2d,
                 (batch, in_channel, H, W, factor, k, stride, padding, dilation),
                 "llvm",
                 j
-            ))
-        register_task(
-            Task(
+            )
+            yield Task(
                 "conv2d",
                 "depthwise",
                 depthwise_conv2d,
                 (batch, in_channel, H, W, factor, k, stride, padding, dilation),
                 "cuda",
                 j
-            ))
+            )
+
+
+register_group(["conv2d"], _depthwise_tasks)
+
 
-for shape in grouped_shapes:
-    batch, in_channel, H, W, out_channel, k, _, stride, padding, dilation, groups = shape
-    for j in range(4):
-        register_task(
-            Task(
+def _grouped_tasks():
+    for shape in grouped_shapes:
+        batch, in_channel, H, W, out_channel, k, _, stride, padding, dilation, groups = shape
+        for j in range(4):
+            yield Task(
                 "conv2d",
                 "grouped",
                 conv2d,
@@ -420,9 +541,8 @@ for shape in grouped_shapes:
                  k, stride, padding, dilation, groups),
                 "llvm",
                 j
-            ))
-        register_task(
-            Task(
+            )
+            yield Task(
                 "conv2d",
                 "grouped",
                 conv2d,
@@ -430,13 +550,17 @@ for shape in grouped_shapes:
                  k, stride, padding, dilation, groups),
                 "cuda",
                 j
-            ))
+            )
+
+
+register_group(["conv2d"], _grouped_tasks)
 
-for shape in dilation_shapes:
-    batch, in_channel, H, W, out_channel, k, _, stride, padding, dilation, groups = shape
-    for j in range(4):
-        register_task(
-            Task(
+
+def _dilation_tasks():
+    for shape in dilation_shapes:
+        batch, in_channel, H, W, out_channel, k, _, stride, padding, dilation, groups = shape
+        for j in range(4):
+            yield Task(
                 "conv2d",
                 "dilation",
                 conv2d,
@@ -444,9 +568,8 @@ for shape in dilation_shapes:
                  k, stride, padding, dilation, groups),
                 "llvm",
                 j
-            ))
-        register_task(
-            Task(
+            )
+            yield Task(
                 "conv2d",
                 "dilation",
                 conv2d,
@@ -454,18 +577,22 @@ for shape in dilation_shapes:
                  k, stride, padding, dilation, groups),
                 "cuda",
                 j
-            ))
-
-for shape in conv3d_shapes:
-    batch, in_channel, D, H, W, out_channel, _, k, _, stride, padding, dilation, groups = shape
-    rin_channel = out_channel
-    rout_channel = in_channel
-    rD = (D + 2 * padding - dilation * (k - 1) - 1) // stride + 1
-    rH = (H + 2 * padding - dilation * (k - 1) - 1) // stride + 1
-    rW = (W + 2 * padding - dilation * (k - 1) - 1) // stride + 1
-    for j in range(4):
-        register_task(
-            Task(
+            )
+
+
+register_group(["conv2d"], _dilation_tasks)
+
+
+def _conv3d_tasks():
+    for shape in conv3d_shapes:
+        batch, in_channel, D, H, W, out_channel, _, k, _, stride, padding, dilation, groups = shape
+        rin_channel = out_channel
+        rout_channel = in_channel
+        rD = (D + 2 * padding - dilation * (k - 1) - 1) // stride + 1
+        rH = (H + 2 * padding - dilation * (k - 1) - 1) // stride + 1
+        rW = (W + 2 * padding - dilation * (k - 1) - 1) // stride + 1
+        for j in range(4):
+            yield Task(
                 "conv3d",
                 "conv3d",
                 conv3d,
@@ -473,9 +600,8 @@ for shape in conv3d_shapes:
                  k, stride, padding, dilation, groups),
                 "llvm",
                 j
-            ))
-        register_task(
-            Task(
+            )
+            yield Task(
                 "conv3d",
                 "conv3d",
                 conv3d,
@@ -483,9 +609,8 @@ for shape in conv3d_shapes:
                  k, stride, padding, dilation, groups),
                 "cuda",
                 j
-            ))
-        register_task(
-            Task(
+            )
+            yield Task(
                 "conv_transpose3d",
                 "conv_transpose3d",
                 conv_transpose3d,
@@ -493,9 +618,8 @@ for shape in conv3d_shapes:
                  k, stride, padding, dilation, groups),
                 "llvm",
                 j
-            ))
-        register_task(
-            Task(
+            )
+            yield Task(
                 "conv_transpose3d",
                 "conv_transpose3d",
                 conv_transpose3d,
@@ -503,13 +627,21 @@ for shape in conv3d_shapes:
                  k, stride, padding, dilation, groups),
                 "cuda",
                 j
-            ))
+            )
+
+
+register_group(["conv3d", "conv_transpose3d"], _conv3d_tasks)
+
 
-for shape in gemv_shapes:
-    N, K, _ = shape
-    for j in range(4):
-        register_task(Task("gemv", "gemv", gemv, (N, K), "llvm", j))
-        register_task(Task("gemv", "gemv", gemv, (N, K), "cuda", j))
+def _gemv_tasks():
+    for shape in gemv_shapes:
+        N, K, _ = shape
+        for j in range(4):
+            yield Task("gemv", "gemv", gemv, (N, K), "llvm", j)
+            yield Task("gemv", "gemv", gemv, (N, K), "cuda", j)
+
+
+register_group(["gemv"], _gemv_tasks)
 
 
 def gemm_uint8_int8(i, j, k, dtype="int32"):
@@ -523,19 +655,23 @@ def gemm_uint8_int8(i, j, k, dtype="int32"):
     return [c.op], [b, a, c]
 
 
-for shape in gemm_shapes:
-    N, K, M = shape
-    for j in range(4):
-        register_task(Task("gemm", "gemm", gemm,
-                      (N, K, M, "int8"), "micro", j))
-        register_task(Task("gemm", "gemm", gemm_uint8_int8,
-                      (M, N, K, "int32"), "llvm -mcpu=skylake-avx512", j))
-        register_task(Task("gemm", "gemm", gemm_uint8_int8,
-                      (M, N, K, "int32"), "llvm -mcpu=cascadelake", j))
-        register_task(Task("gemm", "gemm", gemm,
-                      (N, K, M, "float32"), "llvm", j))
-        register_task(Task("gemm", "gemm", gemm,
-                      (N, K, M, "float32"), "cuda", j))
+def _gemm_tasks():
+    for shape in gemm_shapes:
+        N, K, M = shape
+        for j in range(4):
+            yield Task("gemm", "gemm", gemm,
+                       (N, K, M, "int8"), "micro", j)
+            yield Task("gemm", "gemm", gemm_uint8_int8,
+                       (M, N, K, "int32"), "llvm -mcpu=skylake-avx512", j)
+            yield Task("gemm", "gemm", gemm_uint8_int8,
+                       (M, N, K, "int32"), "llvm -mcpu=cascadelake", j)
+            yield Task("gemm", "gemm", gemm,
+                       (N, K, M, "float32"), "llvm", j)
+            yield Task("gemm", "gemm", gemm,
+                       (N, K, M, "float32"), "cuda", j)
+
+
+register_group(["gemm"], _gemm_tasks)
 
 
 # for shape in test_gemm_shapes:
@@ -544,59 +680,99 @@ for shape in gemm_shapes:
 #         register_task(Task("gemm", "test_gemm", gemm, (N, K, M), "llvm", j))
 #         register_task(Task("gemm", "test_gemm", gemm, (N, K, M), "cuda", j))
 
-for shape in bilinear_shapes:
-    N, K1, K2, M = shape
-    for j in range(4):
-        register_task(Task("bilinear", "bilinear",
-                      bilinear, (N, K1, K2, M), "llvm", j))
-        register_task(Task("bilinear", "bilinear",
-                      bilinear, (N, K1, K2, M), "cuda", j))
-
-for shape in mttkrp_shapes:
-    N, K1, K2, M = shape
-    for j in range(4):
-        register_task(Task("mttkrp", "mttkrp", mttkrp,
-                      (N, K1, K2, M), "llvm", j))
-        register_task(Task("mttkrp", "mttkrp", mttkrp,
-                      (N, K1, K2, M), "cuda", j))
-
-for shape in block_circulant_matrix_shapes:
-    ROW, COL, FFT = shape
-    for j in range(4):
-        for platform in ('llvm', 'cuda'):
-            register_task(Task('block_circulant_matrix', 'block_circulant_matrix',
-                          block_circulant_matrix, (ROW, COL, FFT), platform, j))
-
-for shape in maxunpooling1d_shape:
-    for j in range(4):
-        register_task(Task("maxunpooling1d", "maxunpooling1d",
-                      maxunpooling1d, shape, "llvm", j))
-        register_task(Task("maxunpooling1d", "maxunpooling1d",
-                      maxunpooling1d, shape, "cuda", j))
-
-for shape in maxunpooling2d_shape:
-    for j in range(4):
-        register_task(Task("maxunpooling2d", "maxunpooling2d",
-                      maxunpooling2d, shape, "llvm", j))
-        register_task(Task("maxunpooling2d", "maxunpooling2d",
-                      maxunpooling2d, shape, "cuda", j))
-
-for shape in PixelCNN_shape:
-    # batch, H, W, in_C, out_C, KH, KW, mask_type, bias, dilation, stride, padding
-    for j in range(4):
-        register_task(Task("pixelcnn", "pixelcnn", pixelcnn, shape, "llvm", j))
-        register_task(Task("pixelcnn", "pixelcnn", pixelcnn, shape, "cuda", j))
-
-for shape in gated_pixelcnn_shape:
-    for j in range(4):
-        register_task(Task("gatedpixelcnn", "gatedpixelcnn",
-                      gatedpixelcnn, shape, "llvm", j))
-        register_task(Task("gatedpixelcnn", "gatedpixelcnn",
-                      gatedpixelcnn, shape, "cuda", j))
-
-for shape in shift_conv2d_shape:
-    for j in range(4):
-        register_task(Task("shift_conv2d", "shift_conv2d",
-                      shiftconv2d, shape, "llvm", j))
-        register_task(Task("shift_conv2d", "shift_conv2d",
-                      shiftconv2d, shape, "cuda", j))
+
+def _bilinear_tasks():
+    for shape in bilinear_shapes:
+        N, K1, K2, M = shape
+        for j in range(4):
+            yield Task("bilinear", "bilinear",
+                       bilinear, (N, K1, K2, M), "llvm", j)
+            yield Task("bilinear", "bilinear",
+                       bilinear, (N, K1, K2, M), "cuda", j)
+
+
+register_group(["bilinear"], _bilinear_tasks)
+
+
+def _mttkrp_tasks():
+    for shape in mttkrp_shapes:
+        N, K1, K2, M = shape
+        for j in range(4):
+            yield Task("mttkrp", "mttkrp", mttkrp,
+                       (N, K1, K2, M), "llvm", j)
+            yield Task("mttkrp", "mttkrp", mttkrp,
+                       (N, K1, K2, M), "cuda", j)
+
+
+register_group(["mttkrp"], _mttkrp_tasks)
+
+
+def _block_circulant_matrix_tasks():
+    for shape in block_circulant_matrix_shapes:
+        ROW, COL, FFT = shape
+        for j in range(4):
+            for platform in ('llvm', 'cuda'):
+                yield Task('block_circulant_matrix', 'block_circulant_matrix',
+                           block_circulant_matrix, (ROW, COL, FFT), platform, j)
+
+
+register_group(["block_circulant_matrix"], _block_circulant_matrix_tasks)
+
+
+def _maxunpooling1d_tasks():
+    for shape in maxunpooling1d_shape:
+        for j in range(4):
+            yield Task("maxunpooling1d", "maxunpooling1d",
+                       maxunpooling1d, shape, "llvm", j)
+            yield Task("maxunpooling1d", "maxunpooling1d",
+                       maxunpooling1d, shape, "cuda", j)
+
+
+register_group(["maxunpooling1d"], _maxunpooling1d_tasks)
+
+
+def _maxunpooling2d_tasks():
+    for shape in maxunpooling2d_shape:
+        for j in range(4):
+            yield Task("maxunpooling2d", "maxunpooling2d",
+                       maxunpooling2d, shape, "llvm", j)
+            yield Task("maxunpooling2d", "maxunpooling2d",
+                       maxunpooling2d, shape, "cuda", j)
+
+
+register_group(["maxunpooling2d"], _maxunpooling2d_tasks)
+
+
+def _pixelcnn_tasks():
+    for shape in PixelCNN_shape:
+        # batch, H, W, in_C, out_C, KH, KW, mask_type, bias, dilation, stride, padding
+        for j in range(4):
+            yield Task("pixelcnn", "pixelcnn", pixelcnn, shape, "llvm", j)
+            yield Task("pixelcnn", "pixelcnn", pixelcnn, shape, "cuda", j)
+
+
+register_group(["pixelcnn"], _pixelcnn_tasks)
+
+
+def _gated_pixelcnn_tasks():
+    for shape in gated_pixelcnn_shape:
+        for j in range(4):
+            yield Task("gatedpixelcnn", "gatedpixelcnn",
+                       gatedpixelcnn, shape, "llvm", j)
+            yield Task("gatedpixelcnn", "gatedpixelcnn",
+                       gatedpixelcnn, shape, "cuda", j)
+
+
+register_group(["gatedpixelcnn"], _gated_pixelcnn_tasks)
+
+
+def _shift_conv2d_tasks():
+    for shape in shift_conv2d_shape:
+        for j in range(4):
+            yield Task("shift_conv2d", "shift_conv2d",
+                       shiftconv2d, shape, "llvm", j)
+            yield Task("shift_conv2d", "shift_conv2d",
+                       shiftconv2d, shape, "cuda", j)
+
+
+register_group(["shift_conv2d"], _shift_conv2d_tasks)
@@ -0,0 +1,208 @@
+"""Throughput of the tuner itself
+
+Runs `schedule` on a fixed set of llvm tasks and reports the configs built
+and measured per second, the time the tuning process spends per trial
+outside of waiting for builds and measurements, and the peak RSS.
+Every task is tuned in a fresh process, so the RSS is the one of that task.
+With `--mock` the latencies come from an `AnalyticalMeasurer`, nothing is
+compiled and the search loop alone is benchmarked, deterministically.
+With `--replay` they come from recorded measurements, so the best latency
+found by each method tells its convergence speed without a device.
+
+    python flextensor/test/benchmark_tuning.py --mock --trials 50
+    python flextensor/test/benchmark_tuning.py --replay records.db --method q
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import resource
+import threading
+import psutil
+import numpy as np
+from flextensor.task import Task, TASK_TABLE
+from flextensor.scheduler import schedule
+from flextensor.pool import get_mp_context
+from flextensor.measure import AnalyticalMeasurer, ReplayMeasurer
+from flextensor.configs.conv1d_config import conv1d_shapes
+from flextensor.configs.conv2d_config import test_conv_shapes
+from flextensor import trace
+
+
+def benchmark_tasks(target="llvm", dev_id=0):
+    ret = []
+    # a small gemm of gemm_shapes
+    ret.append(Task("gemm", "gemm", None, (64, 64, 32, "float32"), target, dev_id).key)
+    # the conv2d of test_conv_shapes
+    for i, shape in enumerate(test_conv_shapes):
+        batch, in_channel, height, width, out_channel, _, k_h, k_w, _, stride, padding, dilation, groups = shape
+        ret.append(Task("conv2d", "test" + str(i), None,
+                        (batch, in_channel, height, width, out_channel, k_h, stride, padding, dilation, groups),
+                        target, dev_id).key)
+    # the smallest conv1d
+    batch, in_channel, length, out_channel, _, k_len, _, stride, padding, dilation, groups = conv1d_shapes[-1]
+    ret.append(Task("conv1d", "conv1d", None,
+                    (batch, in_channel, length, out_channel, k_len, stride, padding, dilation, groups),
+                    target, dev_id).key)
+    for key in ret:
+        assert key in TASK_TABLE, key
+    return ret
+
+
+def peak_rss_mb(pid):
+    """The peak RSS of a process from /proc, 0 if it is gone"""
+    try:
+        with open("/proc/%d/status" % pid, "r") as fin:
+            for line in fin:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return 0.0
+
+
+class ChildrenPeak(object):
+    """Samples the peak RSS of the largest descendant of this process
+
+    the helpers are started by a fork server, so they are not waited for by
+    this process and RUSAGE_CHILDREN does not see them
+    """
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0.0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        me = psutil.Process()
+        while True:
+            for child in me.children(recursive=True):
+                self.peak = max(self.peak, peak_rss_mb(child.pid))
+            if self.stopped.wait(self.interval):
+                break
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        return self.peak
+
+
+def benchmark(task_key, trials=20, parallel=4, method="searching", measurer=None, timeout=4.0):
+    """Tune the task once, returns a dict of the throughput numbers"""
+    trace_dir = tempfile.mkdtemp(prefix="flextensor_bench_")
+    np.random.seed(0)
+    children = ChildrenPeak()
+    try:
+        beg = time.time()
+        s, bufs, configs = schedule(task_key, op_trial=trials, graph_trial=max(trials // 5, 1), parallel=parallel,
+                                    timeout=timeout, method=method, measurer=measurer, trace=trace_dir)
+        wall = time.time() - beg
+        trace.disable()
+        events = trace.load(trace_dir)
+    finally:
+        trace.disable()
+        shutil.rmtree(trace_dir, ignore_errors=True)
+        children_rss = children.stop()
+    pid = os.getpid()
+    built = 0
+    measured = 0
+    trials_done = 0
+    waited = 0.0
+    for event in events:
+        if event["name"] == "build.build":
+            built += 1
+        elif event["name"] in ("eval.run", "eval.simulate"):
+            measured += 1
+        if event["pid"] != pid:
+            continue
+        if event["name"] == "parallel_evaluate":
+            trials_done += event["args"]["configs"]
+        elif event["name"] in ("wait_build", "wait_measure", "eval.simulate"):
+            waited += event["dur"] / 1e6
+    return {
+        "best": measurer.measure(task_key, configs) if measurer is not None else float("nan"),
+        "wall": wall,
+        "trials": trials_done,
+        "built_per_s": built / wall,
+        "measured_per_s": measured / wall,
+        "overhead_ms": (wall - waited) * 1e3 / max(trials_done, 1),
+        # ru_maxrss is in KB on Linux
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "children_rss_mb": children_rss
+    }
+
+
+def _benchmark_process(conn, task_key, kwargs):
+    try:
+        res = benchmark(task_key, **kwargs)
+    except Exception as e:
+        res = e
+    measurer = kwargs.get("measurer")
+    conn.send((res, getattr(measurer, "hits", 0), getattr(measurer, "misses", 0)))
+    conn.close()
+
+
+def benchmark_in_process(task_key, **kwargs):
+    """`benchmark` in a fresh process, so that its peak RSS is of this task only
+
+    returns the throughput numbers and the replay hits and misses of the measurer
+    """
+    multi = get_mp_context()
+    parent_conn, child_conn = multi.Pipe()
+    p = multi.Process(target=_benchmark_process, args=(child_conn, task_key, kwargs))
+    p.start()
+    child_conn.close()
+    try:
+        res, hits, misses = parent_conn.recv()
+    except EOFError:
+        res, hits, misses = RuntimeError("The benchmark process of %s died" % task_key), 0, 0
+    p.join()
+    if isinstance(res, Exception):
+        raise res
+    return res, hits, misses
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trials", help="trials of each op", type=int, default=20)
+    parser.add_argument("--parallel", help="build and measure workers", type=int, default=4)
+    parser.add_argument("--method", help="searching, q or random", type=str, default="searching")
+    parser.add_argument("--timeout", help="timeout of a build or measurement", type=float, default=4.0)
+    parser.add_argument("--mock", help="analytical latencies, nothing is compiled", action="store_true")
+    parser.add_argument("--noise", help="relative noise of the analytical latencies", type=float, default=0.0)
+    parser.add_argument("--replay", help="the records or logs to replay, nothing is compiled",
+                        type=str, nargs="*", default=[])
+    args = parser.parse_args()
+
+    measurer = None
+    if args.mock or args.replay:
+        measurer = AnalyticalMeasurer(noise=args.noise)
+    if args.replay:
+        measurer = ReplayMeasurer(measurer)
+        for path in args.replay:
+            if path.endswith(".db"):
+                measurer.load_records(path)
+            else:
+                measurer.load_log(path)
+    results = []
+    hits = 0
+    misses = 0
+    for task_key in benchmark_tasks():
+        print("[FlexTensor] Benchmark %s" % task_key, flush=True)
+        res, task_hits, task_misses = benchmark_in_process(
+            task_key, trials=args.trials, parallel=args.parallel, method=args.method,
+            measurer=measurer, timeout=args.timeout)
+        results.append((task_key, res))
+        hits += task_hits
+        misses += task_misses
+    print()
+    print("%-60s %8s %8s %10s %12s %14s %10s %14s %12s" % (
+        "task", "wall(s)", "trials", "built/s", "measured/s", "overhead(ms)", "rss(MB)", "child rss(MB)", "best(ms)"))
+    for task_key, res in results:
+        print("%-60s %8.2f %8d %10.2f %12.2f %14.3f %10.1f %14.1f %12.6f" % (
+            task_key[:60], res["wall"], res["trials"], res["built_per_s"], res["measured_per_s"],
+            res["overhead_ms"], res["rss_mb"], res["children_rss_mb"], res["best"]))
+    if args.replay:
+        print("[FlexTensor] %d replayed, %d estimated" % (hits, misses))
@@ -0,0 +1,57 @@
+import math
+from flextensor.remote import measure_adaptive, t_quantile
+
+
+class FakeResult(object):
+    def __init__(self, results):
+        self.results = results
+
+
+class FakeFunc(object):
+    """A module whose runs take `probe` seconds, then `costs` seconds per repeat"""
+    entry_name = "default_function"
+
+    def __init__(self, probe, costs):
+        self.probe = probe
+        self.costs = costs
+        self.numbers = []
+
+    def time_evaluator(self, name, ctx, number=1, repeat=1):
+        self.numbers.append(number)
+        if len(self.numbers) == 1:
+            return lambda *arys: FakeResult([self.probe] * repeat)
+        return lambda *arys: FakeResult(self.costs[:repeat])
+
+
+def test():
+    # 1, 2 and 3 ms, the mean is 2 ms with a standard deviation of 1 ms
+    func = FakeFunc(0.0005, [0.001, 0.002, 0.003])
+    mean, interval = measure_adaptive(func, None, [], 10)
+    assert abs(mean - 2.0) < 1e-9
+    # three repeats have 2 degrees of freedom
+    assert abs(interval - 4.303 / math.sqrt(3)) < 1e-9, interval
+    # a repeat lasts 10 ms by the 0.5 ms probe
+    assert func.numbers == [1, 20]
+
+    # but no longer than max_repeat_ms
+    func = FakeFunc(0.0005, [0.001, 0.002, 0.003])
+    measure_adaptive(func, None, [], 10, max_repeat_ms=4)
+    assert func.numbers == [1, 8]
+    func = FakeFunc(0.0005, [0.001, 0.002, 0.003])
+    measure_adaptive(func, None, [], 10, max_repeat_ms=0.1)
+    assert func.numbers == [1, 1]
+
+    # rejected after the probe
+    func = FakeFunc(0.0005, [0.001, 0.002, 0.003])
+    assert measure_adaptive(func, None, [], 10, reject_threshold=0.1) == (0.5, None)
+    assert func.numbers == [1]
+
+    # the normal quantile for many repeats
+    func = FakeFunc(0.0005, [0.001, 0.003] * 50)
+    mean, interval = measure_adaptive(func, None, [], 10, repeat=100)
+    assert abs(interval - 1.96 * math.sqrt(100 / 99.0) / 10) < 1e-9, interval
+    assert t_quantile(1) == 12.706 and t_quantile(30) == 2.042
+
+
+if __name__ == "__main__":
+    test()
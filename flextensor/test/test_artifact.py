@@ -0,0 +1,72 @@
+import os
+import tempfile
+from flextensor.artifact import ArtifactStore, KernelCache, _cache_bytes
+
+
+def test_artifact_store():
+    root = tempfile.mkdtemp()
+    os.environ["FLEXTENSOR_ARTIFACT_DIR"] = root
+    try:
+        # shared libraries loaded in place locally, archives linked by the remote
+        for export_format in [".so", ".tar"]:
+            store = ArtifactStore(export_format=export_format)
+            assert os.path.dirname(store.path) == root
+            names = [store.new_name() for i in range(10)]
+            assert all(name.endswith(export_format) for name in names)
+            name = names[0]
+            for path in [store.get_path(name), store.get_path(name + ".obj")]:
+                with open(path, "wb") as fout:
+                    fout.write(b"module")
+            store.remove(name)
+            assert os.listdir(store.path) == []
+            # removing twice is fine
+            store.remove(name)
+            store.cleanup()
+            assert not os.path.exists(store.path)
+    finally:
+        del os.environ["FLEXTENSOR_ARTIFACT_DIR"]
+
+
+def test_kernel_cache():
+    cache = KernelCache(tempfile.mkdtemp(), max_bytes=1000, low_water=0.5)
+    # every part of the key matters
+    key = cache.key("stmt", "llvm")
+    assert key == cache.key("stmt", "llvm", None, "local", 0)
+    others = [cache.key("stmt2", "llvm"), cache.key("stmt", "cuda"), cache.key("stmt", "llvm", "llvm"),
+              cache.key("stmt", "llvm", hardware="other"), cache.key("stmt", "llvm", dev_id=1)]
+    assert len(set(others + [key])) == 6
+
+    assert cache.load_latency(key) is None
+    cache.store_latency(key, 1.5)
+    assert cache.load_latency(key) == 1.5
+    src = os.path.join(tempfile.mkdtemp(), "module.so")
+    with open(src, "wb") as fout:
+        fout.write(b"x" * 100)
+    dst = os.path.join(tempfile.mkdtemp(), "copy.so")
+    assert not cache.fetch_module(key, dst)
+    cache.store_module(key, src)
+    assert cache.fetch_module(key, dst)
+    with open(dst, "rb") as fout:
+        assert fout.read() == b"x" * 100
+
+    # beyond max_bytes the least recently used go, down to low_water of it
+    cache = KernelCache(tempfile.mkdtemp(), max_bytes=1000, low_water=0.5)
+    keys = [cache.key("stmt%d" % i, "llvm") for i in range(11)]
+    for i, k in enumerate(keys[:10]):
+        cache.store_module(k, src)
+        os.utime(cache._entry_path(k, ".so"), (i + 1, i + 1))
+    assert len(os.listdir(cache.path)) == 10
+    cache.store_module(keys[10], src)
+    kept = [k for k in keys if os.path.exists(cache._entry_path(k, ".so"))]
+    assert kept == keys[6:], kept
+    assert _cache_bytes[cache.path] == (500, 0)
+    assert cache.evict() == 500
+
+
+def test():
+    test_artifact_store()
+    test_kernel_cache()
+
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,88 @@
+import os
+import tempfile
+from flextensor.utils import Config
+from flextensor.record import RecordDatabase
+from flextensor.measure import Measurer, AnalyticalMeasurer, ReplayMeasurer
+
+
+class FakeMeasurer(Measurer):
+    """The latency is the first split factor, inf for 0"""
+    def measure(self, task_key, configs):
+        factor = configs.op_config_lst[0]["spatial"][0][0]
+        return float(factor) if factor > 0 else float("inf")
+
+
+def make_config(factor):
+    return Config([{"spatial": [[factor, 1]]}], None)
+
+
+def test_scale():
+    measurer = ReplayMeasurer(fallback=FakeMeasurer())
+    assert measurer.scale("task") == 1.0
+    # the median ratio, an outlier does not move it, nor a config the fallback can't estimate
+    for factor, latency in [(1, 2.0), (2, 4.0), (4, 8.0), (8, 100.0), (0, 1.0)]:
+        measurer.add("task", make_config(factor), latency)
+    assert measurer.scale("task") == 2.0
+    assert measurer.measure("task", make_config(3)) == 6.0
+    assert measurer.measure("task", make_config(2)) == 4.0
+    assert measurer.hits == 1 and measurer.misses == 1
+    # a better latency recalibrates
+    measurer.add("task", make_config(4), 1.0)
+    measurer.add("task", make_config(8), 1.0)
+    assert measurer.scale("task") == (0.25 + 2.0) / 2
+    # a worse one changes nothing
+    measurer.add("task", make_config(1), 50.0)
+    assert measurer.scale("task") == (0.25 + 2.0) / 2
+    # other tasks have their own scale
+    measurer.add("other", make_config(2), 1.0)
+    assert measurer.scale("other") == 0.5
+    assert ReplayMeasurer(fallback=FakeMeasurer(), calibrate=False).scale("task") == 1.0
+    measurer = ReplayMeasurer(fallback=FakeMeasurer(), calibrate=False)
+    measurer.add("task", make_config(1), 2.0)
+    assert measurer.measure("task", make_config(3)) == 3.0
+
+
+def test_replay():
+    path = os.path.join(tempfile.mkdtemp(), "records.db")
+    records = RecordDatabase(path)
+    op0 = {"spatial": [[1, 2, 4, 8]], "reduce": [[4, 4, 4]], "unroll": [], "fuse": []}
+    op1 = {"spatial": [[2, 2, 4, 8]], "reduce": [[4, 4, 4]]}
+    graph = {"inline": [[0]], "merge": []}
+    # the stage records are replayed as the whole schedules they measured
+    records.add("task", "hw", "op0", [[], None], {"spatial": [[1, 2, 4, 8]], "reduce": [[4, 4, 4]]}, 2.0)
+    records.add("task", "hw", "op1", [[op0], None], op1, 3.0)
+    records.add("task", "hw", "graph", [op0, op1], {"inline": [[0]]}, 1.5)
+    records.add("task", "hw", "final", "", Config([op0, op1], graph), 1.4)
+    records.close()
+
+    measurer = ReplayMeasurer()
+    assert measurer.load_records(path) == 4
+    assert measurer.measure("task", Config([op0], None)) == 2.0
+    assert measurer.measure("task", Config([op0, op1], {})) == 3.0
+    # the same schedule as the graph record, the best is kept
+    assert measurer.measure("task", Config([op0, op1], graph)) == 1.4
+    assert measurer.hits == 3
+
+    # the estimate is scaled to the recorded latencies
+    other = Config([{"spatial": [[8, 1, 1, 8]], "reduce": [[64, 1, 1]]}], None)
+    estimate = AnalyticalMeasurer().measure("task", other)
+    assert measurer.measure("task", other) == estimate * measurer.scale("task")
+    assert measurer.misses == 1
+
+    # logs with and without latency
+    log_path = os.path.join(os.path.dirname(path), "log.txt")
+    with open(log_path, "w") as fout:
+        print('task:[[{"spatial": [[4, 1, 1, 8]]}], {}]:0.5', file=fout)
+        print('task:[[{"spatial": [[2, 2, 1, 8]]}], {}]', file=fout)
+    assert measurer.load_log(log_path) == 1
+    assert measurer.measure("task", Config([{"spatial": [[4, 1, 1, 8]]}], None)) == 0.5
+    print("Replay scale", measurer.scale("task"))
+
+
+def test():
+    test_replay()
+    test_scale()
+
+
+if __name__ == "__main__":
+    test()
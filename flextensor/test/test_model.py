@@ -0,0 +1,38 @@
+import math
+import torch
+from flextensor.model import rank_loss, pad_perf_data
+
+
+def loop_rank_loss(y, t):
+    loss = 0.0
+    for i in range(len(y)):
+        for j in range(len(y)):
+            tmp = math.copysign(1.0, t[i] - t[j]) if t[i] != t[j] else 0.0
+            loss += math.log(1 + math.exp(-tmp * (y[i] - y[j])))
+    return loss
+
+
+def test_rank_loss():
+    torch.manual_seed(0)
+    for length in [1, 2, 7]:
+        y = torch.randn(length)
+        t = torch.rand(length)
+        assert abs(rank_loss(y, t).item() - loop_rank_loss(y.tolist(), t.tolist())) < 1e-4
+    # padded groups, the padding is not counted
+    data = [([[0.0]] * 3, [1.0, 2.0, 3.0]), ([[0.0]] * 5, [5.0, 4.0, 3.0, 2.0, 1.0])]
+    inputs, perf, mask = pad_perf_data(data)
+    assert list(inputs.shape) == [2, 5, 1] and mask.sum().item() == 8
+    y = torch.randn(2, 5)
+    expected = loop_rank_loss(y[0, :3].tolist(), data[0][1]) + loop_rank_loss(y[1].tolist(), data[1][1])
+    assert abs(rank_loss(y, perf, mask).item() - expected) < 1e-4
+    # two failed measurements are a tie, not NaN
+    loss = rank_loss(torch.tensor([0.5, 0.1, 0.2]), torch.tensor([float("inf"), float("inf"), 1.0]))
+    assert not math.isnan(loss.item())
+
+
+def test():
+    test_rank_loss()
+
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,195 @@
+import os
+import tempfile
+import threading
+import flextensor.scheduler as scheduler
+from flextensor.task import Task, register_task
+from flextensor.space import Space, SplitSpace
+from flextensor.pool import PoolResult, MeasureSlots
+from flextensor.record import RecordDatabase
+from flextensor.checkpoint import Checkpoint, SearchSuspended
+from flextensor.utils import Config
+
+
+TASK = Task("test", "pipeline", None, (), "llvm", 0)
+
+
+class LateResult(PoolResult):
+    """A build that finishes after it has been polled `polls` times"""
+    def __init__(self, value, polls):
+        super(LateResult, self).__init__()
+        self.value = value
+        self.polls = polls
+
+    def ready(self):
+        if self.polls <= 0:
+            self.set(self.value)
+        self.polls -= 1
+        return super(LateResult, self).ready()
+
+    def get(self, timeout=None):
+        self.set(self.value)
+        return super(LateResult, self).get(timeout)
+
+
+class FakeBuildPool(object):
+    """Builds that finish after being polled `polls` times, in turn, with `cached` latency if given
+
+    the configs whose first split factor is in `fail` do not build
+    """
+    def __init__(self, polls, cached=None, fail=()):
+        self.polls = polls
+        self.cached = cached
+        self.fail = fail
+        self.built = 0
+        self.configs = {}
+
+    def submit(self, func, timeout, func_name, task_key, configs, op_pos, **kwargs):
+        self.configs[func_name] = configs.op_config_lst[-1]
+        polls = self.polls[self.built % len(self.polls)]
+        self.built += 1
+        if configs.op_config_lst[-1]["spatial"][0][0] in self.fail:
+            return LateResult(RuntimeError("build fails"), polls)
+        return LateResult(((4,), ("float32",), None, self.cached), polls)
+
+
+def fake_execute(measured, build_pool):
+    def _execute(func, timeout, func_name, *args, **kwargs):
+        measured.append(func_name)
+        res = PoolResult()
+        # the latency is the first split factor
+        res.set(float(build_pool.configs[func_name]["spatial"][0][0]))
+        return res
+    return _execute
+
+
+def make_scheduler(build_pool, **kwargs):
+    register_task(TASK)
+    space = Space()
+    space.add_subspace("split_0", SplitSpace(2, 16), "spatial")
+    s = scheduler.Scheduler("op0", TASK.key, space, parallel=2, timeout=2.0, build_pool=build_pool, **kwargs)
+    s.op_pos = 0
+    return s
+
+
+def run_with_timeout(func, timeout=30.0):
+    ret = []
+    t = threading.Thread(target=lambda: ret.append(func()), daemon=True)
+    t.start()
+    t.join(timeout)
+    assert not t.is_alive(), "deadlock"
+    return ret[0]
+
+
+def test_staggered_builds():
+    # the builds finish while the scheduler checks them, it must never wait for its own builds
+    configs = [{"spatial": [[f, 16 // f]]} for f in [1, 2, 4, 8, 16]]
+    for polls in [[1], [0, 1], [2, 0, 1], [0]]:
+        build_pool = FakeBuildPool(polls)
+        measured = []
+        old_execute = scheduler.parallel_execute
+        scheduler.parallel_execute = fake_execute(measured, build_pool)
+        slots = MeasureSlots(2, cores=[0, 1])
+        s = make_scheduler(build_pool, measure_slots=slots)
+        try:
+            for _ in range(5):
+                res = run_with_timeout(lambda: s._parallel_evaluate(Config([], None), configs))
+                assert res == [1.0, 2.0, 4.0, 8.0, 16.0], res
+        finally:
+            scheduler.parallel_execute = old_execute
+            s.close()
+        assert not slots.builders and len(slots.free) == 2
+
+
+def test_overlap():
+    # measurements overlap the later builds, the results stay in candidate order
+    configs = [{"spatial": [[f, 16 // f]]} for f in [16, 8, 4, 2, 1]]
+    build_pool = FakeBuildPool([3, 0, 2, 1], fail=(4,))
+    measured = []
+    old_execute = scheduler.parallel_execute
+    scheduler.parallel_execute = fake_execute(measured, build_pool)
+    s = make_scheduler(build_pool)
+    s.overlap = True
+    try:
+        res = run_with_timeout(lambda: s._parallel_evaluate(Config([], None), configs))
+        assert res == [16.0, 8.0, float("inf"), 2.0, 1.0], res
+        assert len(measured) == 4 and s.evaluated == 5
+    finally:
+        scheduler.parallel_execute = old_execute
+        s.close()
+
+
+def test_records_once():
+    path = os.path.join(tempfile.mkdtemp(), "records.db")
+    records = RecordDatabase(path)
+    build_pool = FakeBuildPool([0])
+    measured = []
+    old_execute = scheduler.parallel_execute
+    scheduler.parallel_execute = fake_execute(measured, build_pool)
+    s = make_scheduler(build_pool, records=records)
+    configs = [{"spatial": [[2, 8]]}]
+    try:
+        assert s._parallel_evaluate(Config([], None), configs) == [2.0]
+        # found in the records, not measured nor recorded again
+        assert s._parallel_evaluate(Config([], None), configs) == [2.0]
+        assert len(measured) == 1
+        assert len(records.records()) == 1
+        # measured again on request, the new measurement is recorded
+        assert s._parallel_evaluate(Config([], None), configs, remeasure=True) == [2.0]
+        assert len(measured) == 2
+        assert len(records.records()) == 2
+    finally:
+        scheduler.parallel_execute = old_execute
+        s.close()
+        records.close()
+    # a kernel cache hit is new to these records
+    records = RecordDatabase(os.path.join(tempfile.mkdtemp(), "records.db"))
+    s = make_scheduler(FakeBuildPool([0], cached=3.0), records=records)
+    try:
+        assert s._parallel_evaluate(Config([], None), configs) == [3.0]
+        assert s._parallel_evaluate(Config([], None), configs) == [3.0]
+        assert len(records.records()) == 1
+    finally:
+        s.close()
+        records.close()
+
+
+def test_suspend():
+    # a search goes on from where the former call stopped at its budget
+    register_task(TASK)
+    build_pool = FakeBuildPool([0])
+    measured = []
+    old_execute = scheduler.parallel_execute
+    scheduler.parallel_execute = fake_execute(measured, build_pool)
+    checkpoint = Checkpoint(None, TASK.key)
+    trials = []
+    try:
+        while True:
+            space = Space()
+            space.add_subspace("split_0", SplitSpace(2, 16), "spatial")
+            s = scheduler.OpScheduler(TASK.key, 0, space, parallel=2, trial=10, build_pool=build_pool,
+                                      checkpoint=checkpoint)
+            s.budget = 4
+            try:
+                config = s.schedule(Config([], None))
+                break
+            except SearchSuspended as e:
+                assert e.stage == "op0" and e.best_value == 1.0
+                trials.append(checkpoint.state["search"]["trial"])
+            finally:
+                s.close()
+    finally:
+        scheduler.parallel_execute = old_execute
+    # one trial at least per call, never one twice
+    assert trials == list(range(len(trials))) and 0 < len(trials) < 10, trials
+    assert config["spatial"] == [[1, 16]]
+
+
+def test():
+    test_staggered_builds()
+    test_overlap()
+    test_records_once()
+    test_suspend()
+
+
+if __name__ == "__main__":
+    test()
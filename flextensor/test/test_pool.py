@@ -0,0 +1,83 @@
+import os
+import threading
+import flextensor.pool as pool
+from flextensor.pool import MeasureSlots
+
+
+def test_measure_slots():
+    slots = MeasureSlots(3, cores=range(8))
+    # disjoint partitions of equal size
+    assert len(slots) == 3
+    cores = [slots.cores(i) for i in range(3)]
+    assert all(len(x) == 2 for x in cores)
+    assert len(set(sum(cores, []))) == 6
+    # no more slots than cores
+    assert len(MeasureSlots(4, cores=[0, 1])) == 2
+
+    a = slots.try_acquire()
+    b = slots.acquire()
+    c = slots.acquire(timeout=1)
+    assert sorted([a, b, c]) == [0, 1, 2]
+    assert slots.try_acquire() is None and slots.acquire(timeout=0.01) is None
+    slots.release(b)
+    assert slots.try_acquire() == b
+    slots.release(a)
+    slots.release(b)
+    slots.release(c)
+
+    # no slot while builds are in flight
+    owner = object()
+    slots.begin_build(owner)
+    slots.begin_build(owner)
+    assert slots.try_acquire() is None and slots.acquire(timeout=0.01) is None
+    slots.end_build(owner)
+    a = slots.try_acquire()
+    assert a is not None
+
+    # and no build while a slot is taken, the build waits for the release
+    started = threading.Event()
+    t = threading.Thread(target=lambda: (slots.begin_build(owner), started.set()))
+    t.start()
+    assert not started.wait(0.1)
+    slots.release(a)
+    assert started.wait(10)
+    t.join()
+    assert slots.try_acquire() is None
+    slots.end_build(owner)
+    assert not slots.builders and len(slots.free) == 3
+
+
+def test_start_method():
+    old_context = pool._context
+    old_methods = pool._multi.get_all_start_methods
+    old_env = os.environ.pop(pool.START_METHOD_ENV, None)
+    try:
+        pool._context = None
+        pool._multi.get_all_start_methods = lambda: ["fork", "spawn"]
+        # no fork server on this platform
+        assert pool.get_mp_context().get_start_method() == "spawn"
+        assert pool.get_child_context().get_start_method() == "spawn"
+        pool._context = None
+        pool._multi.get_all_start_methods = lambda: ["fork", "spawn", "forkserver"]
+        assert pool.get_mp_context().get_start_method() == "forkserver"
+        # the helpers fork their own children
+        assert pool.get_child_context().get_start_method() == "fork"
+        pool._context = None
+        os.environ[pool.START_METHOD_ENV] = "fork"
+        assert pool.get_mp_context().get_start_method() == "fork"
+        assert pool.get_child_context().get_start_method() == "fork"
+    finally:
+        pool._context = old_context
+        pool._multi.get_all_start_methods = old_methods
+        os.environ.pop(pool.START_METHOD_ENV, None)
+        if old_env is not None:
+            os.environ[pool.START_METHOD_ENV] = old_env
+
+
+def test():
+    test_measure_slots()
+    test_start_method()
+
+
+if __name__ == "__main__":
+    test()
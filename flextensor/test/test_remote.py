@@ -0,0 +1,88 @@
+import os
+import time
+import tempfile
+import threading
+import tvm
+from tvm import rpc
+from tvm.rpc.tracker import Tracker
+from flextensor.utils import RpcInfo
+from flextensor.remote import RemoteSession, get_session, device_count, remote_evaluate_batch, SESSIONS
+
+
+def build_vector_add(n, path):
+    A = tvm.placeholder((n,), name="A")
+    B = tvm.placeholder((n,), name="B")
+    C = tvm.compute((n,), lambda i: A[i] + B[i], name="C")
+    s = tvm.create_schedule(C.op)
+    func = tvm.build(s, [A, B, C], "llvm")
+    func.export_library(path)
+    return [(n,), (n,), (n,)], ["float32", "float32", "float32"]
+
+
+def test():
+    # a tracker and a device server on loopback
+    tracker = Tracker("127.0.0.1", port=9190, port_end=10000, silent=True)
+    server = rpc.Server("127.0.0.1", port=9000, port_end=10000, key="flextensor_test",
+                        tracker_addr=("127.0.0.1", tracker.port), silent=True)
+    time.sleep(1)
+    rpc_info = RpcInfo("127.0.0.1", server.port)
+    rpc_info.server_ip = "127.0.0.1"
+    rpc_info.server_port = tracker.port
+    rpc_info.device_key = "flextensor_test"
+    lib_dir = tempfile.mkdtemp()
+    try:
+        paths = []
+        shapes = []
+        dtypes = []
+        for i, n in enumerate([1024, 4096]):
+            path = os.path.join(lib_dir, "add_%d.tar" % i)
+            shape, dtype = build_vector_add(n, path)
+            paths.append(path)
+            shapes.append(shape)
+            dtypes.append(dtype)
+
+        # the session is requested once
+        session = get_session(rpc_info.server_ip, rpc_info.server_port, rpc_info.device_key)
+        costs = remote_evaluate_batch(rpc_info, paths, shapes, dtypes, "llvm", number=10)
+        assert all(cost < float("inf") for cost in costs), costs
+        assert get_session(rpc_info.server_ip, rpc_info.server_port, rpc_info.device_key) is session
+        assert len(session.uploaded) == 2
+
+        # the same module is not uploaded again
+        remote_evaluate_batch(rpc_info, paths[:1], shapes[:1], dtypes[:1], "llvm", number=10)
+        assert len(session.uploaded) == 2
+
+        # a module failing does not drop the session
+        bad_path = os.path.join(lib_dir, "bad.tar")
+        with open(bad_path, "wb") as fout:
+            fout.write(b"not a module")
+        costs = remote_evaluate_batch(rpc_info, [bad_path] + paths[:1], [shapes[0]] * 2, [dtypes[0]] * 2, "llvm")
+        assert costs[0] == float("inf") and costs[1] < float("inf"), costs
+        assert get_session(rpc_info.server_ip, rpc_info.server_port, rpc_info.device_key) is session
+
+        # adaptive measurement, the slow ones are rejected after the probe
+        costs = remote_evaluate_batch(rpc_info, paths, shapes, dtypes, "llvm", min_repeat_ms=1)
+        assert all(interval is not None for _, interval in costs), costs
+        costs = remote_evaluate_batch(rpc_info, paths, shapes, dtypes, "llvm", min_repeat_ms=1, reject_threshold=0.0)
+        assert all(interval is None for _, interval in costs), costs
+
+        # one device, the session is given back after the batch when another request waits for it
+        assert device_count(rpc_info.server_ip, rpc_info.server_port, rpc_info.device_key) == 1
+        waiting = []
+        t = threading.Thread(target=lambda: waiting.append(
+            RemoteSession(rpc_info.server_ip, rpc_info.server_port, rpc_info.device_key)))
+        t.start()
+        time.sleep(1)
+        assert not waiting
+        remote_evaluate_batch(rpc_info, paths[:1], shapes[:1], dtypes[:1], "llvm", number=10)
+        t.join(10)
+        assert waiting and not SESSIONS
+        del waiting[:]
+        print("Remote measurement", costs[1], "ms")
+    finally:
+        server.terminate()
+        tracker.terminate()
+
+
+if __name__ == "__main__":
+    test()
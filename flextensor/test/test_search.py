@@ -0,0 +1,86 @@
+import itertools
+import numpy as np
+import flextensor.search as search
+from flextensor.space import Space, SplitSpace, UnrollSpace, FuseSpace
+from flextensor.search import WalkerGroup, entity_feature, flatten
+
+
+def make_space():
+    space = Space()
+    space.add_subspace("fuse", FuseSpace(2, [0, 1, 2]), "fuse")
+    space.add_subspace("split_a_0", SplitSpace(3, 12), "spatial")
+    space.add_subspace("split_b_0", SplitSpace(2, 8), "reduce")
+    space.add_subspace("unroll", UnrollSpace([1, 16, 512], [0, 1]), "unroll")
+    return space
+
+
+def test_codes():
+    space = make_space()
+    group = WalkerGroup("test_codes", space)
+    names = [name for name, _ in space.items()]
+    sizes = [subspace.size for _, subspace in space.items()]
+    # every point has its own code in [0, len(space))
+    codes = set()
+    for indices in itertools.product(*[range(size) for size in sizes]):
+        indices = dict(zip(names, indices))
+        code = group.encode(indices)
+        assert 0 <= code < len(space)
+        assert group.decode(code) == indices
+        for name in names:
+            assert group.get_index(code, name) == indices[name]
+        assert group.from_config(group.to_config(code)) == code
+        codes.add(code)
+    assert len(codes) == len(space)
+    # moving along one subspace keeps the others
+    code = group.encode({"fuse": 1, "split_a_0": 5, "split_b_0": 2, "unroll": 2})
+    moved = group.move(code, "split_a_0", 7)
+    assert group.decode(moved) == {"fuse": 1, "split_a_0": 7, "split_b_0": 2, "unroll": 2}
+    # the neighbours are the moves of each subspace
+    next_codes, actions = group.full_walk(code)
+    for next_code, (name, action) in zip(next_codes, actions):
+        subspace = space.subspaces[name]
+        index = subspace.next_canonical(group.get_index(code, name), subspace.get_direction(action))
+        assert next_code == group.move(code, name, index)
+    # None is the empty point
+    assert group.decode(None) == {}
+    assert all(v == [] for v in group.to_config(None).values())
+
+
+def test_features():
+    space = make_space()
+    codes = list(range(0, len(space), 7))
+    group = WalkerGroup("test_features", space)
+    # the entities as numbers, subspace after subspace
+    expected = []
+    for code in codes:
+        feature = []
+        for name, index in group.decode(code).items():
+            feature.extend(flatten(space.subspaces[name].get_entity(index)))
+        expected.append(feature)
+    expected = np.array(expected, dtype=np.float32)
+    features = group.features(codes)
+    assert features.shape == (len(codes), space.dim)
+    assert np.array_equal(features, expected)
+    assert np.array_equal(group.flatten(codes[3]), expected[3])
+    assert group.features([]).shape == (0, space.dim)
+    # the same without the tables
+    limit = search.FEATURE_TABLE_LIMIT
+    search.FEATURE_TABLE_LIMIT = 0
+    try:
+        group = WalkerGroup("test_features", space)
+        assert all(walker.feature_table is None for walker in group.walkers.values())
+        assert np.array_equal(group.features(codes), expected)
+    finally:
+        search.FEATURE_TABLE_LIMIT = limit
+    # the position for the entities that are not numbers
+    assert entity_feature(["x", "y"], 5, 2) == [5, 0]
+    assert entity_feature([[2, 3]], 5, 2) == [2, 3]
+
+
+def test():
+    test_codes()
+    test_features()
+
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,107 @@
+import math
+from flextensor.space import SplitSpace, FuseSpace, UnrollSpace
+from flextensor.utils import any_factor_split
+
+
+def test_split_space():
+    for policy in ["off", "power2", "continuous"]:
+        for total, dim in [(1, 3), (12, 2), (56, 3), (64, 4), (7, 3)]:
+            expected = any_factor_split(total, dim, policy)
+            space = SplitSpace(dim, total, policy)
+            assert space.size == len(expected), (policy, total, dim)
+            for p, entity in enumerate(expected):
+                assert space.get_entity(p) == entity, (policy, total, dim, p)
+                assert space.get_index(entity) == p, (policy, total, dim, p)
+            assert space.get_index([total + 1] + [1] * (dim - 1)) is None
+            # every move stays in the space
+            for p in range(space.size):
+                for d in space.directions:
+                    assert 0 <= space.next_entity(p, d) < space.size
+
+
+def next_split(entities, pos, d, policy):
+    # the move of the materialized space, factor by factor
+    asc_pos, dec_pos = d
+    ret = list(entities[pos])
+    left = ret[asc_pos] * ret[dec_pos]
+    while True:
+        tmp = ret[asc_pos] + 1
+        while tmp <= left and policy != "continuous" and left % tmp != 0:
+            tmp += 1
+        tmp = min(tmp, left)
+        ret[asc_pos] = tmp
+        ret[dec_pos] = math.ceil(left / tmp)
+        if ret in entities:
+            return entities.index(ret)
+        if tmp >= left:
+            # no larger factor in the space, stay
+            return pos
+
+
+def test_neighbours():
+    cases = [("off", 12, 2), ("off", 56, 3), ("off", 16, 4), ("continuous", 12, 2), ("continuous", 10, 3)]
+    for policy, total, dim in cases:
+        entities = [list(x) for x in any_factor_split(total, dim, policy)]
+        space = SplitSpace(dim, total, policy)
+        for p in range(space.size):
+            for d in space.directions:
+                expected = next_split(entities, p, d, policy)
+                assert space.next_entity(p, d) == expected, (policy, total, dim, p, d)
+                # remembered
+                assert space.neighbours[(p,) + d] == expected
+                assert space.next_entity(p, d) == expected
+
+
+def test_power2_walk():
+    # no power of two factor of 12 is larger than 8, the walk stays
+    space = SplitSpace(2, 12, "power2")
+    pos = space.get_index([8, 1])
+    assert space.next_entity(pos, (1, 0)) == pos
+
+
+def test_canonical():
+    # the unit loop 2 goes with either neighbour, [2, 4] and [3, 4] are the same schedule
+    space = FuseSpace(2, [0, 1, 2, 3], extents=[4, 2, 1, 8])
+    assert space.static_entities == [[1, 4], [2, 4], [3, 4]]
+    assert space.canonical_map == [0, 1, 1]
+    assert space.next_canonical(0, (1,)) == 1
+    assert space.next_canonical(1, (1,)) == 0
+    # nothing is unrolled with step 0 or 1, step 1500 unrolls all the 1000 iterations as 512 does not
+    space = UnrollSpace([0, 1, 512, 1500], max_work=1000)
+    assert space.canonical_map == [0, 0, 0, 0, 4, 5, 6, 7]
+    assert space.next_canonical(0, (1,)) == 4
+    assert space.next_canonical(4, (-1,)) == 0
+    assert space.next_canonical(7, (1,)) == 0
+    # all distinct
+    assert UnrollSpace([16, 64], max_work=1000).canonical_map is None
+
+
+def test_nearest_index():
+    # the factors tuned for 64 mapped to 56, the nearest in log scale
+    space = SplitSpace(3, 56)
+
+    def distance(a, b):
+        return sum([math.fabs(math.log(x) - math.log(y)) for x, y in zip(a, b)])
+
+    for entity in [[4, 4, 4], [1, 8, 8], [64, 1, 1], [2, 16, 2]]:
+        best = min([distance(space.get_entity(p), entity) for p in range(space.size)])
+        assert abs(distance(space.get_entity(space.nearest_index(entity)), entity) - best) < 1e-9, entity
+    # the same extent maps to itself
+    for p in range(space.size):
+        assert space.nearest_index(space.get_entity(p)) == p
+    assert space.nearest_index([4, 16]) is None
+    # no metric, the entity itself
+    space = FuseSpace(2, [0, 1, 2])
+    assert space.nearest_index([1, 3]) == space.get_index([1, 3])
+
+
+def test():
+    test_split_space()
+    test_neighbours()
+    test_nearest_index()
+    test_power2_walk()
+    test_canonical()
+
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,80 @@
+from flextensor.task import Task, TaskTable, register_task, register_group, nearest_tasks, task_distance, \
+    TASK_TABLE
+
+
+def func(*args):
+    return None
+
+
+def other_func(*args):
+    return None
+
+
+def test_nearest_tasks():
+    tasks = [Task("testnear", "gemm", func, args, "llvm") for args in [(64, 64, 64), (128, 64, 64), (1024, 64, 64)]]
+    for task in tasks:
+        register_task(task)
+    # not comparable: another target, operator or arguments
+    others = [Task("testnear", "gemm", func, (64, 64, 64), "cuda"),
+              Task("testnear", "other", other_func, (64, 64, 64), "llvm"),
+              Task("testnear", "gemm", func, (64, 64, 64, 1), "llvm"),
+              Task("testnear", "gemm", func, (64, 64, "float16"), "llvm")]
+    for task in others:
+        register_task(task)
+        assert task_distance(Task("testnear", "gemm", func, (64, 64, "float32"), "llvm"), task) is None
+    task = Task("testnear", "gemm", func, (100, 64, 64), "llvm")
+    register_task(task)
+    assert task_distance(task, task) == 0.0
+    keys = [x.key for x in tasks + others]
+    assert nearest_tasks(task.key, keys, k=2) == [tasks[1].key, tasks[0].key]
+    assert nearest_tasks(task.key, keys, k=10) == [tasks[1].key, tasks[0].key, tasks[2].key]
+    # unknown keys are skipped
+    assert nearest_tasks(task.key, ["testnear_unknown"]) == []
+
+
+def test_lazy_groups():
+    generated = []
+
+    def generator(category):
+        def _generate():
+            generated.append(category)
+            return [Task(category, "gemm", func, (n, n, n), "llvm") for n in [16, 32]]
+        return _generate
+
+    table = TaskTable()
+    table.add_group(["testlazya"], generator("testlazya"))
+    table.add_group(["testlazyb", "testlazyc"], generator("testlazyb"))
+    key_a = Task("testlazya", "gemm", func, (16, 16, 16), "llvm").key
+    key_b = Task("testlazyb", "gemm", func, (32, 32, 32), "llvm").key
+    # registered before its group is generated, kept
+    explicit = Task("testlazyb", "gemm", other_func, (32, 32, 32), "llvm")
+    table[key_b] = explicit
+    assert generated == []
+    assert table[key_a].args == (16, 16, 16) and generated == ["testlazya"]
+    # another category of the group loads it
+    assert "testlazyc_unknown" not in table and generated == ["testlazya", "testlazyb"]
+    assert table[key_b] is explicit
+    assert len(table) == 4 and generated == ["testlazya", "testlazyb"]
+
+    table = TaskTable()
+    table.add_group(["testlazya"], generator("testlazya"))
+    table.add_group(["testlazyb"], generator("testlazyb"))
+    del generated[:]
+    assert len(table.query("testlazyb")) == 2 and generated == ["testlazyb"]
+    assert len(table.query(name="gemm")) == 4 and generated == ["testlazyb", "testlazya"]
+
+    # the module table, register_task overrides a task of a group
+    register_group(["testlazyd"], generator("testlazyd"))
+    task = Task("testlazyd", "gemm", other_func, (16, 16, 16), "llvm")
+    register_task(task, override=True)
+    assert TASK_TABLE[task.key] is task
+    assert len(TASK_TABLE.query("testlazyd")) == 2 and TASK_TABLE[task.key] is task
+
+
+def test():
+    test_nearest_tasks()
+    test_lazy_groups()
+
+
+if __name__ == "__main__":
+    test()
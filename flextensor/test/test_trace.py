@@ -0,0 +1,43 @@
+import os
+import time
+import tempfile
+from flextensor import trace
+
+
+def test_fork_shards():
+    path = tempfile.mkdtemp()
+    trace.enable(path)
+    try:
+        now = time.time()
+        trace.emit("parent", now, now)
+        children = []
+        for i in range(2):
+            pid = os.fork()
+            if pid == 0:
+                # the shard of the parent is open here
+                trace.emit("child", now, now, no=i)
+                os._exit(0)
+            children.append(pid)
+        for pid in children:
+            os.waitpid(pid, 0)
+        trace.emit("parent", now, now)
+    finally:
+        trace.disable()
+    shards = sorted(name for name in os.listdir(path) if name.startswith("trace."))
+    assert len(shards) == 3, shards
+    events = trace.load(path)
+    assert len(events) == 4
+    for event in events:
+        # every event is in the shard of its own process
+        assert event["name"] == ("parent" if event["pid"] == os.getpid() else "child")
+        with open(os.path.join(path, "trace.%d.jsonl" % event["pid"])) as fin:
+            assert len(fin.readlines()) == (2 if event["name"] == "parent" else 1)
+    assert sorted(e["args"]["no"] for e in events if e["name"] == "child") == [0, 1]
+
+
+def test():
+    test_fork_shards()
+
+
+if __name__ == "__main__":
+    test()
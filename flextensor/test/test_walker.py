@@ -0,0 +1,31 @@
+from flextensor.space import Space, SplitSpace, UnrollSpace
+from flextensor.search import WalkerGroup
+
+
+def test():
+    space = Space()
+    space.add_subspace("split_a_0", SplitSpace(3, 56), "spatial")
+    space.add_subspace("unroll", UnrollSpace([1, 16, 512], [0, 1], max_work=1000), "unroll")
+    group = WalkerGroup("test_walker", space)
+    # the Q-learning walkers of flextensor.model
+    group.load_walker_models()
+    code = group.encode({"split_a_0": 5, "unroll": 1})
+    next_codes, actions = group.full_walk(code)
+    assert len(next_codes) > 0 and len(next_codes) == len(actions)
+    for next_code, (name, action) in zip(next_codes, actions):
+        group.record(next_code, 1.0)
+        group.add_data(name, code, action, next_code, 0.5)
+    stored = []
+    for name, walker in group.walkers.items():
+        for pre_state, action, post_state, reward in walker.iter_data():
+            # the action is the number of the direction that leads to post_state
+            index = walker.subspace.next_canonical(group.get_index(code, name), walker.subspace.get_direction(action))
+            assert post_state == group.flatten(group.move(code, name, index)).tolist()
+            assert pre_state == group.flatten(code).tolist()
+            assert reward == 0.5
+            stored.append((name, action))
+    assert sorted(stored) == sorted(actions)
+
+
+if __name__ == "__main__":
+    test()
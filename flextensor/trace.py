@@ -0,0 +1,171 @@
+"""Opt-in Chrome trace of the tuning pipeline
+
+Tracing is on when `FLEXTENSOR_TRACE` names a directory, or after `enable(dir)`
+which also passes it on to the worker processes started later.
+Every process appends its events to its own shard in the directory,
+`merge` joins the shards into one file for chrome://tracing or Perfetto
+and `summary` tells the time spent in each phase:
+
+    python -m flextensor.trace <dir> -o trace.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+
+TRACE_ENV = "FLEXTENSOR_TRACE"
+
+_dir = os.environ.get(TRACE_ENV) or None
+_shard = None
+# the process that opened the shard, a forked child opens its own
+_shard_pid = None
+_lock = threading.Lock()
+
+
+def enable(path):
+    global _dir
+    os.makedirs(path, exist_ok=True)
+    os.environ[TRACE_ENV] = path
+    _dir = path
+
+
+def disable():
+    global _dir, _shard
+    os.environ.pop(TRACE_ENV, None)
+    _dir = None
+    with _lock:
+        if _shard is not None:
+            _shard.close()
+            _shard = None
+
+
+def enabled():
+    return _dir is not None
+
+
+def trace_dir():
+    return _dir
+
+
+def _write(event):
+    global _shard, _shard_pid
+    with _lock:
+        pid = os.getpid()
+        if _shard is not None and _shard_pid != pid:
+            # inherited from the parent, the line buffer is empty between writes
+            _shard.close()
+            _shard = None
+        if _shard is None or _shard.closed:
+            os.makedirs(_dir, exist_ok=True)
+            _shard = open(os.path.join(_dir, "trace.%d.jsonl" % pid), "a", buffering=1)
+            _shard_pid = pid
+        _shard.write(json.dumps(event) + "\n")
+
+
+def emit(name, beg, end, cat="flextensor", **args):
+    """Record a span from `beg` to `end`, in seconds since the epoch"""
+    if _dir is None:
+        return
+    _write({
+        "name": name,
+        "cat": cat,
+        "ph": "X",
+        "ts": beg * 1e6,
+        "dur": (end - beg) * 1e6,
+        "pid": os.getpid(),
+        "tid": threading.get_ident(),
+        "args": args
+    })
+
+
+class _Span(object):
+    def __init__(self, name, cat, args):
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.beg = None
+
+    def __enter__(self):
+        self.beg = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        emit(self.name, self.beg, time.time(), cat=self.cat, **self.args)
+        return False
+
+
+class _NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, cat="flextensor", **args):
+    """A context manager recording the time spent in its block"""
+    if _dir is None:
+        return _NULL_SPAN
+    return _Span(name, cat, args)
+
+
+def load(path):
+    """All the events of the shards in the directory"""
+    events = []
+    for name in sorted(os.listdir(path)):
+        if not (name.startswith("trace.") and name.endswith(".jsonl")):
+            continue
+        with open(os.path.join(path, name), "r") as fin:
+            for line in fin:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    # a process killed while writing
+                    continue
+    return events
+
+
+def merge(path, out_path):
+    events = load(path)
+    with open(out_path, "w") as fout:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, fout)
+    return events
+
+
+def summary(events):
+    """(name, count, total ms, mean ms, max ms) of each phase, the longest first"""
+    phases = {}
+    for event in events:
+        if event.get("ph") != "X":
+            continue
+        phases.setdefault(event["name"], []).append(event["dur"] / 1e3)
+    ret = []
+    for name, durs in phases.items():
+        ret.append((name, len(durs), sum(durs), sum(durs) / len(durs), max(durs)))
+    return sorted(ret, key=lambda x: -x[2])
+
+
+def print_summary(events, file=sys.stdout):
+    print("%-24s %8s %14s %12s %12s" % ("phase", "count", "total(ms)", "mean(ms)", "max(ms)"), file=file)
+    for name, count, total, mean, longest in summary(events):
+        print("%-24s %8d %14.3f %12.3f %12.3f" % (name, count, total, mean, longest), file=file)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dir", help="the trace directory", type=str)
+    parser.add_argument("-o", "--output", help="the merged trace file", type=str, default="")
+    args = parser.parse_args()
+    if args.output != "":
+        events = merge(args.dir, args.output)
+    else:
+        events = load(args.dir)
+    print_summary(events)
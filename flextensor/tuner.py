@@ -0,0 +1,149 @@
+import time
+import numpy as np
+from flextensor.task import TASK_TABLE
+from flextensor.utils import Config
+from flextensor.scheduler import schedule
+from flextensor.pool import WorkerPool
+from flextensor.checkpoint import Checkpoint, SearchSuspended
+from flextensor.record import RecordDatabase, hardware_fingerprint
+
+
+class MultiTaskTuner(object):
+    """Tune many tasks in rounds of a few trials each
+
+    The objective is the weighted sum of the best latency of every task,
+    the weight being e.g. how many times the task occurs in a network.
+    Every round goes to the task whose next round is expected to
+    reduce the objective the most, a random one with probability `epsilon`.
+    A round goes on with the search of the task where its former round stopped,
+    kept in an in-memory checkpoint, until `round_trials` configs are evaluated.
+    A round runs whole search trials, so it may evaluate a few more.
+    All the rounds share the build workers, a task is done once all its stages are.
+    """
+    def __init__(self, task_keys, weights=None, round_trials=10, parallel=8, records=None,
+                 epsilon=0.05, window=3, alpha=0.2, **kwargs):
+        self.task_keys = list(task_keys)
+        if weights is None:
+            weights = [1.0 for key in self.task_keys]
+        assert len(weights) == len(self.task_keys)
+        self.weights = list(weights)
+        self.round_trials = round_trials
+        self.parallel = parallel
+        if records is None or isinstance(records, str):
+            records = RecordDatabase(records)
+        self.records = records
+        self.epsilon = epsilon
+        # the backward gradient is taken over the last `window` rounds
+        self.window = window
+        # weight of the backward gradient against the optimistic forward one
+        self.alpha = alpha
+        # more arguments of `schedule`
+        self.kwargs = kwargs
+        # the trials spent on each task, and the trials spent and the best latency
+        # after each of its rounds, inf for a failed round
+        self.trials = [0 for key in self.task_keys]
+        self.spent = [[] for key in self.task_keys]
+        self.history = [[] for key in self.task_keys]
+        # the search state of each task between its rounds
+        self.checkpoints = [Checkpoint(None, key) for key in self.task_keys]
+        self.done = [False for key in self.task_keys]
+
+    def best(self, i):
+        """The best config of task i and its latency"""
+        task = TASK_TABLE[self.task_keys[i]]
+        hardware = hardware_fingerprint(task.target, task.dev_id, self.kwargs.get("rpc_info"))
+        best = self.records.best(self.task_keys[i], hardware, stage="final")
+        if best is None:
+            return None, float("inf")
+        return Config(*best[0]), best[1]
+
+    def best_latency(self, i):
+        return self.best(i)[1]
+
+    def objective(self):
+        return sum(w * self.best_latency(i) for i, w in enumerate(self.weights))
+
+    def gradient(self, i):
+        """The expected change of the objective per trial spent on task i"""
+        history = self.history[i]
+        cur = min(history)
+        if not cur < float("inf"):
+            # no valid schedule yet, nothing is more urgent until the task seems hopeless
+            return -float("inf") if len(history) < self.window else 0.0
+        if len(history) > self.window:
+            prev = min(history[:-self.window])
+            prev_trials = self.spent[i][-1 - self.window]
+            if prev < float("inf") and self.trials[i] > prev_trials:
+                backward = (cur - prev) / (self.trials[i] - prev_trials)
+            else:
+                backward = -cur / self.trials[i]
+        else:
+            backward = -cur / self.trials[i]
+        # the latency falls off as 1 / trials at best
+        forward = -cur / self.trials[i]
+        return self.weights[i] * (self.alpha * backward + (1 - self.alpha) * forward)
+
+    def next_task(self):
+        """The task of the next round, None if all are done"""
+        todo = [i for i in range(len(self.task_keys)) if not self.done[i]]
+        if not todo:
+            return None
+        # every task gets a round first
+        for i in todo:
+            if not self.history[i]:
+                return i
+        if np.random.random() < self.epsilon:
+            return todo[np.random.randint(0, len(todo))]
+        gradients = [self.gradient(i) for i in todo]
+        return todo[int(np.argmin(gradients))]
+
+    def tune_round(self, i, build_pool):
+        task_key = self.task_keys[i]
+        print("[FlexTensor] Tune %s, %d trials spent, weight %f" % (task_key, self.trials[i], self.weights[i]))
+        kwargs = dict(self.kwargs)
+        kwargs["records"] = self.records
+        kwargs["build_pool"] = build_pool
+        kwargs["stats"] = dict()
+        kwargs["checkpoint"] = self.checkpoints[i]
+        kwargs["budget"] = self.round_trials
+        try:
+            schedule(task_key, parallel=self.parallel, **kwargs)
+            best = self.best_latency(i)
+            self.done[i] = True
+        except SearchSuspended as e:
+            best = min(self.best_latency(i), e.best_value)
+        except Exception as e:
+            print("[FlexTensor] [Warning] Tuning %s fails: %s" % (task_key, str(e)))
+            best = float("inf")
+            # start it afresh the next round
+            self.checkpoints[i] = Checkpoint(None, task_key)
+        # at least one, so that the budget runs out even if every round fails early
+        self.trials[i] += max(kwargs["stats"].get("trials", 0), 1)
+        self.spent[i].append(self.trials[i])
+        self.history[i].append(best)
+        print("[FlexTensor] %s best %f, objective %f" % (task_key, min(self.history[i]), self.objective()))
+
+    def tune(self, total_trials=None, time_budget=None):
+        """Tune until `total_trials` trials are spent or `time_budget` seconds pass
+
+        returns a dict from task key to its best config and latency
+        """
+        assert total_trials is not None or time_budget is not None
+        beg = time.time()
+        build_pool = WorkerPool(self.parallel)
+        try:
+            while True:
+                if total_trials is not None and sum(self.trials) >= total_trials:
+                    break
+                if time_budget is not None and time.time() - beg >= time_budget:
+                    break
+                i = self.next_task()
+                if i is None:
+                    break
+                self.tune_round(i, build_pool)
+        finally:
+            build_pool.shutdown()
+        ret = dict()
+        for i, task_key in enumerate(self.task_keys):
+            ret[task_key] = self.best(i)
+        return ret